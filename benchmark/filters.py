@@ -0,0 +1,75 @@
+"""
+Micro-benchmark of the per call overhead of the ``filter_outlier`` strategies, compared to the undecorated function.
+
+Run from the repository root with ``python -m benchmark.filters``.
+"""
+
+import random
+from itertools import cycle
+from timeit import repeat
+
+from outlier_detector.filters import FilterRegistry, filter_outlier
+
+CALLS = 100000
+
+
+def samples(seed=0, outlier_every=50):
+    rng = random.Random(seed)
+    return [
+        rng.gauss(0, 1) if i % outlier_every else rng.gauss(0, 1) + 100
+        for i in range(CALLS)
+    ]
+
+
+def build(strategy=None):
+    """Returns a zero arguments callable popping one sample, filtered with the given strategy."""
+    source = cycle(samples())
+
+    class Source:
+        def pop(self):
+            return next(source)
+
+    if strategy is None:
+        return Source().pop
+
+    class FilteredSource:
+        @filter_outlier(strategy=strategy, registry=FilterRegistry())
+        def pop(self):
+            return next(source)
+
+    if strategy == "generation":
+        return FilteredSource().pop().__next__
+    return FilteredSource().pop
+
+
+def measure(pop, calls=CALLS):
+    """Best of three runs, in nanoseconds per call."""
+    return min(repeat(pop, number=calls, repeat=3)) / calls * 1e9
+
+
+def main():
+    baseline = measure(build())
+    print("{:<12}{:>12}{:>12}".format("strategy", "ns/call", "overhead"))
+    print("{:<12}{:>12.0f}{:>12}".format("undecorated", baseline, "-"))
+    for strategy in ("recursion", "iteration", "exception", "generation"):
+        pop = build(strategy)
+        if strategy == "exception":
+            pop = _swallow_outliers(pop)
+        elapsed = measure(pop)
+        print("{:<12}{:>12.0f}{:>11.1f}x".format(strategy, elapsed, elapsed / baseline))
+
+
+def _swallow_outliers(pop):
+    from outlier_detector.exceptions import OutlierException
+
+    def call():
+        try:
+            return pop()
+        except OutlierException:
+            pass
+
+    return call
+
+
+if __name__ == "__main__":
+    main()
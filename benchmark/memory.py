@@ -0,0 +1,78 @@
+"""
+Bytes per detector, by method and window length: the ``memory_footprint`` of a detector with a full window, and the
+memory actually allocated per detector when many of them are created, as traced by ``tracemalloc``. The Dixon's
+figures are compared with the bytes per key of a ``DetectorBank``.
+
+Run from the repository root with ``python -m benchmark.memory``.
+"""
+
+import random
+import tracemalloc
+
+from outlier_detector.detectors import DetectorBank, OutlierDetector
+
+DETECTORS = 500
+WINDOWS = (5, 14, 27, 50, 100)
+METHODS = ("dixon", "grubbs", "hampel", "ewma")
+
+
+def filled(window, method="dixon", seed=0):
+    """A detector whose window has been filled by Gaussian samples."""
+    rng = random.Random(seed)
+    detector = OutlierDetector(buffer_samples=window, method=method)
+    for _ in range(2 * window):
+        detector.get_outlier_score(rng.gauss(0, 1))
+    return detector
+
+
+def traced(build, count=DETECTORS):
+    """The memory allocated by ``build`` calls, in bytes per call, keeping the built objects alive."""
+    build()  # warms up the shared critical values tables
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        kept = [build() for _ in range(count)]
+        allocated = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    # the list holding the built objects is not theirs
+    return (allocated - kept.__sizeof__()) / count
+
+
+def bank_key(window):
+    """The memory allocated by a bank for each key, in bytes per key."""
+    rng = random.Random(0)
+    bank = DetectorBank(buffer_samples=window)
+    bank.score(-1, 0.0)
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        for key in range(DETECTORS):
+            for _ in range(2 * window):
+                bank.score(key, rng.gauss(0, 1))
+        allocated = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    return allocated / DETECTORS
+
+
+def main():
+    print(
+        "{:<10}{:>8}{:>12}{:>12}{:>12}".format(
+            "method", "window", "footprint", "allocated", "bank key"
+        )
+    )
+    for method in METHODS:
+        for window in WINDOWS:
+            footprint = filled(window, method).memory_footprint()
+            allocated = traced(lambda: filled(window, method))
+            bank = "{:.0f}".format(bank_key(window)) if method == "dixon" else "-"
+            print(
+                "{:<10}{:>8}{:>12}{:>12.0f}{:>12}".format(
+                    method, window, footprint, allocated, bank
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Benchmark suite of the per sample cost of functions, detectors, keyed banks and filter strategies, over window lengths,
+outlier densities and number of keys. Results are written as JSON, so that runs on different commits can be compared.
+
+Run from the repository root with ``python -m benchmark.suite``, for instance::
+
+    python -m benchmark.suite --output before.json
+    git checkout my-branch
+    python -m benchmark.suite --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import re
+import subprocess
+import sys
+from datetime import datetime, timezone
+from functools import partial
+from itertools import product
+from time import perf_counter
+
+from benchmark.filters import build as build_filter
+from outlier_detector.detectors import DetectorBank, OutlierDetector
+from outlier_detector.filters import FilterRegistry
+from outlier_detector.functions import get_outlier_score, is_outlier
+
+SAMPLES = 20000
+REPEAT = 5
+WINDOWS = (5, 10, 14, 20, 27)
+DENSITIES = (0.0, 0.01, 0.1)
+KEYS = (10, 1000)
+METHODS = ("dixon", "grubbs", "hampel", "ewma")
+STRATEGIES = ("recursion", "iteration", "exception", "generation")
+
+SCENARIOS = []
+"""The benchmark scenarios, as (name, parameters, setup) where setup takes the number of samples and returns a zero
+arguments callable processing them"""
+
+
+def scenario(name, **grid):
+    """Registers a setup function once for each combination of the parameters grid."""
+
+    def register(setup):
+        names = sorted(grid)
+        for values in product(*(grid[n] for n in names)):
+            parameters = dict(zip(names, values))
+            SCENARIOS.append((name, parameters, partial(setup, **parameters)))
+        return setup
+
+    return register
+
+
+def samples(count, density=0.01, seed=0):
+    """Gaussian samples with the given fraction of outliers, the same ones at every run."""
+    rng = random.Random(seed)
+    return [
+        rng.gauss(0, 1) + (50 if rng.random() < density else 0) for _ in range(count)
+    ]
+
+
+@scenario("detector.get_outlier_score", window=WINDOWS, density=DENSITIES)
+def detector_score(count, window, density):
+    od = OutlierDetector(buffer_samples=window)
+    od.score_array(samples(window, 0, seed=1))
+    stream = samples(count, density)
+
+    def run():
+        score = od.get_outlier_score
+        for sample in stream:
+            score(sample)
+
+    return run
+
+
+@scenario("detector.score_array", window=(14,), density=(0.01,))
+def detector_score_array(count, window, density):
+    od = OutlierDetector(buffer_samples=window)
+    stream = samples(count, density)
+    return lambda: od.score_array(stream)
+
+
+@scenario("detector.method", method=METHODS, window=(27,))
+def detector_method(count, method, window):
+    od = OutlierDetector(buffer_samples=window, method=method)
+    stream = samples(count)
+
+    def run():
+        score = od.get_outlier_score
+        for sample in stream:
+            score(sample)
+
+    return run
+
+
+@scenario("functions.is_outlier", window=WINDOWS)
+def function_is_outlier(count, window):
+    windows = _sliding_windows(count, window)
+    return lambda: [is_outlier(w, s) for w, s in windows]
+
+
+@scenario("functions.get_outlier_score", window=(14,))
+def function_score(count, window):
+    windows = _sliding_windows(count, window)
+    return lambda: [get_outlier_score(w, s) for w, s in windows]
+
+
+@scenario("keyed.bank", keys=KEYS)
+def keyed_bank(count, keys):
+    bank = DetectorBank()
+    stream_keys, stream = _keyed(count, keys)
+    return lambda: bank.score_many(stream_keys, stream)
+
+
+@scenario("keyed.registry", keys=KEYS)
+def keyed_registry(count, keys):
+    registry = FilterRegistry()
+    stream_keys, stream = _keyed(count, keys)
+
+    def run():
+        retrieve = registry.retrieve
+        for key, sample in zip(stream_keys, stream):
+            retrieve(key).get_outlier_score(sample)
+
+    return run
+
+
+@scenario("filters.strategy", strategy=("undecorated",) + STRATEGIES)
+def filter_strategy(count, strategy):
+    pop = build_filter(None if strategy == "undecorated" else strategy)
+    if strategy == "exception":
+        from benchmark.filters import _swallow_outliers
+
+        pop = _swallow_outliers(pop)
+
+    def run():
+        for _ in range(count):
+            pop()
+
+    return run
+
+
+def run_scenarios(pattern=None, count=SAMPLES, repeat=REPEAT, out=sys.stdout):
+    """
+    Runs the scenarios, the best of ``repeat`` runs each, with a fresh setup at every run.
+
+    :param pattern: a regular expression selecting the scenarios by full name, all of them by default
+    :param count: the number of samples processed by each run
+    :param repeat: the number of runs of each scenario
+    :param out: where the progress is printed, nowhere when None
+    :return: the results document, see ``main``
+    """
+    results = {}
+    for name, parameters, setup in SCENARIOS:
+        full_name = _full_name(name, parameters)
+        if pattern and not re.search(pattern, full_name):
+            continue
+        timings = []
+        for _ in range(repeat):
+            work = setup(count)
+            start = perf_counter()
+            work()
+            timings.append(perf_counter() - start)
+        results[full_name] = {
+            "name": name,
+            "parameters": parameters,
+            "ns_per_sample": min(timings) / count * 1e9,
+            "samples": count,
+            "repeat": repeat,
+        }
+        if out is not None:
+            print(
+                "{:<60}{:>12.0f} ns".format(
+                    full_name, results[full_name]["ns_per_sample"]
+                ),
+                file=out,
+            )
+    return {"environment": _environment(), "results": results}
+
+
+def compare(baseline, current, threshold, out=sys.stdout):
+    """
+    Prints the ratio between the current and the baseline per sample costs of the scenarios in both.
+
+    :return: the names of the scenarios slower than the baseline by more than ``threshold``
+    """
+    regressions = []
+    print(
+        "{:<60}{:>10}{:>10}{:>8}".format("scenario", "baseline", "current", "ratio"),
+        file=out,
+    )
+    for full_name, result in current["results"].items():
+        previous = baseline["results"].get(full_name)
+        if previous is None:
+            continue
+        ratio = result["ns_per_sample"] / previous["ns_per_sample"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(full_name)
+            flag = " slower"
+        print(
+            "{:<60}{:>10.0f}{:>10.0f}{:>7.2f}x{}".format(
+                full_name,
+                previous["ns_per_sample"],
+                result["ns_per_sample"],
+                ratio,
+                flag,
+            ),
+            file=out,
+        )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Per sample cost of the outlier detector functions, detectors and filters"
+    )
+    parser.add_argument(
+        "-k", "--pattern", help="regular expression of the scenarios to run"
+    )
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--output", help="the JSON file of the results")
+    parser.add_argument("--compare", help="the JSON file of the baseline results")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="the slow down over the baseline reported as a regression, 0.1 by default",
+    )
+    parser.add_argument("--list", action="store_true", help="list the scenarios only")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, parameters, _ in SCENARIOS:
+            print(_full_name(name, parameters))
+        return 0
+    document = run_scenarios(args.pattern, args.samples, args.repeat)
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(document, fh, indent=1)
+            fh.write("\n")
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        print()
+        regressions = compare(baseline, document, args.threshold)
+        if regressions:
+            print("\n{} regressions".format(len(regressions)))
+            return 1
+    return 0
+
+
+def _full_name(name, parameters):
+    return "{}[{}]".format(
+        name, ",".join("{}={}".format(k, v) for k, v in sorted(parameters.items()))
+    )
+
+
+def _sliding_windows(count, window):
+    stream = samples(count + window)
+    return [(stream[i : i + window], stream[i + window]) for i in range(count)]
+
+
+def _keyed(count, keys):
+    rng = random.Random(2)
+    return [rng.randrange(keys) for _ in range(count)], samples(count)
+
+
+def _environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "system": platform.platform(),
+        "date": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Throughput of the thread safe detectors and registry under 1, 4 and 16 threads. On free-threaded CPython builds the
+threads run in parallel, otherwise the figures show the locking overhead under the GIL.
+
+Run from the repository root with ``python -m benchmark.threads``.
+"""
+
+import sys
+import threading
+from time import perf_counter
+
+from benchmark.filters import samples
+from outlier_detector.detectors import OutlierDetector
+from outlier_detector.filters import FilterRegistry
+
+SAMPLES_PER_THREAD = 50000
+THREADS = (1, 4, 16)
+KEYS = 64
+
+
+def unlocked_detector(thread_samples):
+    """The reference, a detector that is not thread safe, scored by a single thread."""
+    detector = OutlierDetector()
+
+    def work(index):
+        score = detector.get_outlier_score
+        for sample in thread_samples:
+            score(sample)
+
+    return work
+
+
+def shared_detector(thread_samples):
+    """All the threads score the samples of the same detector."""
+    detector = OutlierDetector(thread_safe=True)
+
+    def work(index):
+        score = detector.get_outlier_score
+        for sample in thread_samples:
+            score(sample)
+
+    return work
+
+
+def registry_detectors(thread_samples):
+    """Each thread scores the samples of its keys, retrieving their detectors from a shared registry."""
+    registry = FilterRegistry(thread_safe=True)
+
+    def work(index):
+        retrieve = registry.retrieve
+        for i, sample in enumerate(thread_samples):
+            key = (index * KEYS + i % KEYS) % (4 * KEYS)
+            retrieve(key, thread_safe=True).get_outlier_score(sample)
+
+    return work
+
+
+def measure(build, threads):
+    """Samples per second scored by the given number of threads."""
+    thread_samples = samples()[:SAMPLES_PER_THREAD]
+    work = build(thread_samples)
+    barrier = threading.Barrier(threads + 1)
+
+    def run(index):
+        barrier.wait()
+        work(index)
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = perf_counter()
+    for worker in workers:
+        worker.join()
+    return threads * SAMPLES_PER_THREAD / (perf_counter() - start)
+
+
+def main():
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print("Python {}, GIL {}".format(sys.version.split()[0], "on" if gil else "off"))
+    print(
+        "{:<20}".format("samples/s")
+        + "".join("{:>12}".format("{} threads".format(n)) for n in THREADS)
+    )
+    print("{:<20}{:>12.0f}".format("unlocked detector", measure(unlocked_detector, 1)))
+    for name, build in (
+        ("shared detector", shared_detector),
+        ("registry detectors", registry_detectors),
+    ):
+        print(
+            "{:<20}".format(name)
+            + "".join("{:>12.0f}".format(measure(build, n)) for n in THREADS)
+        )
+
+
+if __name__ == "__main__":
+    main()
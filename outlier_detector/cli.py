@@ -0,0 +1,276 @@
+"""
+The ``outlier-detector`` command: scores the numbers read line by line from files or the standard input, with an
+``OutlierDetector`` window per series key, and writes each line annotated with its score. Lines are read, parsed and
+written in batches. From pipes and terminals a batch holds the lines available at once and is written right away, so
+that a growing input, as ``tail -f``, is scored as it arrives.
+"""
+
+import argparse
+import gc
+import os
+import stat
+import sys
+from itertools import chain
+from typing import List
+
+from outlier_detector.critical_values import STATISTICS
+from outlier_detector.detectors import OutlierDetector
+from outlier_detector.engines import ENGINES
+
+READ_BYTES = 1 << 20
+"""The approximate size of the batches of lines read at once, the maximum one from pipes and terminals"""
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Runs the command with the given arguments, by default the process ones.
+
+    :param argv: the command line arguments, without the program name
+    :return: the exit status
+    """
+    parser = _parser()
+    args = parser.parse_args(argv)
+    detector_kwargs = {
+        "confidence": args.confidence,
+        "buffer_samples": args.buffer_samples,
+        "sigma_threshold": args.sigma_threshold,
+        "statistic": args.statistic,
+        "method": args.method,
+    }
+    try:
+        OutlierDetector(**detector_kwargs)
+    except ValueError as e:
+        parser.error(str(e))
+
+    out = sys.stdout.buffer
+    scorer = _Scorer(args, detector_kwargs, out)
+    # the batches hold no reference cycles, while collecting their rows would dominate the parsing time
+    collect = gc.isenabled()
+    gc.disable()
+    try:
+        for path in args.files or ["-"]:
+            if path == "-":
+                scorer.consume(sys.stdin.buffer, "<stdin>")
+            else:
+                with open(path, "rb") as source:
+                    scorer.consume(source, path)
+        out.flush()
+    except BrokenPipeError:
+        # the reader went away, as "head" does: nothing else to write
+        sys.stderr.close()
+    except (OSError, ValueError) as e:
+        print("outlier-detector: error: {}".format(e), file=sys.stderr)
+        return 1
+    finally:
+        if collect:
+            gc.enable()
+    return 0
+
+
+class _Scorer:
+    """Scores the lines of the consumed inputs, keeping the windows of the keys across inputs."""
+
+    def __init__(self, args, detector_kwargs, out):
+        self.detector_kwargs = detector_kwargs
+        self.out = out
+        self.delimiter = args.delimiter.encode()
+        self.header = args.header
+        self.filter = args.filter
+        self.columns = args.key_column is not None or args.value_column is not None
+        self.key_column = args.key_column
+        # the last column by default, as in "key,value"
+        self.value_column = "-1" if args.value_column is None else args.value_column
+        self.scorers = {}
+        # the line endings by score, the filtered output drops outliers and is not annotated
+        if self.filter:
+            self.endings = (b"\n", b"\n", None)
+        else:
+            self.endings = tuple(
+                self.delimiter + str(score).encode() + b"\n" for score in range(3)
+            )
+
+    def consume(self, source, name):
+        live = _is_live(source)
+        if live:
+            batches = _live_batches(source)
+        else:
+            batches = iter(lambda: source.readlines(READ_BYTES), [])
+        lines = next(batches, [])
+        header = None
+        if self.header and lines:
+            header = lines.pop(0).rstrip(b"\r\n")
+            ending = b"\n" if self.filter else self.delimiter + b"score\n"
+            self.out.write(header + ending)
+            header = header.split(self.delimiter)
+        if self.columns:
+            self.key_index = _column_index(self.key_column, header, name)
+            self.value_index = _column_index(self.value_column, header, name)
+        for lines in chain([lines], batches):
+            self.out.write(self.__score_lines__(lines, name))
+            if live:
+                self.out.flush()
+
+    def __score_lines__(self, lines, name):
+        lines = [line.rstrip(b"\r\n") for line in lines]
+        # blank lines are skipped
+        lines = [line for line in lines if line]
+        if not self.columns:
+            samples = _parse(lines, lines, name)
+            score = self.__scorer__(None)
+            scores = [score(sample) for sample in samples]
+        else:
+            rows = [line.split(self.delimiter) for line in lines]
+            try:
+                values = [row[self.value_index] for row in rows]
+                if self.key_index is None:
+                    keys = [None] * len(rows)
+                else:
+                    keys = [row[self.key_index] for row in rows]
+            except IndexError:
+                for line, row in zip(lines, rows):
+                    if not -len(row) <= self.value_index < len(row) or (
+                        self.key_index is not None
+                        and not -len(row) <= self.key_index < len(row)
+                    ):
+                        raise ValueError(
+                            "{}: missing columns, in {!r}".format(
+                                name, line.decode(errors="replace")
+                            )
+                        )
+                raise
+            samples = _parse(values, lines, name)
+            scorers = self.scorers
+            scores = []
+            for key, sample in zip(keys, samples):
+                score = scorers.get(key)
+                if score is None:
+                    score = self.__scorer__(key)
+                scores.append(score(sample))
+        endings = self.endings
+        return b"".join(
+            [
+                line + endings[score]
+                for line, score in zip(lines, scores)
+                if endings[score] is not None
+            ]
+        )
+
+    def __scorer__(self, key):
+        score = self.scorers.get(key)
+        if score is None:
+            score = OutlierDetector(**self.detector_kwargs).__outlier_score__
+            self.scorers[key] = score
+        return score
+
+
+def _is_live(source):
+    """Whether the source is a pipe or a terminal, whose lines are scored as they arrive, instead of a regular file."""
+    try:
+        return not stat.S_ISREG(os.fstat(source.fileno()).st_mode)
+    except (OSError, ValueError):
+        # in-memory streams have no file descriptor
+        return False
+
+
+def _live_batches(source):
+    """The lines of a buffered source in batches of the lines available at once, without waiting for more."""
+    pending = b""
+    while True:
+        chunk = source.read1(READ_BYTES)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        if lines:
+            yield lines
+    if pending:
+        yield [pending]
+
+
+def _parse(values, lines, name):
+    """Parses the values at once, looking for the faulty one only when that fails."""
+    try:
+        return list(map(float, values))
+    except ValueError:
+        for value, line in zip(values, lines):
+            try:
+                float(value)
+            except ValueError:
+                raise ValueError(
+                    "{}: not a number {!r}, in {!r}".format(
+                        name,
+                        value.decode(errors="replace"),
+                        line.decode(errors="replace"),
+                    )
+                )
+        raise
+
+
+def _column_index(column, header, name):
+    """The index of a column given as a 0-based index (negative from the end) or, with a header, as a name."""
+    if column is None:
+        return None
+    if column.lstrip("-").isdigit():
+        return int(column)
+    if header is None:
+        raise ValueError(
+            "{}: column {!r} is not an index and the input has no header".format(
+                name, column
+            )
+        )
+    try:
+        return header.index(column.encode())
+    except ValueError:
+        raise ValueError("{}: no column {!r} in the header".format(name, column))
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="outlier-detector",
+        description="Score the numbers read line by line, writing each line followed by its score: 0 for valid "
+        "samples, 1 for warning, 2 for outliers. Outliers are not stored in the windows.",
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help="the input files, the standard input when none or -",
+    )
+    parser.add_argument(
+        "-k",
+        "--key-column",
+        help="the column of the series keys, as a 0-based index or a header name: each key gets its own window",
+    )
+    parser.add_argument(
+        "-v",
+        "--value-column",
+        help="the column of the samples, as a 0-based index or a header name, the last one by default. Without key "
+        "and value columns each line is a sample",
+    )
+    parser.add_argument(
+        "-d", "--delimiter", default=",", help="the columns delimiter, ',' by default"
+    )
+    parser.add_argument(
+        "--header",
+        action="store_true",
+        help="the first line of each input names the columns",
+    )
+    parser.add_argument(
+        "-f",
+        "--filter",
+        action="store_true",
+        help="write the valid and warning lines only, without scores",
+    )
+    parser.add_argument("-c", "--confidence", type=float, default=0.95)
+    parser.add_argument("-b", "--buffer-samples", type=int, default=14)
+    parser.add_argument("-s", "--sigma-threshold", type=float, default=2)
+    parser.add_argument(
+        "--statistic", choices=tuple(STATISTICS) + ("auto",), default="r10"
+    )
+    parser.add_argument(
+        "--method", choices=("dixon",) + tuple(ENGINES), default="dixon"
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,403 @@
+"""
+Critical values for the double tailed Dixon's Q-test beyond the hard-coded ``Qvals``. Tables for more confidence levels,
+up to ``MAX_SAMPLES`` samples and for the r11, r21 and r22 statistics are estimated by Monte-Carlo simulation of the
+Dixon's statistics over normal samples, and shipped with the package in a cache file loaded on first use. To regenerate
+the cache file run ``python -m outlier_detector.critical_values``.
+
+The critical values of the other engines (see ``outlier_detector.engines``) are computed exactly, for any confidence
+and number of samples.
+"""
+
+import json
+import os
+import random
+from functools import lru_cache
+from math import erfc, exp, lgamma, log, log1p, pi, sqrt
+from typing import Dict, Iterable, Tuple
+
+from outlier_detector import Qvals
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, simulations fall back to pure Python
+    np = None
+
+MAX_SAMPLES = 101
+"""The largest number of samples (window plus the new sample) covered by the shipped tables"""
+MAX_BUFFER_SAMPLES = MAX_SAMPLES - 1
+"""The largest window length accepted by detectors and functions"""
+CACHE_FILE = os.path.join(os.path.dirname(__file__), "critical_values.json")
+"""The cache file shipped with the package"""
+
+STATISTICS = {"r10": (1, 0), "r11": (1, 1), "r21": (2, 1), "r22": (2, 2)}
+"""
+Dixon's statistics: for the sample at each end, the rank of the sample closing the gap and the number of samples at the
+other end excluded from the range. For instance r21 = (x[n] - x[n-2]) / (x[n] - x[2]) for the largest sample.
+"""
+
+_tables = None
+
+
+def auto_statistic(samples: int) -> str:
+    """
+    :param samples: the number of samples, including the one under test
+    :return: the Dixon's statistic recommended for the number of samples: r10 up to 7, r11 up to 10, r21 up to 13 and
+             r22 beyond
+    """
+    if samples <= 7:
+        return "r10"
+    if samples <= 10:
+        return "r11"
+    if samples <= 13:
+        return "r21"
+    return "r22"
+
+
+def critical_values(
+    confidence: float, samples: int = 3, statistic: str = "r10"
+) -> Dict[int, float]:
+    """
+    Returns the critical values of the double tailed Dixon's Q-test for the given ``confidence``, indexed by the
+    number of samples. The hard-coded ``Qvals`` are returned when they cover ``samples``, otherwise the cached tables
+    are loaded.
+
+    :param confidence: the confidence, between 0 and 1
+    :param samples: the largest number of samples the table must cover
+    :param statistic: one of the ``STATISTICS``
+    :return: the table of critical values
+    :raises ValueError: when there is no table for the confidence covering the number of samples
+    """
+    if statistic == "r10":
+        table = Qvals.get(confidence)
+        if table is not None and samples in table:
+            return table
+
+    if statistic not in STATISTICS:
+        raise ValueError(
+            'Statistic "{}" unknown, please pick one in {}'.format(
+                statistic, list(STATISTICS)
+            )
+        )
+    tables = _load()[statistic]
+    table = tables.get(round(confidence, 6))
+    if table is None or samples not in table:
+        raise ValueError(
+            "Confidence value not tabled, please pick between {}".format(
+                ", ".join("{:.3g}".format(c) for c in sorted(tables))
+            )
+        )
+    return table
+
+
+def dixon_ratio(window, position, first=0, last=None, gap=1, trim=0) -> float:
+    """
+    Dixon's statistic of the sample at ``position`` in the sorted ``window[first:last + 1]``, 0 if it is not an extreme.
+    ``gap`` and ``trim`` are the statistic ranks, see ``STATISTICS``, and default to the r10 statistic.
+    """
+    if last is None:
+        last = len(window) - 1
+    if position == first:
+        gap = window[first + gap] - window[first]
+        span = window[last - trim] - window[first]
+    elif position == last:
+        gap = window[last] - window[last - gap]
+        span = window[last] - window[first + trim]
+    else:
+        return 0
+    return gap / span if span else 0
+
+
+@lru_cache(maxsize=None)
+def statistic_tables(
+    confidence: float, samples: int, statistic: str = "r10"
+) -> Tuple[Dict[int, float], Dict[int, Tuple[int, int]]]:
+    """
+    Returns the critical values along with the statistic ranks (see ``STATISTICS``), both indexed by the number of
+    samples. With statistic 'auto' both follow ``auto_statistic``. The results are cached, do not modify them.
+
+    :param confidence: the confidence, between 0 and 1
+    :param samples: the largest number of samples the tables must cover
+    :param statistic: one of the ``STATISTICS`` or 'auto'
+    :raises ValueError: when there is no table for the confidence covering the number of samples
+    """
+    if statistic != "auto":
+        table = critical_values(confidence, samples, statistic)
+        ranks = STATISTICS[statistic]
+        return table, {n: ranks for n in table}
+
+    table = {}
+    ranks = {}
+    for n in range(3, samples + 1):
+        statistic = auto_statistic(n)
+        table[n] = critical_values(confidence, samples, statistic)[n]
+        ranks[n] = STATISTICS[statistic]
+    return table, ranks
+
+
+@lru_cache(maxsize=None)
+def grubbs_critical_value(confidence: float, samples: int) -> float:
+    """
+    Critical value of the double tailed Grubbs' test, from the Student's t distribution with ``samples`` - 2 degrees
+    of freedom.
+
+    :param confidence: the confidence, between 0 and 1
+    :param samples: the number of samples, including the one under test, at least 3
+    """
+    degrees = samples - 2
+    t = _t_quantile((1 - confidence) / (2 * samples), degrees)
+    return (samples - 1) / sqrt(samples) * sqrt(t * t / (degrees + t * t))
+
+
+@lru_cache(maxsize=None)
+def t_critical_value(confidence: float, samples: int, degrees: float) -> float:
+    """
+    Critical value of a double tailed test of the distance of a sample from the window centre, in estimated standard
+    deviations, with the ``confidence`` holding for the whole window as in Grubbs' test: the Student's t quantile
+    leaving out ``(1 - confidence) / samples`` of the distribution.
+
+    :param confidence: the confidence, between 0 and 1
+    :param samples: the number of samples, including the one under test
+    :param degrees: the degrees of freedom of the standard deviation estimate, not necessarily an integer
+    """
+    return _t_quantile((1 - confidence) / (2 * samples), degrees)
+
+
+@lru_cache(maxsize=None)
+def normal_critical_value(confidence: float) -> float:
+    """
+    Critical value of a double tailed z-test: the number of standard deviations leaving out ``1 - confidence`` of a
+    normal distribution.
+
+    :param confidence: the confidence, between 0 and 1
+    """
+    return _normal_quantile((1 - confidence) / 2)
+
+
+def add_critical_values(
+    confidence: float, table: Dict[int, float], statistic: str = "r10"
+) -> None:
+    """
+    Makes a table for a confidence available to detectors and functions for the current process, for instance a table
+    computed with ``simulate_critical_values``.
+
+    :param confidence: the confidence, between 0 and 1
+    :param table: the critical values indexed by the number of samples
+    :param statistic: one of the ``STATISTICS``
+    """
+    _load()[statistic][round(confidence, 6)] = dict(table)
+    statistic_tables.cache_clear()
+
+
+def simulate_critical_values(
+    confidences: Iterable[float],
+    max_samples: int = MAX_SAMPLES,
+    trials: int = 200000,
+    seed: int = 0,
+    statistic: str = "r10",
+) -> Dict[float, Dict[int, float]]:
+    """
+    Estimates the critical values of the double tailed Dixon's Q-test, as the ``confidence`` quantiles of the largest
+    of the two ratios (one per end) over ``trials`` sets of normal samples. The estimates are smoothed so that they
+    never grow with the number of samples, as the exact values do. It takes seconds per sample size with numpy, much
+    longer without.
+
+    :param confidences: the confidences, between 0 and 1
+    :param max_samples: the tables cover from the fewest samples the statistic is defined for (3 for r10, 4 for r11,
+           5 for r21 and 6 for r22) up to ``max_samples`` samples
+    :param trials: the number of simulated sets of samples per size
+    :param seed: the random generator seed
+    :param statistic: one of the ``STATISTICS``
+    :return: the critical values, indexed by confidence and number of samples
+    """
+    confidences = list(confidences)
+    for confidence in confidences:
+        if not 0 < confidence < 1:
+            raise ValueError("Confidence should be between 0 and 1")
+    gap, trim = STATISTICS[statistic]
+
+    tables = {confidence: {} for confidence in confidences}
+    simulate = _simulate_ratios if np is None else _simulate_ratios_numpy
+    rng = random.Random(seed) if np is None else np.random.default_rng(seed)
+    for n in range(2 + gap + trim, max_samples + 1):
+        ratios = simulate(rng, n, trials, gap, trim)
+        for confidence in confidences:
+            tables[confidence][n] = _quantile(ratios, confidence)
+    for confidence, table in tables.items():
+        smoothed = _non_increasing([table[n] for n in sorted(table)])
+        tables[confidence] = {n: round(q, 4) for n, q in zip(sorted(table), smoothed)}
+    return tables
+
+
+def _load():
+    global _tables
+    if _tables is None:
+        with open(CACHE_FILE) as fh:
+            cached = json.load(fh)
+        _tables = {}
+        for statistic in STATISTICS:
+            _tables[statistic] = {}
+            for confidence, table in cached.get(statistic, {}).items():
+                confidence = float(confidence)
+                table = {int(n): q for n, q in table.items()}
+                if statistic == "r10":
+                    # the hard-coded values take precedence, not to change the results of small windows
+                    table.update(Qvals.get(confidence, {}))
+                _tables[statistic][confidence] = table
+    return _tables
+
+
+def _simulate_ratios(rng, n, trials, gap, trim):
+    ratios = []
+    for _ in range(trials):
+        x = sorted(rng.gauss(0, 1) for _ in range(n))
+        low = (x[gap] - x[0]) / (x[-1 - trim] - x[0])
+        high = (x[-1] - x[-1 - gap]) / (x[-1] - x[trim])
+        ratios.append(max(low, high))
+    ratios.sort()
+    return ratios
+
+
+def _simulate_ratios_numpy(rng, n, trials, gap, trim, chunk=50000):
+    ratios = []
+    ranks = sorted({0, gap, trim, n - 1 - trim, n - 1 - gap, n - 1})
+    for start in range(0, trials, chunk):
+        x = rng.standard_normal((min(chunk, trials - start), n))
+        x = np.partition(x, ranks, axis=1)
+        low = (x[:, gap] - x[:, 0]) / (x[:, -1 - trim] - x[:, 0])
+        high = (x[:, -1] - x[:, -1 - gap]) / (x[:, -1] - x[:, trim])
+        ratios.append(np.maximum(low, high))
+    return np.sort(np.concatenate(ratios))
+
+
+def _normal_quantile(tail):
+    """Upper ``tail`` quantile of the standard normal distribution, by bisection."""
+    low, high = 0.0, 40.0
+    for _ in range(100):
+        middle = (low + high) / 2
+        if erfc(middle / sqrt(2)) / 2 > tail:
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+def _t_quantile(tail, degrees):
+    """
+    Upper ``tail`` quantile of the Student's t distribution. Newton's method from the normal quantile: the tail is
+    convex, so the iterates grow monotonically to the root.
+    """
+    a = degrees / 2
+    log_norm = lgamma((degrees + 1) / 2) - lgamma(a) - 0.5 * log(degrees * pi)
+    t = _normal_quantile(tail)
+    for _ in range(200):
+        upper = _beta_regularized(a, 0.5, degrees / (degrees + t * t)) / 2
+        density = exp(log_norm - (degrees + 1) / 2 * log1p(t * t / degrees))
+        step = (upper - tail) / density
+        t += step
+        if step < 1e-12 * t:
+            break
+    return t
+
+
+def _beta_regularized(a, b, x):
+    """Regularized incomplete beta function, by continued fraction."""
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = exp(lgamma(a + b) - lgamma(a) - lgamma(b) + a * log(x) + b * log1p(-x))
+    if x < (a + 1) / (a + b + 2):
+        return front * _beta_fraction(a, b, x) / a
+    return 1 - front * _beta_fraction(b, a, 1 - x) / b
+
+
+def _beta_fraction(a, b, x, iterations=1000, eps=1e-15):
+    # modified Lentz's method
+    tiny = 1e-300
+    c = 1.0
+    d = 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > tiny else tiny)
+    fraction = d
+    for m in range(1, iterations + 1):
+        even = m * (b - m) * x / ((a - 1 + 2 * m) * (a + 2 * m))
+        odd = -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 1 + 2 * m))
+        for numerator in (even, odd):
+            d = 1 + numerator * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            delta = d * c
+            fraction *= delta
+        if abs(delta - 1) < eps:
+            break
+    return fraction
+
+
+def _non_increasing(values):
+    """
+    The least squares non-increasing fit of a sequence (antitonic regression): the runs of values growing from the
+    previous ones are replaced by their mean, pooling adjacent runs until no value grows.
+    """
+    # the pooled runs, as [mean, count]
+    runs = []
+    for value in values:
+        runs.append([value, 1])
+        while len(runs) > 1 and runs[-1][0] > runs[-2][0]:
+            mean, count = runs.pop()
+            previous = runs[-1]
+            previous[0] = (previous[0] * previous[1] + mean * count) / (
+                previous[1] + count
+            )
+            previous[1] += count
+    fitted = []
+    for mean, count in runs:
+        fitted.extend([mean] * count)
+    return fitted
+
+
+def _quantile(sorted_values, q):
+    """Linearly interpolated quantile of sorted values, as numpy default."""
+    position = q * (len(sorted_values) - 1)
+    index = int(position)
+    if index + 1 == len(sorted_values):
+        return float(sorted_values[index])
+    fraction = position - index
+    return float(
+        sorted_values[index] * (1 - fraction) + sorted_values[index + 1] * fraction
+    )
+
+
+def _main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Regenerate the cache file of the Dixon's Q-test critical values"
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        nargs="+",
+        default=[0.8, 0.85, 0.9, 0.95, 0.975, 0.99, 0.995, 0.999],
+    )
+    parser.add_argument("--max-samples", type=int, default=MAX_SAMPLES)
+    parser.add_argument("--trials", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=CACHE_FILE)
+    args = parser.parse_args()
+
+    cache = {}
+    for statistic in STATISTICS:
+        tables = simulate_critical_values(
+            args.confidence, args.max_samples, args.trials, args.seed, statistic
+        )
+        cache[statistic] = {
+            str(confidence): {str(n): q for n, q in table.items()}
+            for confidence, table in tables.items()
+        }
+    with open(args.output, "w") as fh:
+        json.dump(cache, fh, indent=1)
+        fh.write("\n")
+
+
+if __name__ == "__main__":
+    _main()
@@ -1,7 +1,37 @@
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from functools import lru_cache
+from math import fsum, sqrt
 from numbers import Real
-from statistics import stdev
+from time import time
+from typing import Hashable, Iterable, List, Sequence, Union
 
-from outlier_detector import Qvals
+from outlier_detector.critical_values import (
+    MAX_BUFFER_SAMPLES,
+    _normal_quantile,
+    critical_values,
+    dixon_ratio,
+    statistic_tables,
+)
+from outlier_detector.engines import (
+    ENGINES,
+    _footprint,
+    _pack_floats,
+    _seed_window,
+    _unpack_floats,
+    _zeros,
+)
+from outlier_detector.metrics import DetectorMetrics
+from outlier_detector.trend import RollingTrend
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, array scoring falls back to typed arrays
+    np = None
 
 
 class OutlierDetector:
@@ -11,50 +41,185 @@ class OutlierDetector:
     the stored distribution samples in buffer. It computes a double tailed Dixon's Q-test, with the given ``confidence``
     , along with testing the standard deviation of the new value considering the boundary (**mean** -``sigma_threshold``
     **sigma**, **mean** + ``sigma_threshold``  **sigma** ).
+
+    Other tests, scaling to windows of thousands of samples, are available through the ``method`` argument, see
+    ``outlier_detector.engines``. With the ``window`` argument the window holds the samples of the last period of time
+    instead of the last ``buffer_samples`` ones, for sensors sampled at irregular rates. With the ``detrend`` argument
+    series with a linear trend are tested by their residuals from a rolling least-squares line.
+
+    Detectors are compact, to hold hundreds of thousands of them: they have no instance dict, the window is stored in
+    typed arrays of doubles and the critical values tables are shared by the detectors with the same configuration. See
+    ``memory_footprint``.
     """
 
+    __slots__ = (
+        "confidence",
+        "statistic",
+        "method",
+        "buffer_samples",
+        "sigma",
+        "resync_interval",
+        "window",
+        "detrend",
+        "metrics",
+        "q",
+        "_ranks",
+        "_min_length",
+        "_engine",
+        "_trend",
+        "_lock",
+        "_buffer",
+        "_ring",
+        "_cursor",
+        "_shift",
+        "_sum",
+        "_sum_squares",
+        "_summed",
+        "_pushes",
+        "_times",
+        "_latest",
+        # the sample evaluation callables, wrapped by the metrics and the lock when requested
+        "__is_outlier__",
+        "__outlier_score__",
+    )
+
     def __init__(
         self,
         confidence: float = 0.95,
         buffer_samples: int = 14,
         sigma_threshold: float = 2,
+        resync_interval: int = 1000,
+        statistic: str = "r10",
+        method: str = "dixon",
+        thread_safe: bool = False,
+        metrics: Union[bool, DetectorMetrics] = False,
+        window: Union[timedelta, float] = None,
+        detrend: bool = False,
     ) -> None:
         """
-        :param buffer_samples: Accepted length is between 5 and 27 samples.
+        :param buffer_samples: Accepted length is between 5 and 100 samples (no upper bound for methods other than
+               'dixon'). With a time ``window`` it caps the number of samples held.
         :param confidence: The confidence for the outlier estimation: since Dixon's test relies on tabled values the
-               available confidence steps are: 0.90, 0.95 and 0.99. Defaults to 0.95. Also percentage values are
-               accepted (i.e. 90, 95 and 99).
+               available confidence steps are: 0.80, 0.85, 0.90, 0.95, 0.975, 0.99, 0.995 and 0.999 (see
+               ``outlier_detector.critical_values``). Defaults to 0.95. Also percentage values are accepted (i.e. 90,
+               95 and 99).
         :param sigma_threshold: multiplier for further analysis, samples outside the sigma range are marked as "warning"
                It must be greater than 0.
+        :param resync_interval: the window mean and variance are updated incrementally, every ``resync_interval``
+               accepted samples they are recomputed exactly to bound the floating point drift. 0 disables it.
+        :param statistic: the Dixon's statistic, 'r10' (gap over range, the default), 'r11', 'r21', 'r22' (excluding
+               the samples next to the extremes, more robust for larger windows) or 'auto' (picked by the number of
+               samples, see ``outlier_detector.critical_values.auto_statistic``). Only for the 'dixon' method.
+        :param method: the test, 'dixon' (Dixon's Q-test, the default), 'grubbs' (Grubbs' test), 'hampel' (median
+               absolute deviation) or 'ewma' (exponentially weighted z-score). Any confidence between 0 and 1 is
+               accepted by the methods other than 'dixon', see ``outlier_detector.engines``.
+        :param thread_safe: serializes the evaluation of the samples with a lock, so that the detector can be shared
+               by many threads. Off by default, as it slows down every call.
+        :param metrics: counts the evaluated samples by outcome and measures their latency, exposing a
+               ``DetectorMetrics`` as the ``metrics`` attribute: True for new metrics, or the metrics to update (for
+               instance holding ``on_outlier`` and ``on_warning`` callbacks). Off by default, as it slows down every
+               call.
+        :param window: the period of time covered by the window, as a ``timedelta`` or in seconds (the ``window``
+               attribute). Each sample is evaluated at a timestamp, see ``is_outlier``, once the samples older than
+               the period are evicted. Results are produced from 5 samples on, regardless of ``buffer_samples``. Only
+               for the 'dixon' method. By default the window holds the last ``buffer_samples`` samples.
+        :param detrend: tests the residual of each sample from the least-squares line of the last ``buffer_samples``
+               samples, by arrival position, instead of the sample itself, see ``outlier_detector.trend``. Outliers are
+               fitted clipped to ``sigma_threshold`` residual standard deviations from the line. The window then holds
+               residuals. The line is updated in O(1) per sample. Not available with a time ``window``.
         """
         if confidence > 1:
             confidence /= 100
-        if not (confidence in Qvals):
-            raise ValueError(
-                "Confidence value not tabled, please pick between 0.90, 0.95, and 0.99"
+        self.confidence = confidence
+        self.statistic = statistic
+        self.method = method
+        self.buffer_samples = buffer_samples
+        self.sigma = sigma_threshold
+        self.resync_interval = resync_interval
+        self.window = None
+        self.detrend = bool(detrend)
+        self._trend = None
+        self._lock = None
+        if window is not None:
+            window = _seconds(window)
+            if window <= 0:
+                raise ValueError("Window should be longer than 0 seconds")
+            if method != "dixon":
+                raise ValueError(
+                    "Time windows are only available for the 'dixon' method"
+                )
+            if detrend:
+                raise ValueError("Detrending is not available with time windows")
+        if method != "dixon":
+            self._engine = _create_engine(
+                method, confidence, buffer_samples, sigma_threshold, resync_interval
             )
-        if buffer_samples < 5 or buffer_samples > 27:
-            raise ValueError(
-                "Buffer distribution must have at least 5 elements and no more than 27"
+            # the engine replaces the Q-test, no dispatch overhead is paid by the default method
+            self.__is_outlier__ = self._engine.is_outlier
+            self.__outlier_score__ = self._engine.score
+        else:
+            self.__setup_dixon__(
+                confidence, buffer_samples, sigma_threshold, resync_interval, statistic
+            )
+            self.__is_outlier__ = self.__dixon_is_outlier__
+            self.__outlier_score__ = self.__dixon_score__
+            if window is not None:
+                self.window = window
+                self._min_length = 5
+                self._times = _zeros(buffer_samples)
+                self._latest = float("-inf")
+                self.__is_outlier__ = self.__timed_is_outlier__
+                self.__outlier_score__ = self.__timed_score__
+        if self.detrend:
+            self._trend = RollingTrend(buffer_samples, resync_interval, sigma_threshold)
+            self.__is_outlier__ = _detrended_is_outlier(
+                self._trend, self.__is_outlier__
+            )
+            self.__outlier_score__ = _detrended_score(
+                self._trend, self.__outlier_score__
             )
-        if sigma_threshold <= 0:
-            raise ValueError("Sigma threshold should be greater than 0")
+        self.metrics = None
+        if metrics:
+            if not isinstance(metrics, DetectorMetrics):
+                metrics = DetectorMetrics()
+            self.metrics = metrics
+            self.__is_outlier__ = metrics.__measure_is_outlier__(self.__is_outlier__)
+            self.__outlier_score__ = metrics.__measure_score__(self.__outlier_score__)
+        if thread_safe:
+            self._lock = threading.Lock()
+            self.__is_outlier__ = _locked(self._lock, self.__is_outlier__)
+            self.__outlier_score__ = _locked(self._lock, self.__outlier_score__)
 
-        self.q = Qvals[confidence]
-        self.buffer_samples = buffer_samples
-        self.sigma = sigma_threshold
-        self._buffer = []
-        self._map = []
-        return
+    def __setup_dixon__(
+        self, confidence, buffer_samples, sigma_threshold, resync_interval, statistic
+    ):
+        self.q, self._ranks = _check_arguments(
+            confidence, buffer_samples, sigma_threshold, resync_interval, statistic
+        )
+        self._min_length = max(5, -(-buffer_samples // 2))
+        self._buffer = array("d")
+        self._ring = _zeros(buffer_samples)
+        self._cursor = 0
+        # running sums of the buffer samples, shifted to reduce the cancellation error of the variance
+        self._shift = 0.0
+        self._sum = 0.0
+        self._sum_squares = 0.0
+        self._summed = 0
+        self._pushes = 0
 
-    def is_outlier(self, new_sample: float) -> bool:
+    def is_outlier(
+        self, new_sample: float, timestamp: Union[datetime, float] = None
+    ) -> bool:
         """
         Evaluates the incoming sample and (in case it is valid) stores it in internal buffer.
 
         Testes if the sample an outlier is an outlier based on Dixon's Q-test with given confidence.
 
         :param new_sample: distribution new sample
+        :param timestamp: when the sample was taken, as a ``datetime`` or in seconds, for detectors with a time
+               ``window`` only: the current time by default. Timestamps must not decrease from a sample to the next
         :return: true in case the sample is outlier
+        :raises ValueError: when the timestamp is older than the previous one, or the window is not a time one
         """
         if not isinstance(new_sample, Real):
             raise TypeError(
@@ -62,64 +227,34 @@ class OutlierDetector:
                     type(new_sample).__name__
                 )
             )
+        if timestamp is None:
+            return self.__is_outlier__(new_sample)
+        return self.__is_outlier__(new_sample, self.__timestamp__(timestamp))
 
-        old_sample_position = len(self._buffer)
-
-        # we don't want to produce results if we don't have at least half the buffer
-        if len(self._buffer) >= self.buffer_samples / 2 and len(self._buffer) >= 5:
-            insertion_point = self.__sorted_insert__(new_sample)
-
-            q = 0
-            if insertion_point == 0:
-                q = abs(self._buffer[1] - self._buffer[0])
-            elif insertion_point == len(self._buffer) - 1:
-                q = abs(self._buffer[-1] - self._buffer[-2])
-
-            try:
-                q /= abs(self._buffer[-1] - self._buffer[0])
-            except ZeroDivisionError:
-                pass
-
-            if q > self.q[len(self._buffer)]:
-                del self._buffer[insertion_point]
-                return True
-
-            if len(self._buffer) > self.buffer_samples:
-                old_sample_position = self._map[0]
-                del self._map[0]
-                del self._buffer[old_sample_position]
-        else:
-            insertion_point = self.__sorted_insert__(new_sample)
-
-        if old_sample_position != insertion_point:
-            for i in range(len(self._map)):
-                if old_sample_position < self._map[i] < insertion_point:
-                    self._map[i] -= 1
-                elif old_sample_position > self._map[i] >= insertion_point:
-                    self._map[i] += 1
-
-        self._map.append(insertion_point)
-
-        return False
-
-    def is_outside_sigma_bound(self, new_sample: float) -> bool:
+    def is_outside_sigma_bound(
+        self, new_sample: float, timestamp: Union[datetime, float] = None
+    ) -> bool:
         """
         Evaluates the incoming sample and (in case it is valid) stores it in internal buffer.
 
         In case the new value is valid the result is False, otherwise if outside the sigma threshold.
 
         :param new_sample: distribution new sample
+        :param timestamp: when the sample was taken, see ``is_outlier``
         :return: True for "warnings" and False for valid samples
         """
-        return self.get_outlier_score(new_sample) > 0
+        return self.get_outlier_score(new_sample, timestamp) > 0
 
-    def get_outlier_score(self, new_sample: float) -> int:
+    def get_outlier_score(
+        self, new_sample: float, timestamp: Union[datetime, float] = None
+    ) -> int:
         """
         Evaluates the incoming sample and (in case it is valid) stores it in internal buffer.
 
         In case the new value is valid the result is 0, otherwise 1 (outside the sigma threshold) or 2 an outlier
         based on Dixon's Q-test with given confidence.
         :param new_sample: distribution new sample
+        :param timestamp: when the sample was taken, see ``is_outlier``
         :return: 0 for valid samples, 1 for warning, 2 for outliers
         """
         if not isinstance(new_sample, Real):
@@ -128,71 +263,913 @@ class OutlierDetector:
                     type(new_sample).__name__
                 )
             )
-        result = 0  # valid sample
-        old_sample_position = len(self._buffer)
+        if timestamp is None:
+            return self.__outlier_score__(new_sample)
+        return self.__outlier_score__(new_sample, self.__timestamp__(timestamp))
+
+    def is_outlier_array(
+        self, new_samples: Sequence[float], timestamps: Sequence[float] = None
+    ) -> Union[List[bool], "np.ndarray"]:
+        """
+        Evaluates a chunk of incoming samples in order, as many ``is_outlier`` calls would do, leaving the detector in
+        the same state. The samples type is validated once for the whole chunk.
+
+        :param new_samples: distribution new samples, a numpy array or any sequence of numbers
+        :param timestamps: the samples timestamps, see ``is_outlier``: a numpy array of numbers or datetimes, or any
+               sequence of numbers or ``datetime``
+        :return: a boolean numpy array (or a list when numpy is missing), True for outliers
+        """
+        is_outlier = self.__is_outlier__
+        new_samples = _as_floats(new_samples)
+        if timestamps is None:
+            outliers = [is_outlier(sample) for sample in new_samples]
+        else:
+            timestamps = self.__timestamps__(timestamps, len(new_samples))
+            outliers = list(map(is_outlier, new_samples, timestamps))
+        return outliers if np is None else np.array(outliers, dtype=bool)
+
+    def score_array(
+        self, new_samples: Sequence[float], timestamps: Sequence[float] = None
+    ) -> Union[array, "np.ndarray"]:
+        """
+        Evaluates a chunk of incoming samples in order, as many ``get_outlier_score`` calls would do, leaving the
+        detector in the same state. The samples type is validated once for the whole chunk.
+
+        :param new_samples: distribution new samples, a numpy array or any sequence of numbers
+        :param timestamps: the samples timestamps, see ``is_outlier_array``
+        :return: an int8 numpy array (or an ``array('b')`` when numpy is missing) holding 0 for valid samples, 1 for
+                 warning, 2 for outliers
+        """
+        score = self.__outlier_score__
+        new_samples = _as_floats(new_samples)
+        if timestamps is None:
+            scores = [score(sample) for sample in new_samples]
+        else:
+            timestamps = self.__timestamps__(timestamps, len(new_samples))
+            scores = list(map(score, new_samples, timestamps))
+        return array("b", scores) if np is None else np.array(scores, dtype=np.int8)
+
+    def prime(
+        self,
+        samples: Sequence[float],
+        validate: bool = False,
+        timestamps: Sequence[float] = None,
+    ) -> int:
+        """
+        Seeds the window with historical samples, oldest first, so that a new or restarted detector produces results
+        from the next sample on, instead of accepting every sample until half its window is filled. The samples are
+        appended to the window in order, the oldest ones are evicted once it is full. They are not counted by the
+        metrics.
+
+        :param samples: the historical samples, a numpy array or any sequence of numbers
+        :param validate: tests each sample as ``is_outlier`` does, storing the valid ones only. By default all of them
+               are stored without testing, the window being sorted once
+        :param timestamps: the samples timestamps, see ``is_outlier_array``. Required by time windows, the samples
+               older than the window period at the last timestamp are not stored
+        :return: the number of samples stored
+        :raises ValueError: when the timestamps are missing or decrease, or the window is not a time one
+        """
+        samples = _as_floats(samples)
+        if timestamps is not None:
+            timestamps = self.__timestamps__(timestamps, len(samples))
+        elif self.window is not None:
+            raise ValueError("Priming a time window requires the samples timestamps")
+        if self._lock is not None:
+            with self._lock:
+                return self.__prime__(samples, validate, timestamps)
+        return self.__prime__(samples, validate, timestamps)
+
+    def to_bytes(self) -> bytes:
+        """
+        Snapshots the detector configuration and state (window, arrival order and running statistics) in a compact
+        binary format, samples are stored as doubles. See ``from_bytes``.
+
+        :return: the snapshot
+        """
+        if self._lock is not None:
+            with self._lock:
+                return self.__snapshot__()
+        return self.__snapshot__()
+
+    @classmethod
+    def from_bytes(
+        cls,
+        data: bytes,
+        thread_safe: bool = False,
+        metrics: Union[bool, DetectorMetrics] = False,
+    ) -> "OutlierDetector":
+        """
+        Restores a detector from a ``to_bytes`` snapshot, it scores the next samples as the snapshot detector would.
+
+        :param data: the snapshot, any bytes-like object
+        :param thread_safe: whether the restored detector is thread safe, see ``OutlierDetector``
+        :param metrics: the metrics of the restored detector, see ``OutlierDetector``. They are not part of the snapshot
+        :return: the restored detector
+        :raises ValueError: when data is not a valid snapshot
+        """
+        data = memoryview(data).cast("B")
+        try:
+            (
+                magic,
+                version,
+                method,
+                statistic,
+                confidence,
+                buffer_samples,
+                sigma_threshold,
+                resync_interval,
+            ) = _SNAPSHOT_HEADER.unpack_from(data)
+            if magic != _SNAPSHOT_MAGIC or version not in _SNAPSHOT_VERSIONS:
+                raise ValueError
+            state = data[_SNAPSHOT_HEADER.size :]
+            window = None
+            detrend = False
+            if version == _EXTENDED_SNAPSHOT_VERSION:
+                window, detrend = _EXTENDED_HEADER.unpack_from(state)
+                state = state[_EXTENDED_HEADER.size :]
+            detector = cls(
+                confidence=confidence,
+                buffer_samples=buffer_samples,
+                sigma_threshold=sigma_threshold,
+                resync_interval=resync_interval,
+                statistic=statistic.rstrip(b"\0").decode(),
+                method=method.rstrip(b"\0").decode(),
+                thread_safe=thread_safe,
+                metrics=metrics,
+                window=window or None,
+                detrend=detrend,
+            )
+            if detrend:
+                size = len(state) - detector._trend.__state_size__()
+                if size < 0:
+                    raise ValueError
+                detector._trend.__restore__(state[size:])
+                state = state[:size]
+            if detector.method != "dixon":
+                detector._engine.__restore__(state)
+            else:
+                detector.__restore__(state)
+        except (ValueError, UnicodeDecodeError, struct.error):
+            raise ValueError("Invalid outlier detector snapshot")
+        return detector
+
+    def __reduce__(self):
+        # the evaluation callables are closures over the state, that copy and pickle cannot rebind to a new detector
+        return (
+            type(self).from_bytes,
+            (self.to_bytes(), self._lock is not None, self.metrics or False),
+        )
+
+    def __snapshot__(self):
+        extended = self.window is not None or self.detrend
+        header = _SNAPSHOT_HEADER.pack(
+            _SNAPSHOT_MAGIC,
+            _EXTENDED_SNAPSHOT_VERSION if extended else _SNAPSHOT_VERSION,
+            self.method.encode(),
+            self.statistic.encode(),
+            self.confidence,
+            self.buffer_samples,
+            self.sigma,
+            self.resync_interval,
+        )
+        if extended:
+            header += _EXTENDED_HEADER.pack(self.window or 0.0, self.detrend)
+        state = self._engine.__dump__() if self.method != "dixon" else self.__dump__()
+        if self.detrend:
+            state += self._trend.__dump__()
+        return header + state
+
+    def memory_footprint(self) -> int:
+        """
+        The memory held by the detector alone, as measured by ``sys.getsizeof``: the object, its window and running
+        statistics, its evaluation callables, the engine of the methods other than 'dixon' and the ``detrend`` line.
+        The critical values tables and the configuration values, shared by the detectors with the same configuration,
+        are not counted, nor are the lock and the metrics.
+
+        :return: the size in bytes
+        """
+        size = sum(map(sys.getsizeof, (self.__is_outlier__, self.__outlier_score__)))
+        if self.detrend:
+            size += self._trend.__footprint__()
+        if self.method != "dixon":
+            return _footprint(self) + size + self._engine.__footprint__()
+        if self.window is not None:
+            size += sum(map(sys.getsizeof, (self.window, self._times, self._latest)))
+        return size + _footprint(
+            self, self._buffer, self._ring, self._shift, self._sum, self._sum_squares
+        )
+
+    def __prime__(self, samples, validate, timestamps):
+        if timestamps is not None:
+            previous = self._latest
+            for timestamp in timestamps:
+                if timestamp < previous:
+                    raise ValueError(_decreasing(timestamp, previous))
+                previous = timestamp
+        target = self if self.method == "dixon" else self._engine
+        if validate:
+            if timestamps is not None:
+                outliers = map(self.__timed_is_outlier__, samples, timestamps)
+            else:
+                is_outlier = (
+                    self.__dixon_is_outlier__ if target is self else target.is_outlier
+                )
+                if self.detrend:
+                    is_outlier = _detrended_is_outlier(self._trend, is_outlier)
+                outliers = map(is_outlier, samples)
+            return len(samples) - sum(outliers)
+        if timestamps is not None:
+            self.__seed__(samples, timestamps)
+        elif self.detrend:
+            residual = self._trend.residual
+            push = self._trend.push
+            residuals = []
+            for sample in samples:
+                residuals.append(residual(sample))
+                push(sample)
+            target.__seed__(residuals)
+        else:
+            target.__seed__(samples)
+        return len(samples)
+
+    def __seed__(self, samples, timestamps=None):
+        length = len(self._buffer)
+        window = _seed_window(self._ring, length, self._cursor, samples)
+        if timestamps is not None:
+            times = _seed_window(self._times, length, self._cursor, timestamps)
+            if timestamps:
+                self._latest = timestamps[-1]
+            expired = bisect_right(times, self._latest - self.window)
+            window = window[expired:]
+            self._times[: len(window)] = array("d", times[expired:])
+        self._cursor = len(window) % self.buffer_samples
+        self._ring[: len(window)] = array("d", window)
+        self._buffer = array("d", sorted(window))
+        self.__resync__()
+
+    def __timed_is_outlier__(self, new_sample, timestamp=None):
+        cursor = self.__expire__(time() if timestamp is None else timestamp)
+        if self.__dixon_is_outlier__(new_sample):
+            return True
+        self._times[cursor] = self._latest
+        return False
+
+    def __timed_score__(self, new_sample, timestamp=None):
+        cursor = self.__expire__(time() if timestamp is None else timestamp)
+        score = self.__dixon_score__(new_sample)
+        if score != 2:
+            self._times[cursor] = self._latest
+        return score
+
+    def __expire__(self, timestamp):
+        """
+        Evicts the samples older than the window period at the given timestamp, returning the ring slot of the next
+        stored sample.
+        """
+        if timestamp < self._latest:
+            raise ValueError(_decreasing(timestamp, self._latest))
+        self._latest = timestamp
+        n = len(self._buffer)
+        oldest = self._cursor - n
+        if oldest < 0:
+            oldest += self.buffer_samples
+        limit = timestamp - self.window
+        times = self._times
+        if not n or times[oldest] > limit:
+            return self._cursor
+
+        # the times grow from the oldest sample on, through the end of the ring: the expired ones are bisected
+        end = oldest + n
+        expired = bisect_right(times, limit, oldest, min(end, self.buffer_samples))
+        if expired == self.buffer_samples and end > self.buffer_samples:
+            expired += bisect_right(times, limit, 0, end - self.buffer_samples)
+        expired -= oldest
+        if expired * 4 < n:
+            buffer = self._buffer
+            ring = self._ring
+            for position in range(oldest, oldest + expired):
+                sample = ring[position % self.buffer_samples]
+                del buffer[bisect_left(buffer, sample)]
+                sample -= self._shift
+                self._sum -= sample
+                self._sum_squares -= sample * sample
+            self._summed -= expired
+        else:
+            # evicting a large part of the window, sorting the rest is cheaper
+            self._buffer = array(
+                "d", sorted(_seed_window(self._ring, n - expired, self._cursor, ()))
+            )
+            self.__resync__()
+        return self._cursor
+
+    def __timestamp__(self, timestamp):
+        if self.window is None:
+            raise ValueError(
+                "Timestamps are only accepted by detectors with a time window"
+            )
+        return _seconds(timestamp)
 
+    def __timestamps__(self, timestamps, count):
+        if self.window is None:
+            raise ValueError(
+                "Timestamps are only accepted by detectors with a time window"
+            )
+        if np is not None and isinstance(timestamps, np.ndarray):
+            if timestamps.dtype.kind == "M":
+                timestamps = (timestamps - np.datetime64(0, "s")) / np.timedelta64(
+                    1, "s"
+                )
+            timestamps = _as_floats(timestamps)
+        else:
+            timestamps = [_seconds(timestamp) for timestamp in timestamps]
+        if len(timestamps) != count:
+            raise ValueError(
+                "Got {} samples and {} timestamps".format(count, len(timestamps))
+            )
+        return timestamps
+
+    def __dixon_is_outlier__(self, new_sample):
+        buffer = self._buffer
         # we don't want to produce results if we don't have at least half the buffer
-        if len(self._buffer) >= self.buffer_samples / 2 and len(self._buffer) >= 5:
-            mu = sum(self._buffer) / float(len(self._buffer))
-            sd = stdev(self._buffer)
+        check = len(buffer) >= self._min_length
+
+        insertion_point = bisect_left(buffer, new_sample)
+        if insertion_point < len(buffer) and new_sample >= buffer[-1]:
+            # ties with the largest sample are tested as the largest, as is_outlier does
+            insertion_point = len(buffer)
+        buffer.insert(insertion_point, new_sample)
+        if check:
+            n = len(buffer)
+            gap, trim = self._ranks[n]
+            if dixon_ratio(buffer, insertion_point, 0, n - 1, gap, trim) > self.q[n]:
+                del buffer[insertion_point]
+                return True
 
-            insertion_point = self.__sorted_insert__(new_sample)
+        self.__push__(new_sample)
+        return False
 
-            q = 0
-            if insertion_point == 0:
-                q = abs(self._buffer[1] - self._buffer[0])
-            elif insertion_point == len(self._buffer) - 1:
-                q = abs(self._buffer[-1] - self._buffer[-2])
+    def __dixon_score__(self, new_sample):
+        buffer = self._buffer
+        result = 0  # valid sample
 
-            try:
-                q /= abs(self._buffer[-1] - self._buffer[0])
-            except ZeroDivisionError:
-                pass
+        # we don't want to produce results if we don't have at least half the buffer
+        check = len(buffer) >= self._min_length
+        if check:
+            mu, sd = self.__mean_stdev__()
 
-            if q > self.q[len(self._buffer)]:
-                del self._buffer[insertion_point]
+        insertion_point = bisect_left(buffer, new_sample)
+        if insertion_point < len(buffer) and new_sample >= buffer[-1]:
+            # ties with the largest sample are tested as the largest, as is_outlier does
+            insertion_point = len(buffer)
+        buffer.insert(insertion_point, new_sample)
+
+        if check:
+            n = len(buffer)
+            gap, trim = self._ranks[n]
+            if dixon_ratio(buffer, insertion_point, 0, n - 1, gap, trim) > self.q[n]:
+                del buffer[insertion_point]
                 return 2  # outlier
 
-            if new_sample > (mu + float(self.sigma) * sd) or new_sample < (
-                mu - float(self.sigma) * sd
-            ):
+            bound = float(self.sigma) * sd
+            if new_sample > mu + bound or new_sample < mu - bound:
                 result = 1  # valid, but outside sigma bound
 
-            if len(self._buffer) > self.buffer_samples:
-                old_sample_position = self._map[0]
-                del self._map[0]
-                del self._buffer[old_sample_position]
+        self.__push__(new_sample)
+        return result
+
+    def __mean_stdev__(self):
+        n = len(self._buffer)
+        if n != self._summed:
+            # the buffer has been altered bypassing __push__
+            self.__resync__()
+        if self._buffer[0] == self._buffer[-1]:
+            # flat window, avoid reporting the rounding error of the running sums as deviation
+            return self._buffer[0], 0.0
+        mu = self._sum / n
+        variance = (self._sum_squares - self._sum * mu) / (n - 1)
+        return self._shift + mu, sqrt(variance) if variance > 0 else 0.0
+
+    def __resync__(self):
+        n = len(self._buffer)
+        self._shift = fsum(self._buffer) / n if n else 0.0
+        self._sum = fsum(x - self._shift for x in self._buffer)
+        self._sum_squares = fsum((x - self._shift) ** 2 for x in self._buffer)
+        self._summed = n
+        self._pushes = 0
+
+    def __push__(self, new_sample):
+        # The ring holds the accepted samples in arrival order: the slot under the cursor is the oldest one, so
+        # once the window is full it is evicted from the sorted buffer and overwritten by the new sample.
+        if len(self._buffer) > self.buffer_samples:
+            oldest = self._ring[self._cursor]
+            del self._buffer[bisect_left(self._buffer, oldest)]
+            oldest -= self._shift
+            self._sum -= oldest
+            self._sum_squares -= oldest * oldest
         else:
-            insertion_point = self.__sorted_insert__(new_sample)
+            if not self._summed:
+                self._shift = float(new_sample)
+            self._summed += 1
+        self._ring[self._cursor] = new_sample
+        self._cursor += 1
+        if self._cursor == self.buffer_samples:
+            self._cursor = 0
 
-        if old_sample_position != insertion_point:
-            for i in range(len(self._map)):
-                if old_sample_position < self._map[i] < insertion_point:
-                    self._map[i] -= 1
-                elif old_sample_position > self._map[i] >= insertion_point:
-                    self._map[i] += 1
+        new_sample -= self._shift
+        self._sum += new_sample
+        self._sum_squares += new_sample * new_sample
+        self._pushes += 1
+        if self._pushes == self.resync_interval:
+            self.__resync__()
 
-        self._map.append(insertion_point)
+    def __dump__(self):
+        state = _DIXON_STATE.pack(
+            len(self._buffer),
+            self._cursor,
+            self._summed,
+            self._pushes,
+            self._shift,
+            self._sum,
+            self._sum_squares,
+        ) + _pack_floats(self._buffer, self._ring)
+        if self.window is not None:
+            state += _TIMESTAMP.pack(self._latest) + _pack_floats(self._times)
+        return state
 
-        return result
+    def __restore__(self, state):
+        (
+            length,
+            self._cursor,
+            self._summed,
+            self._pushes,
+            self._shift,
+            self._sum,
+            self._sum_squares,
+        ) = _DIXON_STATE.unpack_from(state)
+        state = state[_DIXON_STATE.size :]
+        if self.window is not None:
+            size = 8 * (length + self.buffer_samples)
+            (self._latest,) = _TIMESTAMP.unpack_from(state, size)
+            (self._times,) = _unpack_floats(
+                state[size + _TIMESTAMP.size :], self.buffer_samples
+            )
+            state = state[:size]
+        self._buffer, self._ring = _unpack_floats(state, length, self.buffer_samples)
+        if length > self.buffer_samples or not 0 <= self._cursor < self.buffer_samples:
+            raise ValueError
+
+
+class DetectorBank:
+    """
+    Holds the windows of many keyed distributions, each one behaving as an ``OutlierDetector`` with the same shared
+    configuration. Instead of one object per distribution, the windows are stored in contiguous typed arrays with a
+    fixed size slot per key, so the memory used grows by a predictable amount for each new key.
+    """
 
-    def __sorted_insert__(self, new_value, start=0, end=None):
-        if end is None:
-            end = len(self._buffer)
-        assert type(start) is int
-        assert type(end) is int
-        assert 0 <= start <= len(self._buffer)
-        assert 0 <= end <= len(self._buffer)
-        assert start <= end
-
-        pivot = (end + start) // 2
-        insertion = pivot
-        if start != end:
-            if new_value > self._buffer[pivot]:
-                return self.__sorted_insert__(new_value, pivot + 1, end)
-            elif new_value < self._buffer[pivot]:
-                return self.__sorted_insert__(new_value, start, pivot)
+    def __init__(
+        self,
+        confidence: float = 0.95,
+        buffer_samples: int = 14,
+        sigma_threshold: float = 2,
+        resync_interval: int = 1000,
+        statistic: str = "r10",
+    ) -> None:
+        """
+        :param confidence: the confidence for the outlier estimation, see ``OutlierDetector``
+        :param buffer_samples: the window length of each distribution, see ``OutlierDetector``
+        :param sigma_threshold: multiplier for the "warning" sigma range, see ``OutlierDetector``
+        :param resync_interval: accepted samples between exact recomputations of the window statistics, see
+               ``OutlierDetector``
+        :param statistic: the Dixon's statistic, see ``OutlierDetector``
+        """
+        self.q, self._ranks = _check_arguments(
+            confidence, buffer_samples, sigma_threshold, resync_interval, statistic
+        )
+        self.buffer_samples = buffer_samples
+        self.sigma = float(sigma_threshold)
+        self.resync_interval = resync_interval
+        self._min_length = max(5, -(-buffer_samples // 2))
+        # each slot holds the sorted window (with room for the sample under test) followed by the arrival ring
+        self._width = 2 * buffer_samples + 1
+        self._slots = {}
+        self._free_slots = []
+        self._windows = array("d")
+        self._lengths = array("l")
+        self._cursors = array("l")
+        self._pushes = array("l")
+        self._shifts = array("d")
+        self._sums = array("d")
+        self._sum_squares = array("d")
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    def keys(self) -> Iterable[Hashable]:
+        """
+        :return: the keys of the distributions held by the bank
+        """
+        return self._slots.keys()
+
+    def remove(self, key: Hashable) -> None:
+        """
+        Drops the window of the given distribution, its slot is reused by the next new key.
+
+        :param key: the distribution identifier
+        :raises KeyError: when the key is unknown
+        """
+        self._free_slots.append(self._slots.pop(key))
+
+    def score(self, key: Hashable, new_sample: float) -> int:
+        """
+        Evaluates the incoming sample of the distribution identified by ``key`` and (in case it is valid) stores it
+        in the distribution window, like ``OutlierDetector.get_outlier_score``. Unknown keys get a new empty window.
+
+        :param key: the distribution identifier
+        :param new_sample: distribution new sample
+        :return: 0 for valid samples, 1 for warning, 2 for outliers
+        """
+        if not isinstance(new_sample, Real):
+            raise TypeError(
+                'Cannot search outliers of not numeric or not compatible datatypes "{}"'.format(
+                    type(new_sample).__name__
+                )
+            )
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self.__allocate__(key)
+        return self.__score__(slot, new_sample)
+
+    def score_many(
+        self, keys: Iterable[Hashable], new_samples: Iterable[float]
+    ) -> List[int]:
+        """
+        Evaluates a batch of samples, each one belonging to the distribution with the key in the same position. The
+        samples are processed in order, so a key may appear more than once.
+
+        :param keys: the distribution identifiers
+        :param new_samples: the distributions new samples
+        :return: the scores, 0 for valid samples, 1 for warning, 2 for outliers
+        """
+        keys = list(keys)
+        new_samples = list(new_samples)
+        if len(keys) != len(new_samples):
+            raise ValueError(
+                "Got {} keys and {} samples".format(len(keys), len(new_samples))
+            )
+        for new_sample in new_samples:
+            if not isinstance(new_sample, Real):
+                raise TypeError(
+                    'Cannot search outliers of not numeric or not compatible datatypes "{}"'.format(
+                        type(new_sample).__name__
+                    )
+                )
+
+        slots = self._slots
+        allocate = self.__allocate__
+        score = self.__score__
+        results = []
+        for key, new_sample in zip(keys, new_samples):
+            slot = slots.get(key)
+            if slot is None:
+                slot = allocate(key)
+            results.append(score(slot, new_sample))
+        return results
+
+    def prime(
+        self, key: Hashable, samples: Sequence[float], validate: bool = False
+    ) -> int:
+        """
+        Seeds the window of the distribution identified by ``key`` with historical samples, oldest first, like
+        ``OutlierDetector.prime``. Unknown keys get a new window. New keys can be seeded from their siblings with
+        ``pooled_window``.
+
+        :param key: the distribution identifier
+        :param samples: the historical samples, a numpy array or any sequence of numbers
+        :param validate: tests each sample as ``score`` does, storing the valid ones only. By default all of them are
+               stored without testing, the window being sorted once
+        :return: the number of samples stored
+        """
+        samples = _as_floats(samples)
+        if validate:
+            scores = self.score_many([key] * len(samples), samples)
+            return len(samples) - scores.count(2)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self.__allocate__(key)
+        self.__seed__(slot, samples)
+        return len(samples)
+
+    def pooled_window(self, keys: Iterable[Hashable] = None) -> List[float]:
+        """
+        A synthetic window to seed new keys with, see ``prime``: ``buffer_samples`` samples at evenly spaced quantiles
+        of the normal distribution with the mean and the standard deviation of the windows of sibling keys, pooled
+        together. The spread of the siblings levels is part of the pooled deviation, so a new key at the level of any
+        sibling is not rejected while its own samples replace the synthetic ones.
+
+        :param keys: the sibling keys, all the keys of the bank by default
+        :return: the window samples, sorted, or none when the siblings hold fewer than 2 samples
+        :raises KeyError: when a key is unknown
+        """
+        if keys is None:
+            slots = list(self._slots.values())
+        else:
+            slots = [self._slots[key] for key in keys]
+        return self.__pooled_window__(slots)
+
+    def __pooled_window__(self, slots):
+        statistics = [self.__statistics__(slot) for slot in slots]
+        count = sum(n for n, _, _ in statistics)
+        if count < 2:
+            return []
+        mu = fsum(n * mean for n, mean, _ in statistics) / count
+        squares = fsum(
+            squares + n * (mean - mu) ** 2 for n, mean, squares in statistics
+        )
+        sd = sqrt(max(squares, 0.0) / (count - 1))
+        n = self.buffer_samples
+        quantiles = [_normal_quantile((i + 0.5) / n) for i in range(n // 2)]
+        return (
+            [mu - sd * q for q in quantiles]
+            + ([mu] if n % 2 else [])
+            + [mu + sd * q for q in reversed(quantiles)]
+        )
+
+    def __statistics__(self, slot):
+        """The number of samples, the mean and the sum of squared deviations of a window."""
+        n = self._lengths[slot]
+        if not n:
+            return 0, 0.0, 0.0
+        mu = self._sums[slot] / n
+        return (
+            n,
+            self._shifts[slot] + mu,
+            self._sum_squares[slot] - self._sums[slot] * mu,
+        )
+
+    def __seed__(self, slot, samples):
+        start = slot * self._width
+        ring = start + self.buffer_samples + 1
+        window = _seed_window(
+            self._windows[ring : ring + self.buffer_samples],
+            self._lengths[slot],
+            self._cursors[slot],
+            samples,
+        )
+        n = len(window)
+        self._windows[ring : ring + n] = array("d", window)
+        self._windows[start : start + n] = array("d", sorted(window))
+        self._lengths[slot] = n
+        self._cursors[slot] = n % self.buffer_samples
+        if n:
+            self.__resync__(slot)
+
+    def __allocate__(self, key):
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._lengths[slot] = 0
+            self._cursors[slot] = 0
+            self._pushes[slot] = 0
+            self._shifts[slot] = 0.0
+            self._sums[slot] = 0.0
+            self._sum_squares[slot] = 0.0
+        else:
+            slot = len(self._lengths)
+            self._windows.extend(_zeros(self._width))
+            for counters in (self._lengths, self._cursors, self._pushes):
+                counters.append(0)
+            for sums in (self._shifts, self._sums, self._sum_squares):
+                sums.append(0.0)
+        self._slots[key] = slot
+        return slot
+
+    def __score__(self, slot, new_sample):
+        window = self._windows
+        buffer_samples = self.buffer_samples
+        start = slot * self._width
+        n = self._lengths[slot]
+        end = start + n
+        shift = self._shifts[slot]
+        sums = self._sums
+        sum_squares = self._sum_squares
+        result = 0
+        insertion_point = bisect_left(window, new_sample, start, end)
+        if insertion_point < end and new_sample >= window[end - 1]:
+            # ties with the largest sample are tested as the largest, as is_outlier does
+            insertion_point = end
+
+        # we don't want to produce results if we don't have at least half the buffer
+        if n >= self._min_length:
+            # only the extremes are tested, against the window as if the sample was inserted
+            if insertion_point == start or insertion_point == end:
+                gap, trim = self._ranks[n + 1]
+                if insertion_point == start:
+                    gap = window[start + gap - 1] - new_sample
+                    span = window[end - 1 - trim] - new_sample
+                else:
+                    gap = new_sample - window[end - gap]
+                    span = new_sample - window[start + trim]
+                if span and gap / span > self.q[n + 1]:
+                    return 2  # outlier
+
+            if window[start] == window[end - 1]:
+                # flat window, avoid reporting the rounding error of the running sums as deviation
+                mu, bound = window[start], 0.0
+            else:
+                mu = sums[slot] / n
+                variance = (sum_squares[slot] - sums[slot] * mu) / (n - 1)
+                mu += shift
+                bound = self.sigma * sqrt(variance) if variance > 0 else 0.0
+            if new_sample > mu + bound or new_sample < mu - bound:
+                result = 1  # valid, but outside sigma bound
+
+        ring = start + buffer_samples + 1
+        cursor = self._cursors[slot]
+        if n == buffer_samples:
+            oldest = window[ring + cursor]
+            eviction_point = bisect_left(window, oldest, start, end)
+            # a single shift between the evicted and the new sample
+            if eviction_point < insertion_point:
+                insertion_point -= 1
+                window[eviction_point:insertion_point] = window[
+                    eviction_point + 1 : insertion_point + 1
+                ]
+            elif eviction_point > insertion_point:
+                window[insertion_point + 1 : eviction_point + 1] = window[
+                    insertion_point:eviction_point
+                ]
+            oldest -= shift
+            sums[slot] -= oldest
+            sum_squares[slot] -= oldest * oldest
         else:
-            insertion = start
-        self._buffer.insert(insertion, new_value)
-        return insertion
+            window[insertion_point + 1 : end + 1] = window[insertion_point:end]
+            if n == 0:
+                shift = self._shifts[slot] = new_sample
+            self._lengths[slot] = n + 1
+        window[insertion_point] = new_sample
+        window[ring + cursor] = new_sample
+        cursor += 1
+        self._cursors[slot] = cursor if cursor < buffer_samples else 0
+
+        new_sample -= shift
+        sums[slot] += new_sample
+        sum_squares[slot] += new_sample * new_sample
+        pushes = self._pushes[slot] = self._pushes[slot] + 1
+        if pushes == self.resync_interval:
+            self.__resync__(slot)
+        return result
+
+    def __mean_stdev__(self, slot, start, end):
+        window = self._windows
+        if window[start] == window[end - 1]:
+            return window[start], 0.0
+        n = end - start
+        mu = self._sums[slot] / n
+        variance = (self._sum_squares[slot] - self._sums[slot] * mu) / (n - 1)
+        return self._shifts[slot] + mu, sqrt(variance) if variance > 0 else 0.0
+
+    def __resync__(self, slot):
+        start = slot * self._width
+        samples = self._windows[start : start + self._lengths[slot]]
+        shift = self._shifts[slot] = fsum(samples) / len(samples)
+        self._sums[slot] = fsum(x - shift for x in samples)
+        self._sum_squares[slot] = fsum((x - shift) ** 2 for x in samples)
+        self._pushes[slot] = 0
+
+
+_SNAPSHOT_MAGIC = b"OD"
+_SNAPSHOT_VERSION = 1
+# time windows and detrending snapshots carry the window period (0 for none) and the detrend flag in the header. The
+# state holds the latest timestamp and the ring times of time windows, and ends with the line of detrending ones
+_EXTENDED_SNAPSHOT_VERSION = 2
+_SNAPSHOT_VERSIONS = (_SNAPSHOT_VERSION, _EXTENDED_SNAPSHOT_VERSION)
+_EXTENDED_HEADER = struct.Struct("<d?")
+_TIMESTAMP = struct.Struct("<d")
+# magic, version, method, statistic, confidence, buffer samples, sigma threshold and resync interval
+_SNAPSHOT_HEADER = struct.Struct("<2sB8s5sdqdq")
+# buffer length, cursor, summed samples, pushes since the last resync, shift, sum and sum of squares
+_DIXON_STATE = struct.Struct("<qqqqddd")
+
+
+def _check_arguments(
+    confidence, buffer_samples, sigma_threshold, resync_interval, statistic
+):
+    """
+    Validates the detector configuration, returning the Dixon's critical values and statistic ranks for the given
+    confidence and statistic.
+    """
+    if confidence > 1:
+        confidence /= 100
+    _validate_arguments(confidence, buffer_samples, sigma_threshold, resync_interval)
+    # read on each call, the cache of ``statistic_tables`` is cleared by ``add_critical_values``
+    return statistic_tables(confidence, buffer_samples + 1, statistic)
+
+
+@lru_cache(maxsize=None)
+def _validate_arguments(confidence, buffer_samples, sigma_threshold, resync_interval):
+    critical_values(confidence)
+    if buffer_samples < 5 or buffer_samples > MAX_BUFFER_SAMPLES:
+        raise ValueError(
+            "Buffer distribution must have at least 5 elements and no more than {}".format(
+                MAX_BUFFER_SAMPLES
+            )
+        )
+    if sigma_threshold <= 0:
+        raise ValueError("Sigma threshold should be greater than 0")
+    if resync_interval < 0:
+        raise ValueError("Resync interval should not be negative")
+
+
+def _locked(lock, evaluate):
+    """Wraps a sample evaluation method with the detector lock."""
+
+    def locked(new_sample, *timestamp):
+        with lock:
+            return evaluate(new_sample, *timestamp)
+
+    return locked
+
+
+def _detrended_is_outlier(trend, is_outlier):
+    """Wraps a sample evaluation method so that it tests the residuals of the samples from the trend line."""
+    residual = trend.residual
+    push = trend.push
+
+    def detrended(new_sample):
+        outlier = is_outlier(residual(new_sample))
+        push(new_sample, outlier)
+        return outlier
+
+    return detrended
+
+
+def _detrended_score(trend, score):
+    """Wraps a sample scoring method so that it scores the residuals of the samples from the trend line."""
+    residual = trend.residual
+    push = trend.push
+
+    def detrended(new_sample):
+        result = score(residual(new_sample))
+        push(new_sample, result == 2)
+        return result
+
+    return detrended
+
+
+def _seconds(value):
+    """A timestamp or a duration in seconds, given as a number, a ``datetime`` or a ``timedelta``."""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if not isinstance(value, Real):
+        raise TypeError(
+            'Cannot use "{}" as a timestamp or a duration'.format(type(value).__name__)
+        )
+    return float(value)
+
+
+def _decreasing(timestamp, latest):
+    return "Timestamps should not decrease, got {} after {}".format(timestamp, latest)
+
+
+def _create_engine(
+    method, confidence, buffer_samples, sigma_threshold, resync_interval
+):
+    """Validates the configuration of a detector other than Dixon's, returning its engine."""
+    engine = ENGINES.get(method)
+    if engine is None:
+        raise ValueError(
+            'Method "{}" unknown, please pick one in {}'.format(
+                method, ["dixon"] + list(ENGINES)
+            )
+        )
+    if confidence > 1:
+        confidence /= 100
+    if not 0 < confidence < 1:
+        raise ValueError("Confidence should be between 0 and 1")
+    if buffer_samples < 5:
+        raise ValueError("Buffer distribution must have at least 5 elements")
+    if sigma_threshold <= 0:
+        raise ValueError("Sigma threshold should be greater than 0")
+    if resync_interval < 0:
+        raise ValueError("Resync interval should not be negative")
+    return engine(confidence, buffer_samples, sigma_threshold, resync_interval)
+
+
+def _as_floats(samples):
+    """Validates at once a chunk of samples, returning them as a list of floats."""
+    try:
+        if np is not None and isinstance(samples, np.ndarray):
+            if samples.dtype.kind not in "biuf":
+                raise TypeError
+            return samples.astype(float).tolist()
+        return array("d", samples).tolist()
+    except (TypeError, ValueError):
+        raise TypeError(
+            "Cannot search outliers of not numeric or not compatible datatypes in {}".format(
+                type(samples).__name__
+            )
+        )
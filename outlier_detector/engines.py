@@ -0,0 +1,464 @@
+"""
+Alternative engines for ``OutlierDetector``, selected by its ``method`` argument. Unlike the Dixon's Q-test they do not
+rely on tabled critical values, so any window length is accepted. Grubbs' and the EWMA engines score each sample in
+O(1) time, the Hampel engine in O(log n) comparisons plus an O(n) memory move: windows of thousands of samples are
+practical.
+
+All the engines share the ``OutlierDetector`` semantics: results are produced once half the window (and at least 5
+samples) is filled, outliers are not stored, and score 1 ("warning") marks the valid samples outside ``sigma_threshold``
+(robust) standard deviations from the window centre. As in Grubbs' test the confidence holds for the whole window, so
+that the samples rejected from clean Gaussian data are as few as with the Dixon's Q-test. The Hampel and EWMA engines
+test each sample against a fixed number of standard deviations, so they store the outliers clipped to the outlier
+threshold instead: dropping the tails of the distribution would shrink the estimated deviation at every sample, until
+most samples are rejected.
+"""
+
+import struct
+import sys
+from array import array
+from bisect import bisect_left, insort
+from functools import lru_cache
+from itertools import chain
+from math import fsum, sqrt
+
+from outlier_detector.critical_values import grubbs_critical_value, t_critical_value
+
+MAD_SCALE = 1.4826
+"""Ratio between the standard deviation and the median absolute deviation of a normal distribution"""
+
+MAD_EFFICIENCY = 0.37
+"""Asymptotic efficiency of the median absolute deviation relative to the standard deviation, for normal samples: the
+fraction of the window samples the Hampel engine counts as degrees of freedom of its deviation estimate"""
+
+
+class GrubbsEngine:
+    """
+    Grubbs' test of the new sample against the moving window: the sample is an outlier when its distance from the
+    mean, in standard deviations of the window including it, exceeds the critical value for the confidence. A window
+    with no deviation, as an idle sensor may report, rejects no sample. The window mean and variance are updated
+    incrementally, O(1) per sample.
+    """
+
+    __slots__ = (
+        "confidence",
+        "buffer_samples",
+        "sigma",
+        "resync_interval",
+        "_min_length",
+        "_ring",
+        "_length",
+        "_cursor",
+        "_shift",
+        "_sum",
+        "_sum_squares",
+        "_pushes",
+    )
+
+    def __init__(
+        self,
+        confidence: float,
+        buffer_samples: int,
+        sigma_threshold: float,
+        resync_interval: int,
+    ) -> None:
+        self.confidence = confidence
+        self.buffer_samples = buffer_samples
+        self.sigma = sigma_threshold
+        self.resync_interval = resync_interval
+        self._min_length = max(5, -(-buffer_samples // 2))
+        self._ring = _zeros(buffer_samples)
+        self._length = 0
+        self._cursor = 0
+        # running sums of the window samples, shifted to reduce the cancellation error of the variance
+        self._shift = 0.0
+        self._sum = 0.0
+        self._sum_squares = 0.0
+        self._pushes = 0
+
+    def is_outlier(self, new_sample: float) -> bool:
+        if self._length >= self._min_length:
+            mu, sd = self.__mean_stdev__()
+            if self.__exceeds__(new_sample, mu, sd):
+                return True
+        self.__push__(new_sample)
+        return False
+
+    def score(self, new_sample: float) -> int:
+        result = 0
+        if self._length >= self._min_length:
+            mu, sd = self.__mean_stdev__()
+            if self.__exceeds__(new_sample, mu, sd):
+                return 2
+            if abs(new_sample - mu) > self.sigma * sd:
+                result = 1
+        self.__push__(new_sample)
+        return result
+
+    def __footprint__(self):
+        return _footprint(self, self._ring, self._shift, self._sum, self._sum_squares)
+
+    def __exceeds__(self, new_sample, mu, sd):
+        if not sd:
+            # any other sample would be as far as the test allows from a constant window, and never be stored
+            return False
+        # mean and sum of squared deviations of the window including the new sample, updated as Welford's does
+        n = self._length
+        deviation = (new_sample - mu) * n / (n + 1)
+        squares = sd * sd * (n - 1) + (new_sample - mu) * deviation
+        if squares <= 0:
+            return False
+        g = abs(deviation) / sqrt(squares / n)
+        return g > grubbs_critical_value(self.confidence, n + 1)
+
+    def __mean_stdev__(self):
+        n = self._length
+        mu = self._sum / n
+        variance = (self._sum_squares - self._sum * mu) / (n - 1)
+        return self._shift + mu, sqrt(variance) if variance > 0 else 0.0
+
+    def __push__(self, new_sample):
+        if self._length == self.buffer_samples:
+            oldest = self._ring[self._cursor] - self._shift
+            self._sum -= oldest
+            self._sum_squares -= oldest * oldest
+        else:
+            if not self._length:
+                self._shift = float(new_sample)
+            self._length += 1
+        self._ring[self._cursor] = new_sample
+        self._cursor += 1
+        if self._cursor == self.buffer_samples:
+            self._cursor = 0
+
+        new_sample -= self._shift
+        self._sum += new_sample
+        self._sum_squares += new_sample * new_sample
+        self._pushes += 1
+        if self._pushes == self.resync_interval:
+            self.__resync__()
+
+    def __dump__(self):
+        return _GRUBBS_STATE.pack(
+            self._length,
+            self._cursor,
+            self._pushes,
+            self._shift,
+            self._sum,
+            self._sum_squares,
+        ) + _pack_floats(self._ring)
+
+    def __restore__(self, state):
+        (
+            self._length,
+            self._cursor,
+            self._pushes,
+            self._shift,
+            self._sum,
+            self._sum_squares,
+        ) = _GRUBBS_STATE.unpack_from(state)
+        (self._ring,) = _unpack_floats(state[_GRUBBS_STATE.size :], self.buffer_samples)
+        _check_window(self._length, self._cursor, self.buffer_samples)
+
+    def __seed__(self, samples):
+        window = _seed_window(self._ring, self._length, self._cursor, samples)
+        self._length = len(window)
+        self._cursor = self._length % self.buffer_samples
+        self._ring[: self._length] = array("d", window)
+        if self._length:
+            self.__resync__()
+
+    def __resync__(self):
+        samples = self._ring[: self._length]
+        self._shift = fsum(samples) / self._length
+        self._sum = fsum(x - self._shift for x in samples)
+        self._sum_squares = fsum((x - self._shift) ** 2 for x in samples)
+        self._pushes = 0
+
+
+class HampelEngine:
+    """
+    Hampel identifier: the sample is an outlier when its distance from the window median exceeds the Student's t
+    critical value for the confidence, in robust standard deviations (``MAD_SCALE`` times the median absolute deviation)
+    with ``MAD_EFFICIENCY`` degrees of freedom per sample. Outliers are stored clipped to that distance. A window with
+    no deviation, as quantized samples may be, rejects no sample. The window is kept sorted, found by bisection and
+    moved in memory, so the median is read in O(1) and the MAD is selected in O(log n) from the distances, sorted by
+    construction on either side of the median.
+    """
+
+    __slots__ = (
+        "confidence",
+        "buffer_samples",
+        "sigma",
+        "resync_interval",
+        "_threshold",
+        "_min_length",
+        "_buffer",
+        "_ring",
+        "_cursor",
+    )
+
+    def __init__(
+        self,
+        confidence: float,
+        buffer_samples: int,
+        sigma_threshold: float,
+        resync_interval: int,
+    ) -> None:
+        self.confidence = confidence
+        self.buffer_samples = buffer_samples
+        self.sigma = sigma_threshold
+        self.resync_interval = resync_interval
+        self._threshold = t_critical_value(
+            confidence, buffer_samples + 1, MAD_EFFICIENCY * (buffer_samples - 1)
+        )
+        self._min_length = max(5, -(-buffer_samples // 2))
+        self._buffer = array("d")
+        self._ring = _zeros(buffer_samples)
+        self._cursor = 0
+
+    def is_outlier(self, new_sample: float) -> bool:
+        if len(self._buffer) >= self._min_length:
+            median, mad = self.__median_mad__()
+            limit = self._threshold * MAD_SCALE * mad
+            if mad and abs(new_sample - median) > limit:
+                self.__push__(median + limit if new_sample > median else median - limit)
+                return True
+        self.__push__(new_sample)
+        return False
+
+    def score(self, new_sample: float) -> int:
+        result = 0
+        if len(self._buffer) >= self._min_length:
+            median, mad = self.__median_mad__()
+            distance = abs(new_sample - median)
+            limit = self._threshold * MAD_SCALE * mad
+            if mad and distance > limit:
+                self.__push__(median + limit if new_sample > median else median - limit)
+                return 2
+            if distance > self.sigma * MAD_SCALE * mad:
+                result = 1
+        self.__push__(new_sample)
+        return result
+
+    def __footprint__(self):
+        return _footprint(self, self._buffer, self._ring)
+
+    def __median_mad__(self):
+        window = self._buffer
+        n = len(window)
+        half = n // 2
+        if n % 2:
+            median = window[half]
+        else:
+            median = (window[half - 1] + window[half]) / 2
+        split = bisect_left(window, median)
+        mad = _kth_distance(window, median, split, half)
+        if not n % 2:
+            mad = (_kth_distance(window, median, split, half - 1) + mad) / 2
+        return median, mad
+
+    def __dump__(self):
+        return _HAMPEL_STATE.pack(len(self._buffer), self._cursor) + _pack_floats(
+            self._buffer, self._ring
+        )
+
+    def __restore__(self, state):
+        length, self._cursor = _HAMPEL_STATE.unpack_from(state)
+        self._buffer, self._ring = _unpack_floats(
+            state[_HAMPEL_STATE.size :], length, self.buffer_samples
+        )
+        _check_window(length, self._cursor, self.buffer_samples)
+
+    def __seed__(self, samples):
+        window = _seed_window(self._ring, len(self._buffer), self._cursor, samples)
+        self._cursor = len(window) % self.buffer_samples
+        self._ring[: len(window)] = array("d", window)
+        self._buffer = array("d", sorted(window))
+
+    def __push__(self, new_sample):
+        if len(self._buffer) == self.buffer_samples:
+            oldest = self._ring[self._cursor]
+            del self._buffer[bisect_left(self._buffer, oldest)]
+        insort(self._buffer, new_sample)
+        self._ring[self._cursor] = new_sample
+        self._cursor += 1
+        if self._cursor == self.buffer_samples:
+            self._cursor = 0
+
+
+class EWMAEngine:
+    """
+    Exponentially weighted z-score: the sample is an outlier when its distance from the exponentially weighted moving
+    average exceeds the Student's t critical value for the confidence, in exponentially weighted standard deviations
+    estimated from ``buffer_samples`` - 1 degrees of freedom. The smoothing factor 2 / (``buffer_samples`` + 1) gives
+    the weights the centre of mass of a window of ``buffer_samples``. Outliers update the averages clipped to that
+    distance. With no deviation, as after a run of equal samples, no sample is rejected. No window is stored, O(1) per
+    sample.
+    """
+
+    __slots__ = (
+        "confidence",
+        "buffer_samples",
+        "sigma",
+        "resync_interval",
+        "alpha",
+        "_threshold",
+        "_min_length",
+        "_count",
+        "_mean",
+        "_variance",
+    )
+
+    def __init__(
+        self,
+        confidence: float,
+        buffer_samples: int,
+        sigma_threshold: float,
+        resync_interval: int,
+    ) -> None:
+        self.confidence = confidence
+        self.buffer_samples = buffer_samples
+        self.sigma = sigma_threshold
+        self.resync_interval = resync_interval
+        self.alpha = 2 / (buffer_samples + 1)
+        self._threshold = t_critical_value(
+            confidence, buffer_samples + 1, buffer_samples - 1
+        )
+        self._min_length = max(5, -(-buffer_samples // 2))
+        self._count = 0
+        self._mean = 0.0
+        self._variance = 0.0
+
+    def is_outlier(self, new_sample: float) -> bool:
+        if self._count >= self._min_length:
+            mean = self._mean
+            limit = self._threshold * sqrt(self._variance)
+            if limit and abs(new_sample - mean) > limit:
+                self.__push__(mean + limit if new_sample > mean else mean - limit)
+                return True
+        self.__push__(new_sample)
+        return False
+
+    def score(self, new_sample: float) -> int:
+        result = 0
+        if self._count >= self._min_length:
+            mean = self._mean
+            deviation = abs(new_sample - mean)
+            sd = sqrt(self._variance)
+            limit = self._threshold * sd
+            if limit and deviation > limit:
+                self.__push__(mean + limit if new_sample > mean else mean - limit)
+                return 2
+            if deviation > self.sigma * sd:
+                result = 1
+        self.__push__(new_sample)
+        return result
+
+    def __footprint__(self):
+        return _footprint(self, self._mean, self._variance)
+
+    def __dump__(self):
+        return _EWMA_STATE.pack(self._count, self._mean, self._variance)
+
+    def __restore__(self, state):
+        if len(state) != _EWMA_STATE.size:
+            raise ValueError
+        self._count, self._mean, self._variance = _EWMA_STATE.unpack(state)
+
+    def __seed__(self, samples):
+        for sample in samples:
+            self.__push__(sample)
+
+    def __push__(self, new_sample):
+        self._count += 1
+        # the first samples are weighted evenly, as long as it weights them more than the smoothing factor
+        weight = max(self.alpha, 1 / self._count)
+        difference = new_sample - self._mean
+        increment = weight * difference
+        self._mean += increment
+        self._variance = (1 - weight) * (self._variance + difference * increment)
+
+
+# snapshot layouts, see ``OutlierDetector.to_bytes``, followed by the windows as doubles
+_GRUBBS_STATE = struct.Struct("<qqqddd")
+_HAMPEL_STATE = struct.Struct("<qq")
+_EWMA_STATE = struct.Struct("<qdd")
+
+ENGINES = {"grubbs": GrubbsEngine, "hampel": HampelEngine, "ewma": EWMAEngine}
+"""The engines by ``method`` name, besides the default 'dixon' implemented by ``OutlierDetector`` itself"""
+
+
+def _kth_distance(window, median, split, k):
+    """
+    The k-th smallest distance from ``median`` of the sorted ``window`` samples: the distances grow moving away from
+    ``split`` on both sides, so it is selected by bisection as the k-th smallest element of two sorted sequences.
+    """
+    low = max(0, k + 1 - (len(window) - split))
+    high = min(k + 1, split)
+    while low < high:
+        # taking i distances on the left and k + 1 - i on the right
+        i = (low + high) // 2
+        if median - window[split - 1 - i] < window[split + k - i] - median:
+            low = i + 1
+        else:
+            high = i
+    distance = median - window[split - low] if low else 0.0
+    if low <= k:
+        distance = max(distance, window[split + k - low] - median)
+    return distance
+
+
+def _pack_floats(*samples):
+    """Concatenates lists of numbers as doubles."""
+    return _doubles(sum(map(len, samples))).pack(*chain(*samples))
+
+
+def _unpack_floats(data, *lengths):
+    """Splits a buffer of doubles in typed arrays of the given lengths."""
+    if len(data) != 8 * sum(lengths):
+        raise ValueError
+    arrays = []
+    start = 0
+    for length in lengths:
+        floats = array("d")
+        floats.frombytes(data[start : start + 8 * length])
+        if sys.byteorder == "big":
+            floats.byteswap()
+        arrays.append(floats)
+        start += 8 * length
+    return arrays
+
+
+def _seed_window(ring, length, cursor, samples):
+    """
+    The samples of a window once ``samples`` are appended to it, in arrival order: the ``length`` ones in the arrival
+    ``ring`` before the ``cursor``, the next slot written, followed by the new ones, the oldest evicted.
+    """
+    buffer_samples = len(ring)
+    oldest = (cursor - length) % buffer_samples
+    order = list(ring[oldest : oldest + length])
+    order.extend(ring[: max(0, oldest + length - buffer_samples)])
+    return (order + list(samples))[-buffer_samples:]
+
+
+_ZERO = array("d", [0.0])
+
+
+def _zeros(length):
+    # allocated exactly, unlike the arrays built from bytes
+    return _ZERO * length
+
+
+def _footprint(instance, *values):
+    """The size of an object along with the values it holds alone, see ``OutlierDetector.memory_footprint``."""
+    return sys.getsizeof(instance) + sum(map(sys.getsizeof, values))
+
+
+@lru_cache(maxsize=None)
+def _doubles(count):
+    return struct.Struct("<{}d".format(count))
+
+
+def _check_window(length, cursor, buffer_samples):
+    if not 0 <= length <= buffer_samples or not 0 <= cursor < buffer_samples:
+        raise ValueError
@@ -1,33 +1,409 @@
+import gc
 import inspect
-from typing import Any, Callable, Dict, List, Iterator
-from uuid import uuid4
+import os
+import struct
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from time import monotonic, perf_counter
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Iterator,
+    Tuple,
+    Union,
+)
+from uuid import UUID, uuid4
 
-__alive_filters__ = {}
 __strategies_decorator__ = ["recursion", "iteration", "exception", "generation"]
 __strategies_obj__ = ["recursion", "iteration", "exception"]
 
 from outlier_detector.exceptions import OutlierException
 from outlier_detector.detectors import OutlierDetector
+from outlier_detector.engines import ENGINES
+from outlier_detector.metrics import FilterMetrics
 import logging
 
 
+class FilterRegistry(MutableMapping):
+    """
+    Mapping of the distribution ids to the detectors underlying the filters. Detectors are created on demand and,
+    optionally, evicted when the registry grows beyond ``max_size`` (least recently used first) or when they are not
+    used for ``ttl`` seconds. Detectors inferred from a method ``self`` are dropped along with the instance.
+
+    A thread safe registry creates each detector once, even when many threads retrieve it concurrently. Without an
+    eviction policy the existing detectors are retrieved without locking.
+    """
+
+    def __init__(
+        self, max_size: int = None, ttl: float = None, thread_safe: bool = False
+    ) -> None:
+        """
+        :param max_size: the maximum number of detectors held, unbounded if None
+        :param ttl: seconds after which an unused detector is evicted, never if None
+        :param thread_safe: whether the registry is shared by many threads
+
+        :raises ValueError: when max_size or ttl are not positive
+        """
+        self._detectors = OrderedDict()
+        self._accessed = {}
+        self._finalizers = {}
+        self.hits = 0
+        """Number of retrievals served by an existing detector"""
+        self.misses = 0
+        """Number of retrievals that created a new detector"""
+        self.evictions = 0
+        """Number of detectors evicted because of max_size or ttl"""
+        self._lock = None
+        self.configure(max_size, ttl, thread_safe)
+
+    def configure(
+        self, max_size: int = None, ttl: float = None, thread_safe: bool = None
+    ) -> None:
+        """
+        Changes the eviction policy, evicting the exceeding detectors right away.
+
+        :param max_size: the maximum number of detectors held, unbounded if None
+        :param ttl: seconds after which an unused detector is evicted, never if None
+        :param thread_safe: whether the registry is shared by many threads, unchanged if None. The detectors thread
+               safety is set by their own ``thread_safe`` argument.
+
+        :raises ValueError: when max_size or ttl are not positive
+        """
+        if max_size is not None and max_size <= 0:
+            raise ValueError("Registry max size should be greater than 0")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("Registry time to live should be greater than 0")
+        if thread_safe and self._lock is None:
+            self._lock = threading.RLock()
+        with self._lock or _NO_LOCK:
+            self.__configure__(max_size, ttl)
+        if thread_safe is not None and not thread_safe:
+            self._lock = None
+
+    def __configure__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        if ttl is not None:
+            now = monotonic()
+            for key in self._detectors:
+                self._accessed.setdefault(key, now)
+            self.__expire__(now)
+        else:
+            self._accessed.clear()
+        self.__shrink__()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: the registry size along with the hits, misses and evictions counters
+        """
+        return {
+            "size": len(self._detectors),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def dump(self, path: str) -> int:
+        """
+        Checkpoints the detectors to a file, in the compact binary format of ``OutlierDetector.to_bytes``. The file is
+        replaced atomically. Only str, bool, int, bytes and UUID keys are supported, other detectors are skipped along
+        with the ones bound to a method owner, that do not outlive it.
+
+        :param path: the file path
+        :return: the number of detectors written
+        """
+        with self._lock or _NO_LOCK:
+            detectors = list(self._detectors.items())
+        chunks = []
+        for key, detector in detectors:
+            if key in self._finalizers:
+                continue
+            encoded = _encode_key(key)
+            if encoded is None:
+                logging.warning(
+                    "Cannot dump the detector of key {!r}, unsupported key type".format(
+                        key
+                    )
+                )
+                continue
+            tag, key = encoded
+            flags = _THREAD_SAFE if detector._lock is not None else 0
+            detector = detector.to_bytes()
+            chunks.append(_ENTRY_HEADER.pack(tag, flags, len(key), len(detector)))
+            chunks.append(key)
+            chunks.append(detector)
+
+        count = len(chunks) // 3
+        chunks.insert(0, _DUMP_HEADER.pack(_DUMP_MAGIC, count))
+        temporary = "{}.tmp".format(path)
+        with open(temporary, "wb") as fh:
+            fh.write(b"".join(chunks))
+        os.replace(temporary, path)
+        return count
+
+    def load(self, path: str) -> int:
+        """
+        Restores the detectors checkpointed by ``dump``, replacing the ones with the same keys. The detectors are
+        restored thread safe when they were dumped so.
+
+        :param path: the file path
+        :return: the number of detectors restored
+        :raises ValueError: when the file is not a valid checkpoint
+        """
+        with open(path, "rb") as fh:
+            data = memoryview(fh.read())
+        # the restored detectors all survive the load, collecting while they are allocated only wastes time
+        collect = gc.isenabled()
+        gc.disable()
+        try:
+            restored = _restore_detectors(data)
+        except (ValueError, struct.error, UnicodeDecodeError):
+            raise ValueError("Invalid detectors checkpoint {}".format(path))
+        finally:
+            if collect:
+                gc.enable()
+        with self._lock or _NO_LOCK:
+            if self._detectors:
+                # the replaced detectors move to the end, as the restored ones are the most recent
+                for key, _ in restored:
+                    self._detectors.pop(key, None)
+            self._detectors.update(restored)
+            if self.ttl is not None:
+                now = monotonic()
+                self._accessed.update((key, now) for key, _ in restored)
+            self.__shrink__()
+        return len(restored)
+
+    def retrieve(
+        self, key: Any, owner: Any = None, **outlier_detector_kwargs: Dict
+    ) -> OutlierDetector:
+        """
+        Returns the detector associated to ``key``, creating it if missing.
+
+        :param key: the distribution id
+        :param owner: the object the distribution belongs to, the detector is dropped when the owner is garbage
+               collected
+        :param outlier_detector_kwargs: the constructor arguments for a new detector
+        """
+        if self._lock is None:
+            return self.__retrieve__(key, owner, outlier_detector_kwargs)
+
+        if self.max_size is None and self.ttl is None:
+            # detectors are never moved without an eviction policy, and only added under the lock
+            detector = self._detectors.get(key)
+            if detector is not None:
+                self.hits += 1
+                return detector
+        with self._lock:
+            return self.__retrieve__(key, owner, outlier_detector_kwargs)
+
+    def __retrieve__(self, key, owner, outlier_detector_kwargs):
+        if self.ttl is not None:
+            now = monotonic()
+            self.__expire__(now)
+            self._accessed[key] = now
+
+        detector = self._detectors.get(key)
+        if detector is None:
+            self.misses += 1
+            detector = self._detectors[key] = OutlierDetector(**outlier_detector_kwargs)
+            if owner is not None:
+                self.__bind__(key, owner)
+            self.__shrink__()
+        else:
+            self.hits += 1
+            if self.max_size is not None or self.ttl is not None:
+                self._detectors.move_to_end(key)
+        return detector
+
+    def __getitem__(self, key: Any) -> OutlierDetector:
+        return self._detectors[key]
+
+    def __setitem__(self, key: Any, detector: OutlierDetector) -> None:
+        with self._lock or _NO_LOCK:
+            self._detectors[key] = detector
+            self._detectors.move_to_end(key)
+            if self.ttl is not None:
+                self._accessed[key] = monotonic()
+            self.__shrink__()
+
+    def __delitem__(self, key: Any) -> None:
+        with self._lock or _NO_LOCK:
+            del self._detectors[key]
+            self._accessed.pop(key, None)
+            finalizer = self._finalizers.pop(key, None)
+        if finalizer is not None:
+            finalizer.detach()
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._detectors)
+
+    def __len__(self) -> int:
+        return len(self._detectors)
+
+    def __bind__(self, key, owner):
+        try:
+            self._finalizers[key] = weakref.finalize(owner, self.__release__, key)
+        except TypeError:
+            # the owner does not support weak references, the detector lives until evicted or destroyed
+            pass
+
+    def __release__(self, key):
+        with self._lock or _NO_LOCK:
+            self._finalizers.pop(key, None)
+            self._detectors.pop(key, None)
+            self._accessed.pop(key, None)
+
+    def __expire__(self, now):
+        expired = []
+        for key in self._detectors:
+            if now - self._accessed[key] <= self.ttl:
+                break
+            expired.append(key)
+        for key in expired:
+            del self[key]
+        self.evictions += len(expired)
+
+    def __shrink__(self):
+        if self.max_size is None:
+            return
+        while len(self._detectors) > self.max_size:
+            del self[next(iter(self._detectors))]
+            self.evictions += 1
+
+
+class _NoLock:
+    """Stands for the lock of a registry that is not thread safe."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_LOCK = _NoLock()
+
+_DUMP_MAGIC = b"ODR1"
+# magic and number of entries
+_DUMP_HEADER = struct.Struct("<4sQ")
+# key type, detector flags, key and detector snapshot lengths
+_ENTRY_HEADER = struct.Struct("<cBII")
+_THREAD_SAFE = 1
+
+
+def _restore_detectors(data):
+    magic, count = _DUMP_HEADER.unpack_from(data)
+    if magic != _DUMP_MAGIC:
+        raise ValueError
+    offset = _DUMP_HEADER.size
+    restored = []
+    for _ in range(count):
+        tag, flags, key_length, detector_length = _ENTRY_HEADER.unpack_from(
+            data, offset
+        )
+        offset += _ENTRY_HEADER.size
+        key = _decode_key(tag, data[offset : offset + key_length])
+        offset += key_length
+        detector = data[offset : offset + detector_length]
+        offset += detector_length
+        restored.append(
+            (
+                key,
+                OutlierDetector.from_bytes(
+                    detector, thread_safe=bool(flags & _THREAD_SAFE)
+                ),
+            )
+        )
+    return restored
+
+
+def _encode_key(key):
+    if isinstance(key, str):
+        return b"s", key.encode()
+    # bool is an int subclass, it is tested first to be restored as a bool
+    if isinstance(key, bool):
+        return b"t", b"1" if key else b"0"
+    if isinstance(key, int):
+        return b"i", str(key).encode()
+    if isinstance(key, bytes):
+        return b"b", key
+    if isinstance(key, UUID):
+        return b"u", key.bytes
+    return None
+
+
+def _decode_key(tag, data):
+    if tag == b"s":
+        return str(data, "utf-8")
+    if tag == b"t":
+        return data == b"1"
+    if tag == b"i":
+        return int(str(data, "ascii"))
+    if tag == b"b":
+        return bytes(data)
+    if tag == b"u":
+        return UUID(bytes=bytes(data))
+    raise ValueError
+
+
+__alive_filters__ = FilterRegistry()
+
+
+def configure_registry(
+    max_size: int = None, ttl: float = None, thread_safe: bool = None
+) -> FilterRegistry:
+    """
+    Sets the eviction policy of the global registry of the filters detectors, used by any filter not given an
+    explicit ``registry``.
+
+    :param max_size: the maximum number of detectors held, unbounded if None
+    :param ttl: seconds after which an unused detector is evicted, never if None
+    :param thread_safe: whether the registry is shared by many threads, unchanged if None, see ``FilterRegistry``
+    :return: the global registry
+    """
+    __alive_filters__.configure(max_size, ttl, thread_safe)
+    return __alive_filters__
+
+
 def filter_outlier(
     distribution_id: Any = None,
     strategy: str = "recursion",
+    registry: FilterRegistry = None,
+    max_retries: int = None,
+    metrics: Union[bool, FilterMetrics] = False,
     **outlier_detector_kwargs: Dict
 ) -> Callable:
     """Wraps a generic "pop" or "get" function, returning a sample of a gaussian distribution, with an outlier filter.
     When meeting an outlier the filter omits it and, depending on the strategy, it may call recursively the wrapped
     function, iteratively call the wrapped function, raise an ``OutlierException``, or wrap it in a generator. It
-    relies on ``OutlierDetector`` whose args can be forwarded using the proper argument.
+    relies on ``OutlierDetector`` whose args can be forwarded using the proper argument. The number of samples
+    rejected by the filter is exposed by the ``rejected_samples`` attribute of the wrapped function.
+
+    Coroutine functions are wrapped in coroutine functions, the 'generation' strategy producing an asynchronous
+    generator. Asynchronous generators are wrapped in asynchronous generators yielding the valid samples only.
 
     :param distribution_id: unique identifier for the distribution. In case empty, this is inferred runtime. In case
            wrapping a method, the first argument hash is used as default.
     :param strategy: 'recursion', 'iteration', 'exception' or 'generation'
-    :param outlier_detector_kwargs: the constructor arguments for the underlying detector
-
-    :raises ValueError: when strategy is invalid
-    :raises OutlierException: when strategy is 'exception' and an outlier is found
+    :param registry: the registry holding the underlying detector, defaults to the global one
+    :param max_retries: the maximum number of subsequent outliers skipped by the 'recursion', 'iteration' and
+           'generation' strategies before giving up raising an ``OutlierException``, unbounded if None
+    :param metrics: measures the calls, exposing a ``FilterMetrics`` as the ``metrics`` attribute of the wrapped
+           function: True for new metrics, or the metrics to update. Off by default, as it slows down every call
+    :param outlier_detector_kwargs: the constructor arguments for the underlying detector, for instance ``method`` to
+           pick a test other than Dixon's ('grubbs', 'hampel' or 'ewma', see ``OutlierDetector``) or ``detrend`` to
+           test the residuals of a series with a linear trend
+
+    :raises ValueError: when strategy, max_retries or method are invalid
+    :raises OutlierException: when strategy is 'exception' and an outlier is found, or when max_retries subsequent
+            outliers are found
     """
     if strategy not in __strategies_decorator__:
         raise ValueError(
@@ -35,6 +411,23 @@ def filter_outlier(
                 strategy, __strategies_decorator__
             )
         )
+    if max_retries is not None:
+        if max_retries < 0:
+            raise ValueError("Max retries should not be negative")
+        if strategy == "exception":
+            logging.warning(
+                "max_retries={} has no effect with strategy {}".format(
+                    max_retries, strategy
+                )
+            )
+    method = outlier_detector_kwargs.get("method", "dixon")
+    if method != "dixon" and method not in ENGINES:
+        # the detector is created on the first call, fail early
+        raise ValueError(
+            'Method "{}" unknown, please pick one in {}'.format(
+                method, ["dixon"] + list(ENGINES)
+            )
+        )
 
     if distribution_id is None:
         d_id = uuid4()
@@ -44,88 +437,315 @@ def filter_outlier(
     if strategy == "iteration":
 
         def iterative_outlier_filter(func):
+            retrieve = _filter_instance_retriever(
+                func, d_id, distribution_id, registry, outlier_detector_kwargs
+            )
+            if inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(func):
+                return _async_outlier_filter(func, retrieve, strategy, max_retries)
+
             def wrapper(*args, **kwargs):
-                od = _retrieve_filter_instance(
-                    func, args, d_id, distribution_id, **outlier_detector_kwargs
-                )
+                od = retrieve(args)
                 sample = func(*args, **kwargs)
+                retries = 0
                 while od.is_outlier(sample):
+                    wrapper.rejected_samples += 1
+                    if retries == max_retries:
+                        raise _retries_exhausted(max_retries, sample)
+                    retries += 1
                     sample = func(*args, **kwargs)
                 return sample
 
+            wrapper.rejected_samples = 0
             return wrapper
 
-        return iterative_outlier_filter
+        decorator = iterative_outlier_filter
     elif strategy == "generation":
 
         def generative_outlier_filter(func):
+            retrieve = _filter_instance_retriever(
+                func, d_id, distribution_id, registry, outlier_detector_kwargs
+            )
+            if inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(func):
+                return _async_outlier_filter(func, retrieve, strategy, max_retries)
+
             def wrapper(*args, **kwargs):
-                od = _retrieve_filter_instance(
-                    func, args, d_id, distribution_id, **outlier_detector_kwargs
-                )
+                od = retrieve(args)
+                retries = 0
                 while True:
                     sample = func(*args, **kwargs)
                     if not od.is_outlier(sample):
+                        retries = 0
                         yield sample
+                    else:
+                        wrapper.rejected_samples += 1
+                        if retries == max_retries:
+                            raise _retries_exhausted(max_retries, sample)
+                        retries += 1
 
+            wrapper.rejected_samples = 0
             return wrapper
 
-        return generative_outlier_filter
+        decorator = generative_outlier_filter
     elif strategy == "exception":
 
         def exception_outlier_filter(func):
+            retrieve = _filter_instance_retriever(
+                func, d_id, distribution_id, registry, outlier_detector_kwargs
+            )
+            if inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(func):
+                return _async_outlier_filter(func, retrieve, strategy, max_retries)
+
             def wrapper(*args, **kwargs):
-                od = _retrieve_filter_instance(
-                    func, args, d_id, distribution_id, **outlier_detector_kwargs
-                )
+                od = retrieve(args)
                 sample = func(*args, **kwargs)
                 if od.is_outlier(sample):
+                    wrapper.rejected_samples += 1
                     raise OutlierException("Detected Outlier in distribution", sample)
                 else:
                     return sample
 
+            wrapper.rejected_samples = 0
             return wrapper
 
-        return exception_outlier_filter
+        decorator = exception_outlier_filter
     else:
 
         def recursive_outlier_filter(func):
+            retrieve = _filter_instance_retriever(
+                func, d_id, distribution_id, registry, outlier_detector_kwargs
+            )
+            if inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(func):
+                return _async_outlier_filter(func, retrieve, strategy, max_retries)
+
             def wrapper(*args, **kwargs):
-                od = _retrieve_filter_instance(
-                    func, args, d_id, distribution_id, **outlier_detector_kwargs
-                )
-                sample = func(*args, **kwargs)
-                if od.is_outlier(sample):
-                    return wrapper(*args, **kwargs)
-                else:
-                    return sample
+                # Each outlier restarts the call from scratch, as a recursive call would do, but in a loop so that
+                # long bursts of outliers do not grow the stack
+                retries = 0
+                while True:
+                    od = retrieve(args)
+                    sample = func(*args, **kwargs)
+                    if not od.is_outlier(sample):
+                        return sample
+                    wrapper.rejected_samples += 1
+                    if retries == max_retries:
+                        raise _retries_exhausted(max_retries, sample)
+                    retries += 1
 
+            wrapper.rejected_samples = 0
             return wrapper
 
-        return recursive_outlier_filter
+        decorator = recursive_outlier_filter
 
+    if not metrics:
+        return decorator
+    if not isinstance(metrics, FilterMetrics):
+        metrics = FilterMetrics()
 
-def destroy_filter(distribution_id: Any):
+    def measured_outlier_filter(func):
+        return _measured_filter(decorator(func), metrics)
+
+    return measured_outlier_filter
+
+
+def destroy_filter(distribution_id: Any, registry: FilterRegistry = None):
     """
     Given an assigned distribution id, destroys the associated detector below the filter. Since the detector
     is a singleton instantiated on demand, this is the final effect of deleting the recorded samples buffer.
     :param distribution_id: the id associated toa filter on decoration
+    :param registry: the registry given to the filter on decoration, defaults to the global one
     """
-    if distribution_id in __alive_filters__:
-        del __alive_filters__[distribution_id]
+    if registry is None:
+        registry = __alive_filters__
+    if distribution_id in registry:
+        del registry[distribution_id]
 
 
-def _retrieve_filter_instance(
-    func, args, d_id, distribution_id, **outlier_detector_kwargs
+def _filter_instance_retriever(
+    func, d_id, distribution_id, registry, outlier_detector_kwargs
 ):
-    global __alive_filters__
+    """
+    Resolves once, at decoration time, how the filter wrapping ``func`` finds its detector. Returns a function of the
+    wrapped call positional arguments returning the detector.
+    """
+    if registry is None:
+        registry = __alive_filters__
+    retrieve = registry.retrieve
+
     if distribution_id is None:
         full_arg_spec = inspect.getfullargspec(func)
         if full_arg_spec.args and full_arg_spec.args[0] == "self":
-            d_id = args[0].__hash__()
-    if d_id not in __alive_filters__:
-        __alive_filters__[d_id] = OutlierDetector(**outlier_detector_kwargs)
-    return __alive_filters__[d_id]
+
+            def retrieve_method_instance(args):
+                owner = args[0]
+                return retrieve(owner.__hash__(), owner, **outlier_detector_kwargs)
+
+            return retrieve_method_instance
+
+    def retrieve_instance(args):
+        return retrieve(d_id, **outlier_detector_kwargs)
+
+    return retrieve_instance
+
+
+def _async_outlier_filter(func, retrieve, strategy, max_retries):
+    """Asynchronous counterpart of the strategies wrappers, for coroutine and asynchronous generator functions."""
+    if inspect.isasyncgenfunction(func):
+
+        async def wrapper(*args, **kwargs):
+            od = retrieve(args)
+            retries = 0
+            async for sample in func(*args, **kwargs):
+                if not od.is_outlier(sample):
+                    retries = 0
+                    yield sample
+                    continue
+                wrapper.rejected_samples += 1
+                if strategy == "exception":
+                    raise OutlierException("Detected Outlier in distribution", sample)
+                if retries == max_retries:
+                    raise _retries_exhausted(max_retries, sample)
+                retries += 1
+
+    elif strategy == "iteration":
+
+        async def wrapper(*args, **kwargs):
+            od = retrieve(args)
+            sample = await func(*args, **kwargs)
+            retries = 0
+            while od.is_outlier(sample):
+                wrapper.rejected_samples += 1
+                if retries == max_retries:
+                    raise _retries_exhausted(max_retries, sample)
+                retries += 1
+                sample = await func(*args, **kwargs)
+            return sample
+
+    elif strategy == "generation":
+
+        async def wrapper(*args, **kwargs):
+            od = retrieve(args)
+            retries = 0
+            while True:
+                sample = await func(*args, **kwargs)
+                if not od.is_outlier(sample):
+                    retries = 0
+                    yield sample
+                else:
+                    wrapper.rejected_samples += 1
+                    if retries == max_retries:
+                        raise _retries_exhausted(max_retries, sample)
+                    retries += 1
+
+    elif strategy == "exception":
+
+        async def wrapper(*args, **kwargs):
+            od = retrieve(args)
+            sample = await func(*args, **kwargs)
+            if od.is_outlier(sample):
+                wrapper.rejected_samples += 1
+                raise OutlierException("Detected Outlier in distribution", sample)
+            return sample
+
+    else:
+
+        async def wrapper(*args, **kwargs):
+            retries = 0
+            while True:
+                od = retrieve(args)
+                sample = await func(*args, **kwargs)
+                if not od.is_outlier(sample):
+                    return sample
+                wrapper.rejected_samples += 1
+                if retries == max_retries:
+                    raise _retries_exhausted(max_retries, sample)
+                retries += 1
+
+    wrapper.rejected_samples = 0
+    return wrapper
+
+
+def _measured_filter(wrapper, metrics):
+    """
+    Wraps a filter wrapper recording its calls in ``metrics``, the outliers skipped by each call are read from its
+    ``rejected_samples`` counter. Generators are measured at each sample yielded.
+    """
+    record = metrics.__record__
+
+    def update(rejected, start):
+        record(perf_counter() - start, wrapper.rejected_samples - rejected)
+        measured.rejected_samples = wrapper.rejected_samples
+
+    if inspect.isasyncgenfunction(wrapper):
+
+        async def measured(*args, **kwargs):
+            generator = wrapper(*args, **kwargs)
+            try:
+                while True:
+                    rejected = wrapper.rejected_samples
+                    start = perf_counter()
+                    try:
+                        sample = await generator.__anext__()
+                    except StopAsyncIteration:
+                        measured.rejected_samples = wrapper.rejected_samples
+                        return
+                    except BaseException:
+                        update(rejected, start)
+                        raise
+                    update(rejected, start)
+                    yield sample
+            finally:
+                await generator.aclose()
+
+    elif inspect.isgeneratorfunction(wrapper):
+
+        def measured(*args, **kwargs):
+            generator = wrapper(*args, **kwargs)
+            try:
+                while True:
+                    rejected = wrapper.rejected_samples
+                    start = perf_counter()
+                    try:
+                        sample = next(generator)
+                    except StopIteration:
+                        measured.rejected_samples = wrapper.rejected_samples
+                        return
+                    except BaseException:
+                        update(rejected, start)
+                        raise
+                    update(rejected, start)
+                    yield sample
+            finally:
+                generator.close()
+
+    elif inspect.iscoroutinefunction(wrapper):
+
+        async def measured(*args, **kwargs):
+            rejected = wrapper.rejected_samples
+            start = perf_counter()
+            try:
+                return await wrapper(*args, **kwargs)
+            finally:
+                update(rejected, start)
+
+    else:
+
+        def measured(*args, **kwargs):
+            rejected = wrapper.rejected_samples
+            start = perf_counter()
+            try:
+                return wrapper(*args, **kwargs)
+            finally:
+                update(rejected, start)
+
+    measured.rejected_samples = wrapper.rejected_samples
+    measured.metrics = metrics
+    return measured
+
+
+def _retries_exhausted(max_retries, sample):
+    return OutlierException(
+        "Limit of {} subsequent outliers reached".format(max_retries), sample
+    )
 
 
 class OutlierFilter(OutlierDetector):
@@ -135,13 +755,17 @@ class OutlierFilter(OutlierDetector):
     Relies on ``OutlierDetector`` whose args can be forwarded using the proper argument.
     """
 
+    __slots__ = ("limit", "strategy", "__outlier_counter__")
+
     def __init__(self, strategy="iteration", limit=None, **outlier_detector_kwargs):
         """
 
         :param distribution_id: unique identifier for the distribution. In case empty, this is inferred runtime. In case
                wrapping a method, the first argument hash is used as default.
         :param strategy: 'recursion', 'iteration' or 'exception'
-        :param outlier_detector_kwargs: the constructor arguments for the underlying detector
+        :param outlier_detector_kwargs: the constructor arguments for the underlying detector, for instance ``method``
+               to pick a test other than Dixon's ('grubbs', 'hampel' or 'ewma', see ``OutlierDetector``) or ``detrend``
+               to test the residuals of a series with a linear trend
 
         :raises ValueError: when strategy is invalid
         """
@@ -170,6 +794,16 @@ class OutlierFilter(OutlierDetector):
         self.strategy = strategy
         self.__outlier_counter__ = 0
 
+    def __reduce__(self):
+        restore, arguments = OutlierDetector.__reduce__(self)
+        # the detector snapshot holds the detector configuration only, the filter one is restored as slots state
+        state = {
+            "limit": self.limit,
+            "strategy": self.strategy,
+            "__outlier_counter__": self.__outlier_counter__,
+        }
+        return restore, arguments, (None, state)
+
     def filter(self, func: Callable, *args: List, **kwargs: Dict) -> Iterator[float]:
         """
         :raises OutlierException: when strategy is 'exception' and an outlier is found
@@ -191,5 +825,75 @@ class OutlierFilter(OutlierDetector):
                     self.__outlier_counter__ += 1
         if self.limit:
             raise OutlierException(
-                "Limit of {} subsequent outliers reached", self.limit
+                "Limit of {} subsequent outliers reached".format(self.limit), self.limit
+            )
+
+    def filter_iter(self, iterable: Iterable[float]) -> Iterator[float]:
+        """
+        Pipeline stage counterpart of ``filter``: consumes the samples of ``iterable`` yielding only the valid ones,
+        and stops when ``iterable`` is exhausted.
+
+        :raises OutlierException: when strategy is 'exception' and an outlier is found, or when the limit of subsequent
+                outliers is reached
+
+        :param iterable: the samples source
+        """
+        is_outlier = self.is_outlier
+        raising = self.strategy == "exception"
+        limit = self.limit
+        self.__outlier_counter__ = 0
+        for sample in iterable:
+            if not is_outlier(sample):
+                self.__outlier_counter__ = 0
+                yield sample
+            elif raising:
+                raise OutlierException("Detected Outlier in distribution", sample)
+            elif limit is not None:
+                self.__outlier_counter__ += 1
+                if self.__outlier_counter__ > limit:
+                    if limit:
+                        raise OutlierException(
+                            "Limit of {} subsequent outliers reached".format(limit),
+                            limit,
+                        )
+                    return
+
+    def score_iter(self, iterable: Iterable[float]) -> Iterator[Tuple[float, int]]:
+        """
+        Pipeline stage annotating each sample of ``iterable`` with its outlier score, see
+        ``OutlierDetector.get_outlier_score``. No sample is dropped, regardless the strategy.
+
+        :param iterable: the samples source
+        :return: an iterator over (sample, score) pairs
+        """
+        get_outlier_score = self.get_outlier_score
+        for sample in iterable:
+            yield sample, get_outlier_score(sample)
+
+    async def afilter(
+        self, func: Callable, *args: List, **kwargs: Dict
+    ) -> AsyncIterator[float]:
+        """
+        Asynchronous counterpart of ``filter``, awaiting the samples from the coroutine function ``func``.
+
+        :raises OutlierException: when strategy is 'exception' and an outlier is found
+
+        :param func: the coroutine function returning a new sample
+        :param args: positional arguments for ``func``
+        :param kwargs: keyword arguments for ``func``
+        """
+        self.__outlier_counter__ = 0
+        while self.limit is None or self.__outlier_counter__ <= self.limit:
+            sample = await func(*args, **kwargs)
+            if not self.is_outlier(sample):
+                yield sample
+                self.__outlier_counter__ = 0
+            else:
+                if self.strategy == "exception":
+                    raise OutlierException("Detected Outlier in distribution", sample)
+                if self.limit is not None:
+                    self.__outlier_counter__ += 1
+        if self.limit:
+            raise OutlierException(
+                "Limit of {} subsequent outliers reached".format(self.limit), self.limit
             )
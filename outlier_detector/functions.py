@@ -1,7 +1,17 @@
 from numbers import Real
-from typing import List
+from typing import List, Sequence, Union
 
-from outlier_detector import Qvals
+from outlier_detector.critical_values import (
+    MAX_BUFFER_SAMPLES,
+    critical_values,
+    dixon_ratio,
+    statistic_tables,
+)
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, batch functions fall back to pure Python
+    np = None
 
 
 def get_outlier_score(
@@ -9,6 +19,7 @@ def get_outlier_score(
     new_value: float,
     confidence: float = 0.95,
     sigma_threshold: float = 2,
+    statistic: str = "r10",
 ) -> int:
     """
     Computes whether the incoming ``new_value`` is an outlier with respect to the given ``distribution``. It computes
@@ -19,13 +30,15 @@ def get_outlier_score(
 
     :param distribution: The incoming numeric set of values representing the distribution. Ideally this has been removed
      the linear monotonic trend or any other drift (in case applicable) so to make it a Gaussian distribution. Any trend
-     indeed affects the outlier estimation. Accepted length is between 5 and 27 samples.
+     indeed affects the outlier estimation, see ``outlier_detector.trend``. Accepted length is between 5 and 100
+     samples.
     :param new_value: The novel sample to be evaluated.
     :param confidence: The confidence for the outlier estimation: since Dixon's test relies on tabled values the
-     available confidence steps are: 0.90, 0.95 and 0.99. Defaults to 0.95. Also percentage values are accepted (i.e.
-     90, 95 and 99).
+     available confidence steps are: 0.80, 0.85, 0.90, 0.95, 0.975, 0.99, 0.995 and 0.999 (see
+     ``outlier_detector.critical_values``). Defaults to 0.95. Also percentage values are accepted (i.e. 90, 95 and 99).
     :param sigma_threshold: multiplier for further analysis, samples outside the sigma boundary (**mean** -
     ``sigma_threshold`` **sigma**, **mean** + ``sigma_threshold`` **sigma** ) are marked as "warning"
+    :param statistic: the Dixon's statistic, 'r10' (the default), 'r11', 'r21', 'r22' or 'auto', see ``is_outlier``
     :return: 0 for valid samples, 1 for outside the sigma threshold ("warning"), 2 for outliers
     :raises ValueError: If sigma_threshold is negative or 0
     """
@@ -34,7 +47,7 @@ def get_outlier_score(
     if sigma_threshold <= 0:
         raise ValueError("Sigma threshold should be greater than 0")
 
-    if is_outlier(distribution, new_value, confidence=confidence):
+    if is_outlier(distribution, new_value, confidence=confidence, statistic=statistic):
         return 2
 
     mu = sum(distribution) / float(len(distribution))
@@ -47,7 +60,10 @@ def get_outlier_score(
 
 
 def is_outlier(
-    distribution: List[float], new_value: float, confidence: float = 0.95
+    distribution: List[float],
+    new_value: float,
+    confidence: float = 0.95,
+    statistic: str = "r10",
 ) -> bool:
     """
     Computes whether the incoming ``new_value`` is an outlier with respect to the given ``distribution``. It computes
@@ -56,11 +72,15 @@ def is_outlier(
 
     :param distribution: The incoming numeric set of values representing the distribution. Ideally this has been removed
      the linear monotonic trend or any other drift (in case applicable) so to make it a Gaussian distribution. Any trend
-     indeed affects the outlier estimation. Accepted length is between 5 and 27 samples.
+     indeed affects the outlier estimation, see ``outlier_detector.trend``. Accepted length is between 5 and 100
+     samples.
     :param new_value: The novel sample to be evaluated.
     :param confidence: The confidence for the outlier estimation: since Dixon's test relies on tabled values the
-     available confidence steps are: 0.90, 0.95 and 0.99. Defaults to 0.95. Also percentage values are accepted (i.e.
-     90, 95 and 99).
+     available confidence steps are: 0.80, 0.85, 0.90, 0.95, 0.975, 0.99, 0.995 and 0.999 (see
+     ``outlier_detector.critical_values``). Defaults to 0.95. Also percentage values are accepted (i.e. 90, 95 and 99).
+    :param statistic: the Dixon's statistic, 'r10' (gap over range, the default), 'r11', 'r21', 'r22' (excluding the
+     samples next to the extremes, more robust for larger distributions) or 'auto' (picked by the distribution length,
+     see ``outlier_detector.critical_values.auto_statistic``).
     :return: False for valid samples, True for outliers
     :raises ValueError: when confidence value set is not tabled;
     :raises ValueError: in case distribution  confidence value set is not tabled;
@@ -69,19 +89,18 @@ def is_outlier(
 
     if confidence > 1:
         confidence /= 100
-    if not (confidence in Qvals):
-        raise ValueError(
-            "Confidence value not tabled, please choose between 0.90, 0.95, and 0.99"
-        )
+    critical_values(confidence)
     if not isinstance(distribution, List):
         raise TypeError(
             'Cannot search outliers in not List datatypes "{}"'.format(
                 type(distribution).__name__
             )
         )
-    if len(distribution) < 5 or len(distribution) > 27:
+    if len(distribution) < 5 or len(distribution) > MAX_BUFFER_SAMPLES:
         raise ValueError(
-            "Input distribution must have at least 5 elements and no more than 27"
+            "Input distribution must have at least 5 elements and no more than {}".format(
+                MAX_BUFFER_SAMPLES
+            )
         )
     if not isinstance(distribution[0], Real):
         raise TypeError(
@@ -96,23 +115,143 @@ def is_outlier(
             )
         )
 
-    q_vals = Qvals[confidence]
+    q_vals, ranks = statistic_tables(confidence, len(distribution) + 1, statistic)
 
     x = copy(distribution)
     x.append(new_value)
     x.sort()
 
-    q = 0
-    if new_value == x[0]:
-        q = abs(x[1] - x[0])
     if new_value == x[-1]:
-        q = abs(x[-1] - x[-2])
-    if q == 0:
+        position = len(x) - 1
+    elif new_value == x[0]:
+        position = 0
+    else:
         return False
 
-    q /= abs(x[-1] - x[0])
+    gap, trim = ranks[len(x)]
+    return dixon_ratio(x, position, 0, len(x) - 1, gap, trim) > q_vals[len(x)]
+
+
+def get_outlier_score_batch(
+    distributions: Sequence[Sequence[float]],
+    new_values: Sequence[float],
+    confidence: float = 0.95,
+    sigma_threshold: float = 2,
+    statistic: str = "r10",
+) -> Union[List[int], "np.ndarray"]:
+    """
+    Batch counterpart of ``get_outlier_score``: evaluates each of the ``new_values`` against the distribution in the
+    same row of ``distributions``. When numpy is available the whole batch is scored with vectorized operations,
+    otherwise each row is scored with ``get_outlier_score``.
+
+    :param distributions: 2-D array (or sequence of sequences) of windows, one per row. With numpy all the windows
+     must have the same length, between 5 and 100 samples.
+    :param new_values: the novel samples to be evaluated, one per window.
+    :param confidence: The confidence for the outlier estimation, see ``is_outlier``.
+    :param sigma_threshold: multiplier for the sigma boundary, see ``get_outlier_score``.
+    :param statistic: the Dixon's statistic, see ``is_outlier``.
+    :return: an int8 numpy array (or a list when numpy is missing) holding 0 for valid samples, 1 for outside the
+     sigma threshold ("warning"), 2 for outliers
+    :raises ValueError: If sigma_threshold is negative or 0
+    """
+    if sigma_threshold <= 0:
+        raise ValueError("Sigma threshold should be greater than 0")
+
+    if np is None:
+        return [
+            get_outlier_score(list(d), v, confidence, sigma_threshold, statistic)
+            for d, v in zip(distributions, new_values)
+        ]
+
+    x, new_values = _validate_batch(distributions, new_values)
+    outliers = _batch_q_test(x, new_values, confidence, statistic)
+
+    mu = x.mean(axis=1)
+    sd = x.std(axis=1, ddof=1) * float(sigma_threshold)
+    scores = ((new_values > mu + sd) | (new_values < mu - sd)).astype(np.int8)
+    scores[outliers] = 2
+    return scores
+
+
+def is_outlier_batch(
+    distributions: Sequence[Sequence[float]],
+    new_values: Sequence[float],
+    confidence: float = 0.95,
+    statistic: str = "r10",
+) -> Union[List[bool], "np.ndarray"]:
+    """
+    Batch counterpart of ``is_outlier``: evaluates each of the ``new_values`` against the distribution in the same row
+    of ``distributions``. When numpy is available the whole batch is tested with vectorized operations, otherwise each
+    row is tested with ``is_outlier``.
+
+    :param distributions: 2-D array (or sequence of sequences) of windows, one per row. With numpy all the windows
+     must have the same length, between 5 and 100 samples.
+    :param new_values: the novel samples to be evaluated, one per window.
+    :param confidence: The confidence for the outlier estimation, see ``is_outlier``.
+    :param statistic: the Dixon's statistic, see ``is_outlier``.
+    :return: a boolean numpy array (or a list when numpy is missing), True for outliers
+    :raises ValueError: when confidence value set is not tabled, or the batch is malformed
+    """
+    if np is None:
+        return [
+            is_outlier(list(d), v, confidence, statistic)
+            for d, v in zip(distributions, new_values)
+        ]
+
+    x, new_values = _validate_batch(distributions, new_values)
+    return _batch_q_test(x, new_values, confidence, statistic)
+
+
+def _validate_batch(distributions, new_values):
+    try:
+        x = np.asarray(distributions)
+        new_values = np.asarray(new_values)
+        # numeric strings are not samples, as for the single calls: the dtype is checked before converting
+        if x.dtype.kind not in "biuf" or new_values.dtype.kind not in "biuf":
+            raise TypeError
+        x = x.astype(float)
+        new_values = new_values.astype(float)
+    except (TypeError, ValueError):
+        raise TypeError("Cannot search outliers in not numeric batches")
+    if x.ndim != 2 or new_values.ndim != 1:
+        raise ValueError(
+            "Distributions must be a 2-D batch and new values a 1-D vector"
+        )
+    if x.shape[0] != new_values.shape[0]:
+        raise ValueError(
+            "Got {} distributions and {} new values".format(
+                x.shape[0], new_values.shape[0]
+            )
+        )
+    if x.shape[1] < 5 or x.shape[1] > MAX_BUFFER_SAMPLES:
+        raise ValueError(
+            "Input distribution must have at least 5 elements and no more than {}".format(
+                MAX_BUFFER_SAMPLES
+            )
+        )
+    return x, new_values
+
+
+def _batch_q_test(x, new_values, confidence, statistic):
+    if confidence > 1:
+        confidence /= 100
+    n = x.shape[1]
+    q_vals, ranks = statistic_tables(confidence, n + 1, statistic)
+    gap, trim = ranks[n + 1]
 
-    if q > q_vals[len(x)]:
-        return True
+    # only the few smallest and largest samples are needed: partition instead of a full sort
+    x = np.partition(
+        np.column_stack((x, new_values)),
+        sorted({0, gap, trim, n - trim, n - gap, n}),
+        axis=1,
+    )
+    low, high = x[:, 0], x[:, n]
+    low_gap, low_span = x[:, gap] - low, x[:, n - trim] - low
+    high_gap, high_span = high - x[:, n - gap], high - x[:, trim]
 
-    return False
+    gaps = np.where(
+        new_values == high, high_gap, np.where(new_values == low, low_gap, 0.0)
+    )
+    spans = np.where(new_values == high, high_span, low_span)
+    q = np.divide(gaps, spans, out=np.zeros_like(gaps), where=spans != 0)
+    return q > q_vals[n + 1]
@@ -0,0 +1,331 @@
+"""
+Opt-in instrumentation of detectors, filters and registries: counters, latency and retries histograms, callbacks on
+outliers and warnings. Nothing is measured unless asked, see the ``metrics`` argument of ``OutlierDetector`` and
+``filter_outlier``, so the default path pays nothing.
+
+The metrics are read as dicts with ``snapshot`` or exported in the Prometheus text format with ``prometheus_text`` and
+``write_prometheus``, for instance to the directory scraped by the node exporter textfile collector.
+"""
+
+import os
+from bisect import bisect_left
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, Mapping
+
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 1e-3, 1e-2, 0.1, 1)
+"""The default upper bounds, in seconds, of the latency histograms buckets"""
+
+RETRY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+"""The upper bounds of the buckets of the histograms of the outliers skipped by a filter call"""
+
+
+class Histogram:
+    """
+    Distribution of observed values in buckets, as Prometheus histograms: each bucket counts the values lower than or
+    equal to its upper bound, and no greater than the previous one.
+    """
+
+    def __init__(self, buckets: Iterable[float]) -> None:
+        """
+        :param buckets: the upper bounds of the buckets, values above them are counted in a last unbounded bucket
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        :return: the number and the sum of the observed values, along with the cumulative counts by upper bound
+        """
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+class DetectorMetrics:
+    """
+    Counters of the samples evaluated by a detector, by outcome, the histogram of the evaluation latency and the
+    callbacks invoked with each outlier and warning sample. The samples evaluated with ``is_outlier`` only are counted
+    as valid or outliers, since their warnings are not computed.
+    """
+
+    def __init__(
+        self,
+        on_outlier: Callable[[float], Any] = None,
+        on_warning: Callable[[float], Any] = None,
+        latency_buckets: Iterable[float] = LATENCY_BUCKETS,
+    ) -> None:
+        """
+        :param on_outlier: called with each outlier sample, after its evaluation
+        :param on_warning: called with each warning sample, after its evaluation
+        :param latency_buckets: the upper bounds, in seconds, of the latency histogram buckets
+        """
+        self.on_outlier = on_outlier
+        self.on_warning = on_warning
+        self.valid = 0
+        self.warnings = 0
+        self.outliers = 0
+        self.latency = Histogram(latency_buckets)
+
+    @property
+    def samples(self) -> int:
+        """The number of samples evaluated"""
+        return self.valid + self.warnings + self.outliers
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        :return: the counters and the latency histogram, see ``Histogram.snapshot``
+        """
+        return {
+            "samples": self.samples,
+            "valid": self.valid,
+            "warnings": self.warnings,
+            "outliers": self.outliers,
+            "latency": self.latency.snapshot(),
+        }
+
+    def __measure_is_outlier__(self, evaluate):
+        """Wraps a detector ``__is_outlier__`` with the measurement."""
+        observe = self.latency.observe
+
+        def measured(new_sample, *timestamp):
+            start = perf_counter()
+            outlier = evaluate(new_sample, *timestamp)
+            observe(perf_counter() - start)
+            if outlier:
+                self.outliers += 1
+                if self.on_outlier is not None:
+                    self.on_outlier(new_sample)
+            else:
+                self.valid += 1
+            return outlier
+
+        return measured
+
+    def __measure_score__(self, evaluate):
+        """Wraps a detector ``__outlier_score__`` with the measurement."""
+        observe = self.latency.observe
+
+        def measured(new_sample, *timestamp):
+            start = perf_counter()
+            score = evaluate(new_sample, *timestamp)
+            observe(perf_counter() - start)
+            if not score:
+                self.valid += 1
+            elif score == 2:
+                self.outliers += 1
+                if self.on_outlier is not None:
+                    self.on_outlier(new_sample)
+            else:
+                self.warnings += 1
+                if self.on_warning is not None:
+                    self.on_warning(new_sample)
+            return score
+
+        return measured
+
+
+class FilterMetrics:
+    """
+    Counters of the calls of a filtered function and of the outliers it skipped, with the histograms of the call latency
+    and of the outliers skipped by each call (the retries of the 'recursion', 'iteration' and 'generation' strategies).
+    Calls of the 'generation' strategy are the samples yielded, calls of the 'exception' strategy skip at most one
+    outlier, raising.
+    """
+
+    def __init__(
+        self,
+        latency_buckets: Iterable[float] = LATENCY_BUCKETS,
+        retry_buckets: Iterable[float] = RETRY_BUCKETS,
+    ) -> None:
+        """
+        :param latency_buckets: the upper bounds, in seconds, of the latency histogram buckets
+        :param retry_buckets: the upper bounds of the retries histogram buckets
+        """
+        self.calls = 0
+        self.rejected = 0
+        self.latency = Histogram(latency_buckets)
+        self.retries = Histogram(retry_buckets)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        :return: the counters and the latency and retries histograms, see ``Histogram.snapshot``
+        """
+        return {
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "latency": self.latency.snapshot(),
+            "retries": self.retries.snapshot(),
+        }
+
+    def __record__(self, elapsed, rejected):
+        self.calls += 1
+        self.rejected += rejected
+        self.latency.observe(elapsed)
+        self.retries.observe(rejected)
+
+
+def snapshot(sources: Mapping[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Reads the metrics of many detectors, filtered functions and registries at once.
+
+    :param sources: the instrumented objects by name: detectors built with ``metrics``, functions decorated by
+           ``filter_outlier`` with ``metrics``, ``FilterRegistry`` instances (their ``stats``), or metrics objects
+    :return: the snapshots by name
+    :raises ValueError: when a source is not instrumented
+    """
+    snapshots = {}
+    for name, source in sources.items():
+        metrics = _metrics(source)
+        snapshots[name] = (
+            metrics.snapshot() if hasattr(metrics, "snapshot") else metrics.stats()
+        )
+    return snapshots
+
+
+def prometheus_text(sources: Mapping[str, Any], prefix: str = "outlier") -> str:
+    """
+    Renders the metrics of many detectors, filtered functions and registries in the Prometheus text exposition format,
+    labelled by name.
+
+    :param sources: the instrumented objects by name, see ``snapshot``
+    :param prefix: the prefix of the metric names
+    :return: the exposition text
+    :raises ValueError: when a source is not instrumented
+    """
+    families = {}
+
+    def add(family, kind, description, labels, value, suffix=""):
+        samples = families.setdefault(family, (kind, description, []))[2]
+        samples.append((suffix, labels, value))
+
+    for name, source in sources.items():
+        metrics = _metrics(source)
+        if isinstance(metrics, DetectorMetrics):
+            label = 'detector="{}"'.format(_escape(name))
+            for outcome, value in (
+                ("valid", metrics.valid),
+                ("warning", metrics.warnings),
+                ("outlier", metrics.outliers),
+            ):
+                add(
+                    "detector_samples_total",
+                    "counter",
+                    "Samples evaluated, by outcome",
+                    '{},outcome="{}"'.format(label, outcome),
+                    value,
+                )
+            histograms = (
+                ("detector_latency_seconds", "Evaluation latency", metrics.latency),
+            )
+        elif isinstance(metrics, FilterMetrics):
+            label = 'filter="{}"'.format(_escape(name))
+            add("filter_calls_total", "counter", "Filtered calls", label, metrics.calls)
+            add(
+                "filter_rejected_total",
+                "counter",
+                "Outliers skipped",
+                label,
+                metrics.rejected,
+            )
+            histograms = (
+                ("filter_latency_seconds", "Filtered call latency", metrics.latency),
+                ("filter_retries", "Outliers skipped by each call", metrics.retries),
+            )
+        else:
+            label = 'registry="{}"'.format(_escape(name))
+            stats = metrics.stats()
+            for family, kind, description, value in (
+                ("registry_detectors", "gauge", "Detectors held", stats["size"]),
+                (
+                    "registry_hits_total",
+                    "counter",
+                    "Retrievals of existing detectors",
+                    stats["hits"],
+                ),
+                (
+                    "registry_misses_total",
+                    "counter",
+                    "Retrievals creating a detector",
+                    stats["misses"],
+                ),
+                (
+                    "registry_evictions_total",
+                    "counter",
+                    "Detectors evicted",
+                    stats["evictions"],
+                ),
+            ):
+                add(family, kind, description, label, value)
+            histograms = ()
+
+        for family, description, histogram in histograms:
+            data = histogram.snapshot()
+            for bound, count in data["buckets"].items():
+                bucket = '{},le="{}"'.format(label, _number(bound))
+                add(family, "histogram", description, bucket, count, "_bucket")
+            add(family, "histogram", description, label, data["sum"], "_sum")
+            add(family, "histogram", description, label, data["count"], "_count")
+
+    lines = []
+    for family, (kind, description, samples) in families.items():
+        lines.append("# HELP {}_{} {}".format(prefix, family, description))
+        lines.append("# TYPE {}_{} {}".format(prefix, family, kind))
+        for suffix, labels, value in samples:
+            lines.append(
+                "{}_{}{}{{{}}} {}".format(
+                    prefix, family, suffix, labels, _number(value)
+                )
+            )
+    return "".join(line + "\n" for line in lines)
+
+
+def write_prometheus(
+    path: str, sources: Mapping[str, Any], prefix: str = "outlier"
+) -> None:
+    """
+    Writes ``prometheus_text`` to a file, replacing it atomically so that a scraper never reads it half written.
+
+    :param path: the file path, for the node exporter textfile collector its name must end with ``.prom``
+    :param sources: the instrumented objects by name, see ``snapshot``
+    :param prefix: the prefix of the metric names
+    """
+    text = prometheus_text(sources, prefix)
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "w") as fh:
+        fh.write(text)
+    os.replace(temporary, path)
+
+
+def _metrics(source):
+    from outlier_detector.filters import FilterRegistry
+
+    if isinstance(source, (DetectorMetrics, FilterMetrics, FilterRegistry)):
+        return source
+    metrics = getattr(source, "metrics", None)
+    if isinstance(metrics, (DetectorMetrics, FilterMetrics)):
+        return metrics
+    raise ValueError(
+        "{} has no metrics, see the metrics argument of detectors and filters".format(
+            type(source).__name__
+        )
+    )
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
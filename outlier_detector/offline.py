@@ -0,0 +1,170 @@
+"""
+Offline scoring of binary files of samples, memory-mapped so that files larger than the memory can be scored. The input
+is a ``.npy`` file of float64 or float32 samples, or a raw file of native float64 samples; the output is a ``.npy``
+file of int8 scores when its name ends with ``.npy``, raw int8 scores otherwise. No numpy is required.
+
+Run as a script with ``python -m outlier_detector.offline``.
+"""
+
+import ast
+import mmap
+import struct
+import sys
+from array import array
+
+from outlier_detector.detectors import OutlierDetector
+
+CHUNK_SAMPLES = 65536
+"""The default number of samples scored at once"""
+
+_NPY_MAGIC = b"\x93NUMPY"
+_NATIVE = "<" if sys.byteorder == "little" else ">"
+_TYPECODES = {_NATIVE + "f8": "d", _NATIVE + "f4": "f"}
+
+
+def score_file(
+    in_path: str,
+    out_path: str,
+    buffer_samples: int = 14,
+    chunk_samples: int = CHUNK_SAMPLES,
+    **detector_kwargs
+) -> int:
+    """
+    Scores the samples of a file in order, as ``OutlierDetector.get_outlier_score`` would do, writing the scores to
+    another file. Both files are memory-mapped and scored in chunks, the chunks already scored are released, so that the
+    resident memory stays flat regardless of the file size.
+
+    :param in_path: the samples file, ``.npy`` of float64 or float32, raw native float64 otherwise
+    :param out_path: the scores file, ``.npy`` of int8 when the name ends with ``.npy``, raw int8 otherwise. It is
+           overwritten
+    :param buffer_samples: the window length, see ``OutlierDetector``
+    :param chunk_samples: the number of samples scored at once
+    :param detector_kwargs: the other ``OutlierDetector`` arguments
+    :return: the number of samples scored
+    :raises ValueError: when the input is not a supported file or chunk_samples is not positive
+    """
+    if chunk_samples <= 0:
+        raise ValueError("Chunk samples should be greater than 0")
+    score = OutlierDetector(
+        buffer_samples=buffer_samples, **detector_kwargs
+    ).__outlier_score__
+    with open(in_path, "rb") as source, open(out_path, "w+b") as target:
+        offset, typecode, length = _read_header(source)
+        if out_path.endswith(".npy"):
+            _write_header(target, "|i1", length)
+        out_offset = target.tell()
+        target.truncate(out_offset + length)
+        if not length:
+            return 0
+        itemsize = array(typecode).itemsize
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as inputs:
+            with mmap.mmap(target.fileno(), 0) as outputs:
+                samples = memoryview(inputs)[offset : offset + length * itemsize]
+                samples = samples.cast(typecode)
+                scores = memoryview(outputs)[out_offset:].cast("b")
+                try:
+                    read = written = 0
+                    for start in range(0, length, chunk_samples):
+                        end = min(start + chunk_samples, length)
+                        scores[start:end] = array(
+                            "b",
+                            [score(sample) for sample in samples[start:end].tolist()],
+                        )
+                        read = _release(inputs, read, offset + end * itemsize)
+                        written = _release(outputs, written, out_offset + end)
+                finally:
+                    samples.release()
+                    scores.release()
+    return length
+
+
+def _read_header(source):
+    """The data offset, the array typecode and the number of samples of the input file."""
+    source.seek(0, 2)
+    size = source.tell()
+    source.seek(0)
+    if source.read(len(_NPY_MAGIC)) != _NPY_MAGIC:
+        if size % 8:
+            raise ValueError("Raw sample files should hold float64 samples")
+        return 0, "d", size // 8
+    try:
+        major, _ = source.read(2)
+        header_size = struct.unpack(
+            "<H" if major == 1 else "<I", source.read(2 if major == 1 else 4)
+        )[0]
+        header = ast.literal_eval(source.read(header_size).decode("latin1"))
+        typecode = _TYPECODES[header["descr"]]
+        (length,) = header["shape"]
+        fortran_order = header["fortran_order"]
+    except (ValueError, SyntaxError, KeyError, TypeError, struct.error):
+        raise ValueError(
+            "Sample files should hold a one dimensional array of {}".format(
+                " or ".join(sorted(_TYPECODES))
+            )
+        )
+    if fortran_order and length > 1:
+        raise ValueError("Fortran ordered sample files are not supported")
+    offset = source.tell()
+    if offset + length * array(typecode).itemsize > size:
+        raise ValueError("Truncated sample file")
+    return offset, typecode, length
+
+
+def _write_header(target, descr, length):
+    """Writes a version 1.0 ``.npy`` header, padded so that the data is aligned to 64 bytes."""
+    header = "{{'descr': '{}', 'fortran_order': False, 'shape': ({},), }}".format(
+        descr, length
+    )
+    padding = -(len(_NPY_MAGIC) + 4 + len(header) + 1) % 64
+    header = (header + " " * padding + "\n").encode("latin1")
+    target.write(_NPY_MAGIC + b"\x01\x00" + struct.pack("<H", len(header)) + header)
+
+
+def _release(memory, start, end):
+    """
+    Drops from the process the pages of the mapped range from ``start`` to ``end``, the whole pages only. They are read
+    again from the file when accessed.
+
+    :return: the end of the released range
+    """
+    end -= end % mmap.PAGESIZE
+    if end > start and hasattr(memory, "madvise"):
+        memory.madvise(mmap.MADV_DONTNEED, start, end - start)
+        return end
+    return start
+
+
+def _main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Score a binary file of samples, writing a file of 0 (valid), 1 (warning) and 2 (outlier) scores"
+    )
+    parser.add_argument(
+        "input", help=".npy of float64 or float32, raw float64 otherwise"
+    )
+    parser.add_argument(
+        "output", help=".npy of int8 when named *.npy, raw int8 otherwise"
+    )
+    parser.add_argument("--buffer-samples", type=int, default=14)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--sigma-threshold", type=float, default=2)
+    parser.add_argument("--statistic", default="r10")
+    parser.add_argument("--method", default="dixon")
+    parser.add_argument("--chunk-samples", type=int, default=CHUNK_SAMPLES)
+    args = parser.parse_args()
+
+    score_file(
+        args.input,
+        args.output,
+        buffer_samples=args.buffer_samples,
+        chunk_samples=args.chunk_samples,
+        confidence=args.confidence,
+        sigma_threshold=args.sigma_threshold,
+        statistic=args.statistic,
+        method=args.method,
+    )
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,185 @@
+"""
+Parallel replay of historical datasets, scoring thousands of series across a pool of processes. Requires Python 3.8 or
+later to run more than one worker.
+"""
+
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Hashable, List, Tuple, Union
+
+from outlier_detector.detectors import OutlierDetector, _as_floats
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python 3.7 or earlier, replay runs in process
+    shared_memory = None
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, scores fall back to typed arrays
+    np = None
+
+CHUNK_SAMPLES = 100000
+"""The default number of samples sent to a worker at once"""
+
+# the shared memory blocks attached by each worker process, see ``_attach``
+_samples = None
+_scores = None
+_detector_kwargs = None
+
+
+def replay(
+    dataset: Any,
+    key_column: Hashable,
+    value_column: Hashable,
+    workers: int = None,
+    chunk_samples: int = CHUNK_SAMPLES,
+    **detector_kwargs
+) -> Union[array, "np.ndarray"]:
+    """
+    Scores every sample of a dataset holding many series, as a fresh ``OutlierDetector`` per series key fed with the
+    series samples in the dataset order would do. The series are partitioned in chunks of about ``chunk_samples``
+    samples and scored by a pool of processes: the samples and the scores are exchanged through shared memory, so only
+    the chunks boundaries are serialized. Series are never split across chunks, since their detectors are stateful.
+
+    :param dataset: the dataset columns by name, as a dict of sequences, a pandas DataFrame or a numpy structured array
+    :param key_column: the column identifying the series of each sample, its values must be hashable
+    :param value_column: the column of the samples, its values must be numbers
+    :param workers: the number of worker processes, by default the CPU count. With 1 worker the dataset is scored in
+           process
+    :param chunk_samples: the minimum number of samples of a chunk, larger chunks cut the scheduling cost while smaller
+           ones balance the workers load
+    :param detector_kwargs: the ``OutlierDetector`` arguments, ``thread_safe`` excluded
+    :return: the scores in the dataset order, an int8 numpy array (or an ``array('b')`` when numpy is missing) holding
+             0 for valid samples, 1 for warning, 2 for outliers
+    :raises ValueError: when the columns lengths differ or workers and chunk_samples are not positive
+    :raises RuntimeError: when more than 1 worker is requested and shared memory is not supported
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 0:
+        raise ValueError("Workers should be greater than 0")
+    if chunk_samples <= 0:
+        raise ValueError("Chunk samples should be greater than 0")
+    if workers > 1 and shared_memory is None:
+        raise RuntimeError("Parallel replay requires Python 3.8 or later")
+    # fails early on invalid detector arguments
+    OutlierDetector(**detector_kwargs)
+
+    keys = dataset[key_column]
+    samples = dataset[value_column]
+    if len(keys) != len(samples):
+        raise ValueError("Got {} keys and {} samples".format(len(keys), len(samples)))
+    samples = _as_floats(samples)
+    order, chunks = _partition(keys, chunk_samples)
+
+    if workers == 1 or len(chunks) <= 1:
+        sorted_scores = array("b", bytes(len(order)))
+        _score_chunks(
+            [samples[i] for i in order], sorted_scores, chunks, detector_kwargs
+        )
+    else:
+        sorted_scores = _replay_in_pool(
+            [samples[i] for i in order], chunks, workers, detector_kwargs
+        )
+
+    scores = array("b", bytes(len(order)))
+    for position, score in zip(order, sorted_scores):
+        scores[position] = score
+    return scores if np is None else np.frombuffer(scores, dtype=np.int8).copy()
+
+
+def _partition(keys, chunk_samples) -> Tuple[List[int], List[List[int]]]:
+    """
+    Groups the samples positions by series, in the dataset order within each series, and splits the series in chunks.
+
+    :return: the positions sorted by series, and the series lengths of each chunk in the same order
+    """
+    series = {}
+    for position, key in enumerate(keys):
+        positions = series.get(key)
+        if positions is None:
+            series[key] = positions = []
+        positions.append(position)
+
+    order = []
+    chunks = []
+    chunk = []
+    length = 0
+    for positions in series.values():
+        order.extend(positions)
+        chunk.append(len(positions))
+        length += len(positions)
+        if length >= chunk_samples:
+            chunks.append(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        chunks.append(chunk)
+    return order, chunks
+
+
+def _replay_in_pool(sorted_samples, chunks, workers, detector_kwargs):
+    samples = shared_memory.SharedMemory(
+        create=True, size=max(1, 8 * len(sorted_samples))
+    )
+    scores = shared_memory.SharedMemory(create=True, size=max(1, len(sorted_samples)))
+    try:
+        view = samples.buf.cast("d")
+        view[: len(sorted_samples)] = array("d", sorted_samples)
+        view.release()
+        del sorted_samples
+
+        tasks = []
+        start = 0
+        for chunk in chunks:
+            tasks.append((start, chunk))
+            start += sum(chunk)
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(chunks)),
+            initializer=_attach,
+            initargs=(samples.name, scores.name, detector_kwargs),
+        ) as executor:
+            for _ in executor.map(_score_task, tasks):
+                pass
+        return bytes(scores.buf[:start])
+    finally:
+        for memory in (samples, scores):
+            memory.close()
+            memory.unlink()
+
+
+def _attach(samples_name, scores_name, detector_kwargs):
+    """Pool initializer, attaching the worker to the shared samples and scores once."""
+    global _samples, _scores, _detector_kwargs
+    _samples = shared_memory.SharedMemory(samples_name)
+    _scores = shared_memory.SharedMemory(scores_name)
+    _detector_kwargs = detector_kwargs
+
+
+def _score_task(task):
+    start, chunk = task
+    end = start + sum(chunk)
+    samples = _samples.buf.cast("d")
+    scores = _scores.buf.cast("b")
+    try:
+        chunk_scores = array("b", bytes(end - start))
+        _score_chunks(
+            samples[start:end].tolist(), chunk_scores, [chunk], _detector_kwargs
+        )
+        scores[start:end] = chunk_scores
+    finally:
+        samples.release()
+        scores.release()
+
+
+def _score_chunks(samples, scores, chunks, detector_kwargs):
+    """Scores the consecutive series of the given lengths, writing the scores in place."""
+    position = 0
+    for chunk in chunks:
+        for length in chunk:
+            score = OutlierDetector(**detector_kwargs).__outlier_score__
+            for i in range(position, position + length):
+                scores[i] = score(samples[i])
+            position += length
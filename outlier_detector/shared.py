@@ -0,0 +1,413 @@
+"""
+Detector state in shared memory, for the worker processes scoring the same keyed streams. Requires Python 3.8 or later.
+"""
+
+import multiprocessing
+import struct
+from hashlib import blake2b
+from numbers import Real
+from typing import Hashable, Iterable, List, Sequence
+
+from outlier_detector.detectors import DetectorBank, _as_floats
+from outlier_detector.filters import _decode_key, _encode_key
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python 3.7 or earlier
+    shared_memory = None
+
+_EMPTY = 0
+_REMOVED = -1
+_FREE_DIGESTS = (_EMPTY, _REMOVED)
+
+
+class SharedDetectorBank(DetectorBank):
+    """
+    ``DetectorBank`` whose windows, arrival rings and running sums live in a block of shared memory, with a fixed size
+    slot per key. Several processes can score the same keys concurrently: the slots are guarded by a pool of locks,
+    each one shared by the slots with the same index modulo ``locks``, and new keys are allocated under a bank-wide
+    lock.
+
+    The bank is shared with other processes by inheritance, passing it to ``multiprocessing.Process`` or to the
+    ``initargs`` of a pool, as its locks. The keys are identified across processes by a 64 bits digest, so they must be
+    str, bool, int, bytes or UUID, and are stored encoded in their slot, up to ``key_size`` bytes, to be listed by
+    ``keys``. The process that created the bank should ``unlink`` it once done, every process should ``close`` it.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        confidence: float = 0.95,
+        buffer_samples: int = 14,
+        sigma_threshold: float = 2,
+        resync_interval: int = 1000,
+        statistic: str = "r10",
+        locks: int = 64,
+        key_size: int = 64,
+    ) -> None:
+        """
+        :param capacity: the maximum number of keys held
+        :param confidence: the confidence for the outlier estimation, see ``OutlierDetector``
+        :param buffer_samples: the window length of each distribution, see ``OutlierDetector``
+        :param sigma_threshold: multiplier for the "warning" sigma range, see ``OutlierDetector``
+        :param resync_interval: accepted samples between exact recomputations of the window statistics, see
+               ``OutlierDetector``
+        :param statistic: the Dixon's statistic, see ``OutlierDetector``
+        :param locks: the number of locks guarding the slots
+        :param key_size: the maximum length of the encoded keys in bytes, a byte for the key type followed by the UTF-8
+               str, the decimal int, the bytes or the 16 bytes of the UUID. Scoring a longer key raises ValueError.
+        :raises ValueError: when capacity, locks or key_size are not positive
+        :raises RuntimeError: when shared memory is not supported
+        """
+        if shared_memory is None:
+            raise RuntimeError("Shared memory requires Python 3.8 or later")
+        if capacity <= 0:
+            raise ValueError("Capacity should be greater than 0")
+        if locks <= 0:
+            raise ValueError("Locks should be greater than 0")
+        if key_size <= 0:
+            raise ValueError("Key size should be greater than 0")
+        DetectorBank.__init__(
+            self,
+            confidence,
+            buffer_samples,
+            sigma_threshold,
+            resync_interval,
+            statistic,
+        )
+        self._arguments = (
+            capacity,
+            confidence,
+            buffer_samples,
+            sigma_threshold,
+            resync_interval,
+            statistic,
+        )
+        self.capacity = capacity
+        self.key_size = key_size
+        self._allocation = multiprocessing.Lock()
+        self._locks = [multiprocessing.Lock() for _ in range(locks)]
+        self._owner = True
+        size = sum(
+            struct.calcsize(typecode) * length for typecode, length in self.__layout__()
+        )
+        memory = shared_memory.SharedMemory(create=True, size=size)
+        self.__attach__(memory)
+
+    @property
+    def name(self) -> str:
+        """The name of the shared memory block"""
+        return self._memory.name
+
+    def __len__(self) -> int:
+        digests = self._digests
+        return sum(
+            1 for slot in range(self.capacity) if digests[slot] not in _FREE_DIGESTS
+        )
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.__find__(_digest(key)) is not None
+
+    def keys(self) -> List[Hashable]:
+        """
+        :return: the keys of the distributions held by the bank, allocated by any process
+        """
+        keys = []
+        for slot in range(self.capacity):
+            with self._locks[slot % len(self._locks)]:
+                if self._digests[slot] in _FREE_DIGESTS:
+                    continue
+                start = slot * self.key_size
+                encoded = bytes(self._keys[start : start + self._key_lengths[slot]])
+            keys.append(_decode_key(encoded[:1], encoded[1:]))
+        return keys
+
+    def remove(self, key: Hashable) -> None:
+        """
+        Drops the window of the given distribution, its slot is reused by a next new key.
+
+        :param key: the distribution identifier
+        :raises KeyError: when the key is unknown
+        """
+        digest = _digest(key)
+        with self._allocation:
+            slot = self.__find__(digest)
+            if slot is None:
+                raise KeyError(key)
+            with self._locks[slot % len(self._locks)]:
+                self._digests[slot] = _REMOVED
+        self._cache.pop(key, None)
+
+    def score(self, key: Hashable, new_sample: float) -> int:
+        """
+        Evaluates the incoming sample of the distribution identified by ``key`` and (in case it is valid) stores it
+        in the distribution window, like ``OutlierDetector.get_outlier_score``. Unknown keys get a new empty window.
+
+        :param key: the distribution identifier
+        :param new_sample: distribution new sample
+        :return: 0 for valid samples, 1 for warning, 2 for outliers
+        :raises RuntimeError: when the bank is full
+        """
+        if not isinstance(new_sample, Real):
+            raise TypeError(
+                'Cannot search outliers of not numeric or not compatible datatypes "{}"'.format(
+                    type(new_sample).__name__
+                )
+            )
+        return self.__locked_score__(key, new_sample)
+
+    def score_many(
+        self, keys: Iterable[Hashable], new_samples: Iterable[float]
+    ) -> List[int]:
+        """
+        Evaluates a batch of samples, each one belonging to the distribution with the key in the same position, see
+        ``DetectorBank.score_many``. Each sample is scored holding the lock of its slot only.
+
+        :param keys: the distribution identifiers
+        :param new_samples: the distributions new samples
+        :return: the scores, 0 for valid samples, 1 for warning, 2 for outliers
+        :raises RuntimeError: when the bank is full
+        """
+        keys = list(keys)
+        new_samples = list(new_samples)
+        if len(keys) != len(new_samples):
+            raise ValueError(
+                "Got {} keys and {} samples".format(len(keys), len(new_samples))
+            )
+        for new_sample in new_samples:
+            if not isinstance(new_sample, Real):
+                raise TypeError(
+                    'Cannot search outliers of not numeric or not compatible datatypes "{}"'.format(
+                        type(new_sample).__name__
+                    )
+                )
+        score = self.__locked_score__
+        return [score(key, new_sample) for key, new_sample in zip(keys, new_samples)]
+
+    def prime(
+        self, key: Hashable, samples: Sequence[float], validate: bool = False
+    ) -> int:
+        """
+        Seeds the window of the distribution identified by ``key`` with historical samples, see
+        ``DetectorBank.prime``. The window is seeded holding the lock of its slot.
+
+        :param key: the distribution identifier
+        :param samples: the historical samples, a numpy array or any sequence of numbers
+        :param validate: tests each sample as ``score`` does, storing the valid ones only
+        :return: the number of samples stored
+        :raises RuntimeError: when the bank is full
+        """
+        samples = _as_floats(samples)
+        if validate:
+            scores = self.score_many([key] * len(samples), samples)
+            return len(samples) - scores.count(2)
+        self.__locked__(key, self.__seed__, samples)
+        return len(samples)
+
+    def pooled_window(self, keys: Iterable[Hashable] = None) -> List[float]:
+        """
+        A synthetic window to seed new keys with, see ``DetectorBank.pooled_window``. Each sibling window is read
+        holding the lock of its slot.
+
+        :param keys: the sibling keys, all the keys of the bank by default
+        :return: the window samples, sorted, or none when the siblings hold fewer than 2 samples
+        :raises KeyError: when a key is unknown
+        """
+        if keys is None:
+            digests = self._digests
+            slots = [
+                slot
+                for slot in range(self.capacity)
+                if digests[slot] not in _FREE_DIGESTS
+            ]
+        else:
+            slots = []
+            for key in keys:
+                slot = self.__find__(_digest(key))
+                if slot is None:
+                    raise KeyError(key)
+                slots.append(slot)
+        return self.__pooled_window__(slots)
+
+    def close(self) -> None:
+        """
+        Detaches the current process from the shared memory, the bank is no more usable.
+        """
+        for view in self.__views__():
+            view.release()
+        self._memory.close()
+
+    def unlink(self) -> None:
+        """
+        Destroys the shared memory once every process closed it, to be called by the process that created the bank.
+        """
+        self._memory.unlink()
+
+    def __enter__(self) -> "SharedDetectorBank":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+        if self._owner:
+            self.unlink()
+
+    def __getstate__(self):
+        return {
+            "arguments": self._arguments,
+            "key_size": self.key_size,
+            "name": self._memory.name,
+            "allocation": self._allocation,
+            "locks": self._locks,
+        }
+
+    def __setstate__(self, state):
+        capacity, *arguments = state["arguments"]
+        DetectorBank.__init__(self, *arguments)
+        self._arguments = state["arguments"]
+        self.capacity = capacity
+        self.key_size = state["key_size"]
+        self._allocation = state["allocation"]
+        self._locks = state["locks"]
+        self._owner = False
+        self.__attach__(shared_memory.SharedMemory(state["name"]))
+
+    def __attach__(self, memory):
+        self._memory = memory
+        self._cache = {}
+        views = []
+        offset = 0
+        for typecode, length in self.__layout__():
+            end = offset + struct.calcsize(typecode) * length
+            views.append(memory.buf[offset:end].cast(typecode))
+            offset = end
+        (
+            self._digests,
+            self._windows,
+            self._lengths,
+            self._cursors,
+            self._pushes,
+            self._shifts,
+            self._sums,
+            self._sum_squares,
+            self._key_lengths,
+            self._keys,
+        ) = views
+
+    def __layout__(self):
+        """The typecode and length of each array in the shared memory block, in the order of ``__views__``."""
+        return (
+            ("q", self.capacity),
+            ("d", self.capacity * self._width),
+            ("q", self.capacity),
+            ("q", self.capacity),
+            ("q", self.capacity),
+            ("d", self.capacity),
+            ("d", self.capacity),
+            ("d", self.capacity),
+            ("q", self.capacity),
+            ("B", self.capacity * self.key_size),
+        )
+
+    def __views__(self):
+        return (
+            self._digests,
+            self._windows,
+            self._lengths,
+            self._cursors,
+            self._pushes,
+            self._shifts,
+            self._sums,
+            self._sum_squares,
+            self._key_lengths,
+            self._keys,
+        )
+
+    def __locked_score__(self, key, new_sample):
+        return self.__locked__(key, self.__score__, new_sample)
+
+    def __statistics__(self, slot):
+        with self._locks[slot % len(self._locks)]:
+            return DetectorBank.__statistics__(self, slot)
+
+    def __locked__(self, key, update, argument):
+        """Calls ``update`` with the slot of the key and the argument, holding the slot lock."""
+        while True:
+            cached = self._cache.get(key)
+            if cached is None:
+                digest = _digest(key)
+                slot = self.__find__(digest)
+                if slot is None:
+                    slot = self.__allocate__(digest, key)
+                self._cache[key] = slot, digest
+            else:
+                slot, digest = cached
+            with self._locks[slot % len(self._locks)]:
+                if self._digests[slot] == digest:
+                    return update(slot, argument)
+            # the key has been removed meanwhile
+            self._cache.pop(key, None)
+
+    def __find__(self, digest):
+        digests = self._digests
+        slot = digest % self.capacity
+        for _ in range(self.capacity):
+            found = digests[slot]
+            if found == digest:
+                return slot
+            if found == _EMPTY:
+                return None
+            slot = slot + 1 if slot + 1 < self.capacity else 0
+        return None
+
+    def __allocate__(self, digest, key):
+        tag, encoded = _encode_key(key)
+        encoded = tag + encoded
+        if len(encoded) > self.key_size:
+            raise ValueError(
+                "Shared detector key {!r} is longer than {} bytes".format(
+                    key, self.key_size
+                )
+            )
+        with self._allocation:
+            slot = self.__find__(digest)
+            if slot is not None:
+                # allocated by another process meanwhile
+                return slot
+            slot = digest % self.capacity
+            for _ in range(self.capacity):
+                if self._digests[slot] in _FREE_DIGESTS:
+                    break
+                slot = slot + 1 if slot + 1 < self.capacity else 0
+            else:
+                raise RuntimeError(
+                    "Shared detector bank is full, capacity {}".format(self.capacity)
+                )
+            with self._locks[slot % len(self._locks)]:
+                self._lengths[slot] = 0
+                self._cursors[slot] = 0
+                self._pushes[slot] = 0
+                self._shifts[slot] = 0.0
+                self._sums[slot] = 0.0
+                self._sum_squares[slot] = 0.0
+                start = slot * self.key_size
+                self._keys[start : start + len(encoded)] = encoded
+                self._key_lengths[slot] = len(encoded)
+                # published last, once the slot is ready
+                self._digests[slot] = digest
+            return slot
+
+
+def _digest(key):
+    """A digest of the key, stable across processes unlike ``hash``."""
+    encoded = _encode_key(key)
+    if encoded is None:
+        raise TypeError(
+            "Shared detector keys must be str, bool, int, bytes or UUID, got {}".format(
+                type(key).__name__
+            )
+        )
+    tag, key = encoded
+    digest = int.from_bytes(
+        blake2b(tag + key, digest_size=8).digest(), "little", signed=True
+    )
+    return digest if digest not in _FREE_DIGESTS else 1
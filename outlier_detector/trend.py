@@ -0,0 +1,238 @@
+"""
+Online detrending of a series: ``RollingTrend`` fits a least-squares line to the last samples, by arrival position, and
+turns each new sample into its residual from the line extrapolated to its position. The tests assume a stationary
+distribution, so a series with a linear trend is tested by its residuals instead, see the ``detrend`` argument of
+``OutlierDetector``.
+
+The line is updated in O(1) per sample from running sums over the window, instead of being refitted to the whole
+window at every sample.
+"""
+
+import struct
+from math import fsum, sqrt
+
+from outlier_detector.engines import (
+    _check_window,
+    _footprint,
+    _pack_floats,
+    _unpack_floats,
+    _zeros,
+)
+
+
+class RollingTrend:
+    """
+    Least-squares line of the last ``buffer_samples`` samples pushed, against their arrival position: each evaluated
+    sample takes the next position. Rejected samples are pushed too, clipped to ``sigma_threshold`` standard deviations
+    of the residuals from the line: an outlier barely moves the line, while a line that lags behind the series, having
+    fitted a slope to noise, is pulled back towards it instead of rejecting every next sample.
+
+    Each sample is first evaluated by ``residual``, then pushed::
+
+        trend = RollingTrend(14)
+        for sample in series:
+            outlier = detector.is_outlier(trend.residual(sample))
+            trend.push(sample, rejected=outlier)
+    """
+
+    __slots__ = (
+        "buffer_samples",
+        "resync_interval",
+        "sigma",
+        "_values",
+        "_positions",
+        "_length",
+        "_cursor",
+        "_position",
+        "_pushes",
+        "_origin",
+        "_shift",
+        "_sum_positions",
+        "_sum_squared_positions",
+        "_sum",
+        "_sum_squares",
+        "_sum_products",
+    )
+
+    def __init__(
+        self,
+        buffer_samples: int,
+        resync_interval: int = 1000,
+        sigma_threshold: float = 2,
+    ) -> None:
+        """
+        :param buffer_samples: the number of samples the line is fitted to
+        :param resync_interval: the running sums are updated incrementally, every ``resync_interval`` pushed samples
+               they are recomputed exactly, around the latest samples, to bound the floating point drift. 0 disables it.
+        :param sigma_threshold: the distance from the line the rejected samples are clipped to, in standard deviations
+               of the residuals
+        """
+        if buffer_samples < 1:
+            raise ValueError("Buffer samples should be at least 1")
+        self.buffer_samples = buffer_samples
+        self.resync_interval = resync_interval
+        self.sigma = sigma_threshold
+        self._values = _zeros(buffer_samples)
+        self._positions = _zeros(buffer_samples)
+        self._length = 0
+        self._cursor = 0
+        self._position = -1
+        self._pushes = 0
+        # running sums of the window positions and samples, shifted to reduce the cancellation error of the fit
+        self._origin = 0.0
+        self._shift = 0.0
+        self._sum_positions = 0.0
+        self._sum_squared_positions = 0.0
+        self._sum = 0.0
+        self._sum_squares = 0.0
+        self._sum_products = 0.0
+
+    def residual(self, new_sample: float) -> float:
+        """
+        Moves to the next position, returning the distance of the sample from the line at that position: 0 while no
+        sample was pushed, from their mean while the positions pushed are a single one.
+
+        :param new_sample: the series new sample
+        :return: the residual of the sample
+        """
+        self._position += 1
+        n = self._length
+        if not n:
+            return 0.0
+        mean_position = self._sum_positions / n
+        mean = self._sum / n
+        squares = self._sum_squared_positions - self._sum_positions * mean_position
+        if squares > 0:
+            slope = (self._sum_products - self._sum_positions * mean) / squares
+            position = self._position - self._origin
+            mean += slope * (position - mean_position)
+        return new_sample - self._shift - mean
+
+    def push(self, new_sample: float, rejected: bool = False) -> None:
+        """
+        Adds the sample last evaluated by ``residual`` to the line, evicting the oldest one once the window is full.
+
+        :param new_sample: the sample, as passed to ``residual``
+        :param rejected: whether the sample is an outlier, to be clipped to ``sigma_threshold`` residual standard
+               deviations from the line
+        """
+        if rejected and self._length:
+            new_sample = self.__clip__(new_sample)
+        if self._length == self.buffer_samples:
+            position = self._positions[self._cursor] - self._origin
+            value = self._values[self._cursor] - self._shift
+            self._sum_positions -= position
+            self._sum_squared_positions -= position * position
+            self._sum -= value
+            self._sum_squares -= value * value
+            self._sum_products -= position * value
+        else:
+            if not self._length:
+                self._origin = float(self._position)
+                self._shift = float(new_sample)
+            self._length += 1
+        self._values[self._cursor] = new_sample
+        self._positions[self._cursor] = self._position
+        self._cursor += 1
+        if self._cursor == self.buffer_samples:
+            self._cursor = 0
+
+        position = self._position - self._origin
+        value = new_sample - self._shift
+        self._sum_positions += position
+        self._sum_squared_positions += position * position
+        self._sum += value
+        self._sum_squares += value * value
+        self._sum_products += position * value
+        self._pushes += 1
+        if self._pushes == self.resync_interval:
+            self.__resync__()
+
+    def __clip__(self, new_sample):
+        n = self._length
+        mean_position = self._sum_positions / n
+        mean = self._sum / n
+        squares = self._sum_squared_positions - self._sum_positions * mean_position
+        deviations = self._sum_squares - self._sum * mean
+        degrees = n - 1
+        if squares > 0:
+            products = self._sum_products - self._sum_positions * mean
+            slope = products / squares
+            mean += slope * (self._position - self._origin - mean_position)
+            deviations -= slope * products
+            degrees -= 1
+        line = self._shift + mean
+        limit = (
+            self.sigma * sqrt(deviations / degrees) if deviations > 0 < degrees else 0.0
+        )
+        return min(max(new_sample, line - limit), line + limit)
+
+    def __resync__(self):
+        n = self._length
+        positions = self._positions[:n]
+        values = self._values[:n]
+        # the positions grow forever, the latest ones keep the sums small
+        self._origin = float(self._position)
+        self._shift = fsum(values) / n
+        shifted = [p - self._origin for p in positions]
+        values = [v - self._shift for v in values]
+        self._sum_positions = fsum(shifted)
+        self._sum_squared_positions = fsum(p * p for p in shifted)
+        self._sum = fsum(values)
+        self._sum_squares = fsum(v * v for v in values)
+        self._sum_products = fsum(p * v for p, v in zip(shifted, values))
+        self._pushes = 0
+
+    def __footprint__(self):
+        return _footprint(
+            self,
+            self._values,
+            self._positions,
+            self._origin,
+            self._shift,
+            self._sum_positions,
+            self._sum_squared_positions,
+            self._sum,
+            self._sum_squares,
+            self._sum_products,
+        )
+
+    def __dump__(self):
+        return _TREND_STATE.pack(
+            self._length,
+            self._cursor,
+            self._position,
+            self._pushes,
+            self._origin,
+            self._shift,
+            self._sum_positions,
+            self._sum_squared_positions,
+            self._sum,
+            self._sum_squares,
+            self._sum_products,
+        ) + _pack_floats(self._values, self._positions)
+
+    def __restore__(self, state):
+        (
+            self._length,
+            self._cursor,
+            self._position,
+            self._pushes,
+            self._origin,
+            self._shift,
+            self._sum_positions,
+            self._sum_squared_positions,
+            self._sum,
+            self._sum_squares,
+            self._sum_products,
+        ) = _TREND_STATE.unpack_from(state)
+        self._values, self._positions = _unpack_floats(
+            state[_TREND_STATE.size :], self.buffer_samples, self.buffer_samples
+        )
+        _check_window(self._length, self._cursor, self.buffer_samples)
+
+    def __state_size__(self):
+        return _TREND_STATE.size + 16 * self.buffer_samples
+
+
+_TREND_STATE = struct.Struct("<qqqqddddddd")
@@ -12,11 +12,14 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/docet85/outlier_detector",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=("benchmark",)),
+    package_data={"outlier_detector": ["critical_values.json"]},
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.5",
+    python_requires=">=3.6",
+    extras_require={"numpy": ["numpy"]},
+    entry_points={"console_scripts": ["outlier-detector=outlier_detector.cli:main"]},
 )
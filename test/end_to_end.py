@@ -1,3 +1,4 @@
+import asyncio
 import unittest
 
 from outlier_detector.exceptions import OutlierException
@@ -15,6 +16,20 @@ class TestGen:
         return res
 
 
+class AsyncTestGen(TestGen):
+    async def apop(self):
+        await asyncio.sleep(0)
+        return self.pop()
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
 class EndToEndTest(unittest.TestCase):
     def setUp(self):
         self.aset = [
@@ -254,3 +269,106 @@ class EndToEndTest(unittest.TestCase):
             self.assertGreater(counter, 0, "Iterator not run or no test data")
             return
         self.fail("Expected to hit the outlier limit")
+
+    def test_filter_object_iterable(self):
+        of = OutlierFilter()
+        self.assertEqual(
+            list(of.filter_iter(self.aset)), [x for x in self.aset if 0 <= x <= 4]
+        )
+
+        of = OutlierFilter(strategy="exception")
+        samples = iter(self.aset)
+        counter = 0
+        while True:
+            try:
+                for sample in of.filter_iter(samples):
+                    self.assertLessEqual(sample, 4, "Not filtered outlier")
+                    self.assertGreaterEqual(sample, 0, "Not filtered outlier")
+                    counter += 1
+                break
+            except OutlierException as e:
+                valid = 0 < e.value < 4
+                self.assertFalse(valid, "Filtered valid data")
+        self.assertEqual(counter, len(self.aset) - 3)
+
+    def test_filter_object_iterable_limit(self):
+        of = OutlierFilter(limit=1)
+        with self.assertRaises(OutlierException):
+            list(of.filter_iter(self.aset))
+
+    def test_filter_object_score_iterable(self):
+        from outlier_detector.detectors import OutlierDetector
+
+        od = OutlierDetector()
+        expected = [(x, od.get_outlier_score(x)) for x in self.aset]
+        self.assertEqual(list(OutlierFilter().score_iter(self.aset)), expected)
+
+    def test_filter_decorator_async(self):
+        for strategy in ("recursion", "iteration", "exception"):
+
+            class TempTestGen(AsyncTestGen):
+                @filter_outlier(strategy=strategy)
+                async def apop(self):
+                    return await super().apop()
+
+            async def consume(tg):
+                samples = []
+                while True:
+                    try:
+                        samples.append(await tg.apop())
+                    except OutlierException as e:
+                        valid = 0 < e.value < 4
+                        self.assertFalse(valid, "Filtered valid data")
+                    except IndexError:
+                        return samples
+
+            samples = run(consume(TempTestGen(self.aset)))
+            self.assertEqual(
+                samples, [x for x in self.aset if 0 <= x <= 4], "Wrong filtering"
+            )
+            self.assertEqual(TempTestGen.apop.rejected_samples, 3)
+
+    def test_filter_decorator_async_generative(self):
+        class TempTestGen(AsyncTestGen):
+            @filter_outlier(strategy="generation")
+            async def apop(self):
+                return await super().apop()
+
+        async def consume(tg):
+            samples = []
+            try:
+                async for sample in tg.apop():
+                    samples.append(sample)
+            except IndexError:
+                return samples
+
+        samples = run(consume(TempTestGen(self.aset)))
+        self.assertEqual(samples, [x for x in self.aset if 0 <= x <= 4])
+
+    def test_filter_decorator_async_generator(self):
+        aset = self.aset
+
+        @filter_outlier(strategy="iteration")
+        async def stream():
+            for sample in aset:
+                await asyncio.sleep(0)
+                yield sample
+
+        async def consume():
+            return [sample async for sample in stream()]
+
+        self.assertEqual(run(consume()), [x for x in self.aset if 0 <= x <= 4])
+
+    def test_filter_object_async(self):
+        of = OutlierFilter()
+        tg = AsyncTestGen(self.aset)
+
+        async def consume():
+            samples = []
+            try:
+                async for sample in of.afilter(tg.apop):
+                    samples.append(sample)
+            except IndexError:
+                return samples
+
+        self.assertEqual(run(consume()), [x for x in self.aset if 0 <= x <= 4])
@@ -1,10 +1,36 @@
 import unittest
-from copy import copy
+from array import array
 from unittest.mock import patch
 
-from outlier_detector.detectors import OutlierDetector
-from outlier_detector.filters import filter_outlier, OutlierFilter
-from outlier_detector.functions import get_outlier_score, is_outlier
+from outlier_detector.detectors import DetectorBank, OutlierDetector
+from outlier_detector.filters import filter_outlier, FilterRegistry, OutlierFilter
+from outlier_detector.functions import (
+    get_outlier_score,
+    get_outlier_score_batch,
+    is_outlier,
+    is_outlier_batch,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+
+def score_in_process(bank, keys, samples):
+    for sample in samples:
+        for key in keys:
+            bank.score(key, sample)
+
+
+def score_in_shared_process(bank, keys, samples):
+    score_in_process(bank, keys, samples)
+    bank.close()
 
 
 class InputValidation(unittest.TestCase):
@@ -35,7 +61,7 @@ class InputValidation(unittest.TestCase):
         self.assertRaises(ValueError, get_outlier_score, self.dist[:3], self.sample)
 
     def test_given_long_distribution_then_raise(self):
-        self.assertRaises(ValueError, get_outlier_score, self.dist * 4, self.sample)
+        self.assertRaises(ValueError, get_outlier_score, self.dist * 13, self.sample)
 
     def test_given_invalid_confidence_then_raise(self):
         self.assertRaises(
@@ -146,7 +172,7 @@ class InputValidation(unittest.TestCase):
         self.assertRaises(ValueError, OutlierDetector, buffer_samples=3)
 
     def test_given_long_buffer_then_raise(self):
-        self.assertRaises(ValueError, OutlierDetector, buffer_samples=30)
+        self.assertRaises(ValueError, OutlierDetector, buffer_samples=101)
 
     def test_given_invalid_confidence_to_detector_then_raise(self):
         self.assertRaises(ValueError, OutlierDetector, confidence=0.2)
@@ -155,6 +181,9 @@ class InputValidation(unittest.TestCase):
         self.assertRaises(ValueError, OutlierDetector, sigma_threshold=0)
         self.assertRaises(ValueError, OutlierDetector, sigma_threshold=-1)
 
+    def test_given_negative_resync_interval_to_detector_then_raise(self):
+        self.assertRaises(ValueError, OutlierDetector, resync_interval=-1)
+
     def test_given_valid_sigma_threshold_to_detector_then_set_it(self):
         from outlier_detector import Qvals
 
@@ -163,6 +192,13 @@ class InputValidation(unittest.TestCase):
         od = OutlierDetector(confidence=99)
         self.assertEqual(od.q, Qvals[0.99], "Confidence error")
 
+    def test_given_computed_confidence_to_detector_then_set_it(self):
+        from outlier_detector.critical_values import critical_values
+
+        od = OutlierDetector(confidence=97.5, buffer_samples=60)
+        self.assertEqual(od.q, critical_values(0.975, 61))
+        self.assertEqual(len(od.q), 99)
+
     def test_given_invalid_sample_type_to_detector_then_raise(self):
         od = OutlierDetector()
         try:
@@ -180,98 +216,40 @@ class AuxiliaryTest(unittest.TestCase):
     expected_even_sequence = [1, 4, 5, 6, 8, 10, 12]
 
     def setUp(self):
-        self.test_filter = OutlierDetector(buffer_samples=5)
-        self.test_filter._buffer = copy(self.test_odd_sequence)
-
-    def test_given_first_three_vals_then_insertion_points_are_correct(self):
-        self.test_filter._buffer = []
-        insertion_point = self.test_filter.__sorted_insert__(0)
-        self.assertEqual(insertion_point, 0, "Wrong insertion point")
-        insertion_point = self.test_filter.__sorted_insert__(1)
-        self.assertEqual(insertion_point, 1, "Wrong insertion point")
-        insertion_point = self.test_filter.__sorted_insert__(2)
-        self.assertEqual(insertion_point, 2, "Wrong insertion point")
-        self.assertEqual(self.test_filter._buffer, [0, 1, 2])
-
-    def test_given_new_value_odd_seq_then_insertion_point_is_correct(self):
-        insertion_point = self.test_filter.__sorted_insert__(self.new_value)
-        self.assertEqual(insertion_point, 2, "Wrong insertion point")
-        self.assertEqual(self.test_filter._buffer, self.expected_odd_sequence)
-
-    def test_given_new_value_even_seq_then_insertion_point_is_correct(self):
-        self.test_filter._buffer = copy(self.test_even_sequence)
-        insertion_point = self.test_filter.__sorted_insert__(self.new_value)
-        self.assertEqual(insertion_point, 2, "Wrong insertion point")
-        self.assertEqual(self.test_filter._buffer, self.expected_even_sequence)
-
-    def test_given_new_value_at_first_odd_seq_then_insertion_point_is_correct(self):
-        insertion_point = self.test_filter.__sorted_insert__(0)
-        self.assertEqual(insertion_point, 0, "Wrong insertion point")
-        self.assertEqual(self.test_filter._buffer, [0] + self.test_odd_sequence)
-
-    def test_given_new_value_at_first_even_seq_then_insertion_point_is_correct(self):
-        self.test_filter._buffer = copy(self.test_even_sequence)
-        insertion_point = self.test_filter.__sorted_insert__(0)
-        self.assertEqual(insertion_point, 0, "Wrong insertion point")
-        self.assertEqual(self.test_filter._buffer, [0] + self.test_even_sequence)
-
-    def test_given_new_value_at_last_odd_seq_then_insertion_point_is_correct(self):
-        insertion_point = self.test_filter.__sorted_insert__(15)
-        self.assertEqual(insertion_point, 5, "Wrong insertion point")
-        self.assertEqual(self.test_filter._buffer, self.test_odd_sequence + [15])
-
-    def test_given_new_value_at_last_even_seq_then_insertion_point_is_correct(self):
-        self.test_filter._buffer = copy(self.test_even_sequence)
-        insertion_point = self.test_filter.__sorted_insert__(15)
-        self.assertEqual(insertion_point, 6, "Wrong insertion point")
-        self.assertEqual(self.test_filter._buffer, self.test_even_sequence + [15])
-
-    def test_given_invalid_start_then_raise_assertion_error(self):
-        try:
-            self.test_filter.__sorted_insert__(4, 0.5, len(self.test_even_sequence))
-            self.fail("Start float, assertion fail expected")
-        except AssertionError:
-            pass
+        # results are produced from 7 samples on, the insertions below are not tested
+        self.test_filter = OutlierDetector(buffer_samples=14)
+        self.test_filter._buffer = array("d", self.test_odd_sequence)
 
-        try:
-            self.test_filter.__sorted_insert__(
-                4, len(self.test_even_sequence) + 2, len(self.test_even_sequence)
-            )
-            self.fail("Start out of bounds, assertion fail expected")
-        except AssertionError:
-            pass
+    def insert(self, new_value):
+        self.assertFalse(self.test_filter.is_outlier(new_value))
+        return list(self.test_filter._buffer)
 
-        try:
-            self.test_filter.__sorted_insert__(4, -1, len(self.test_even_sequence))
-            self.fail("Start out of bounds, assertion fail expected")
-        except AssertionError:
-            pass
+    def test_given_first_three_vals_then_buffer_is_sorted(self):
+        self.test_filter._buffer = array("d")
+        self.assertEqual(self.insert(2), [2])
+        self.assertEqual(self.insert(0), [0, 2])
+        self.assertEqual(self.insert(1), [0, 1, 2])
 
-    def test_given_invalid_end_then_raise_assertion_error(self):
-        try:
-            self.test_filter.__sorted_insert__(4, 0, 3.5)
-            self.fail("Start float, assertion fail expected")
-        except AssertionError:
-            pass
+    def test_given_new_value_odd_seq_then_buffer_is_sorted(self):
+        self.assertEqual(self.insert(self.new_value), self.expected_odd_sequence)
 
-        try:
-            self.test_filter.__sorted_insert__(4, 0, len(self.test_even_sequence) + 2)
-            self.fail("Start out of bounds, assertion fail expected")
-        except AssertionError:
-            pass
+    def test_given_new_value_even_seq_then_buffer_is_sorted(self):
+        self.test_filter._buffer = array("d", self.test_even_sequence)
+        self.assertEqual(self.insert(self.new_value), self.expected_even_sequence)
 
-        try:
-            self.test_filter.__sorted_insert__(4, 0, -1)
-            self.fail("Start out of bounds, assertion fail expected")
-        except AssertionError:
-            pass
+    def test_given_new_value_at_first_odd_seq_then_buffer_is_sorted(self):
+        self.assertEqual(self.insert(0), [0] + self.test_odd_sequence)
 
-    def test_given_start_greater_than_end_then_raise_assertion_error(self):
-        try:
-            self.test_filter.__sorted_insert__(4, 3, 1)
-            self.fail("Start out of bounds, assertion fail expected")
-        except AssertionError:
-            pass
+    def test_given_new_value_at_first_even_seq_then_buffer_is_sorted(self):
+        self.test_filter._buffer = array("d", self.test_even_sequence)
+        self.assertEqual(self.insert(0), [0] + self.test_even_sequence)
+
+    def test_given_new_value_at_last_odd_seq_then_buffer_is_sorted(self):
+        self.assertEqual(self.insert(15), self.test_odd_sequence + [15])
+
+    def test_given_new_value_at_last_even_seq_then_buffer_is_sorted(self):
+        self.test_filter._buffer = array("d", self.test_even_sequence)
+        self.assertEqual(self.insert(15), self.test_even_sequence + [15])
 
 
 class FunctionalTests(unittest.TestCase):
@@ -312,6 +290,81 @@ class FunctionalTests(unittest.TestCase):
             value, g.pop(), "No outlier expected for flat distribution (filter)"
         )
 
+    def test_given_full_window_then_buffer_holds_last_accepted_samples(self):
+        od = OutlierDetector(buffer_samples=6)
+        accepted = []
+        for i in range(40):
+            sample = (i * 7) % 11 + 0.5 * ((i * 3) % 4)
+            if not od.is_outlier(sample):
+                accepted.append(sample)
+        self.assertEqual(list(od._buffer), sorted(accepted[-6:]))
+
+    def test_given_long_stream_then_running_statistics_match_exact_ones(self):
+        from statistics import mean, stdev
+
+        for resync_interval in (0, 7):
+            od = OutlierDetector(buffer_samples=10, resync_interval=resync_interval)
+            for i in range(500):
+                od.get_outlier_score(1e6 + (i * 7) % 11 + 0.01 * ((i * 3) % 4))
+            mu, sd = od.__mean_stdev__()
+            self.assertAlmostEqual(mu, mean(od._buffer), places=6)
+            self.assertAlmostEqual(sd, stdev(od._buffer), places=6)
+
+    def test_given_outlier_burst_to_recursion_filter_then_stack_does_not_overflow(self):
+        data = iter([1, 2, 3, 1, 2, 2, 3, 1, 2, 2] + [100] * 5000 + [2])
+
+        @filter_outlier(strategy="recursion", registry=FilterRegistry())
+        def pop():
+            return next(data)
+
+        for _ in range(10):
+            pop()
+        self.assertEqual(pop(), 2)
+        self.assertEqual(pop.rejected_samples, 5000)
+
+    def test_given_max_retries_when_exceeded_then_raise(self):
+        from outlier_detector.exceptions import OutlierException
+
+        for strategy in ("recursion", "iteration", "generation"):
+            data = iter([1, 2, 3, 1, 2, 2, 3, 1, 2, 2] + [100] * 4 + [2])
+
+            @filter_outlier(strategy=strategy, registry=FilterRegistry(), max_retries=3)
+            def pop():
+                return next(data)
+
+            if strategy == "generation":
+                generator = pop()
+                pop = generator.__next__
+            for _ in range(10):
+                pop()
+            with self.assertRaises(OutlierException):
+                pop()
+
+    def test_given_negative_max_retries_then_raise(self):
+        self.assertRaises(ValueError, filter_outlier, max_retries=-1)
+
+    def test_given_samples_chunk_then_scores_and_state_match_sequential_calls(self):
+        samples = [(i * 7) % 11 + (40 if i % 17 == 0 else 0) for i in range(100)]
+        sequential = OutlierDetector(buffer_samples=10)
+        expected = [sequential.get_outlier_score(x) for x in samples]
+
+        od = OutlierDetector(buffer_samples=10)
+        scores = od.score_array(samples[:50])
+        with patch("outlier_detector.detectors.np", None):
+            fallback_scores = od.score_array(samples[50:])
+        self.assertEqual(list(scores) + list(fallback_scores), expected)
+        self.assertEqual(list(od._buffer), list(sequential._buffer))
+
+        od = OutlierDetector(buffer_samples=10)
+        outliers = od.is_outlier_array(samples)
+        self.assertEqual(list(outliers), [score == 2 for score in expected])
+        self.assertEqual(list(od._buffer), list(sequential._buffer))
+
+    def test_given_invalid_samples_chunk_then_raise(self):
+        od = OutlierDetector()
+        self.assertRaises(TypeError, od.score_array, [1, 2, "spam"])
+        self.assertRaises(TypeError, od.is_outlier_array, "spam")
+
     def test_given_filter_with_known_id_when_remove_it_is_no_more_available(self):
         class Gen:
             @filter_outlier(distribution_id="test", strategy="exception")
@@ -325,3 +378,1455 @@ class FunctionalTests(unittest.TestCase):
         self.assertIn("test", __alive_filters__)
         destroy_filter("test")
         self.assertNotIn("test", __alive_filters__)
+
+
+class BatchFunctionTests(unittest.TestCase):
+    def setUp(self):
+        self.distributions = [
+            [1, 2, 3, 1, 2, 2, 3, 1],
+            [1, 2, 3, 1, 2, 2, 3, 1],
+            [1, 2, 3, 1, 2, 2, 3, 1],
+            [2, 2, 2, 2, 2, 2, 2, 2],
+            [0.1, 1.1, 4.78, 2.0, 7.2, 5.3, 8.1, 5.4],
+        ]
+        self.new_values = [2, 3.9, -5, 2, -14.5]
+
+    def expected_scores(self):
+        return [
+            get_outlier_score(d, v) for d, v in zip(self.distributions, self.new_values)
+        ]
+
+    @unittest.skipIf(numpy is None, "numpy not available")
+    def test_given_batch_then_results_match_single_calls(self):
+        scores = get_outlier_score_batch(self.distributions, self.new_values)
+        self.assertEqual(list(scores), self.expected_scores())
+        outliers = is_outlier_batch(self.distributions, self.new_values, 99)
+        self.assertEqual(
+            list(outliers),
+            [is_outlier(d, v, 99) for d, v in zip(self.distributions, self.new_values)],
+        )
+
+    @patch("outlier_detector.functions.np", None)
+    def test_given_batch_without_numpy_then_fallback_to_single_calls(self):
+        scores = get_outlier_score_batch(self.distributions, self.new_values)
+        self.assertEqual(scores, self.expected_scores())
+
+    def test_given_numeric_strings_then_batch_raises_as_single_calls(self):
+        distributions = [[str(x) for x in d] for d in self.distributions]
+        new_values = [str(x) for x in self.new_values]
+        with patch("outlier_detector.functions.np", None):
+            self.assertRaises(TypeError, is_outlier_batch, distributions, new_values)
+        if numpy is not None:
+            self.assertRaises(TypeError, is_outlier_batch, distributions, new_values)
+            self.assertRaises(
+                TypeError, get_outlier_score_batch, self.distributions, new_values
+            )
+
+    @unittest.skipIf(numpy is None, "numpy not available")
+    def test_given_malformed_batch_then_raise(self):
+        self.assertRaises(
+            ValueError, is_outlier_batch, self.distributions, self.new_values[:2]
+        )
+        self.assertRaises(
+            ValueError,
+            is_outlier_batch,
+            [d[:3] for d in self.distributions],
+            self.new_values,
+        )
+        self.assertRaises(
+            ValueError,
+            is_outlier_batch,
+            self.distributions,
+            self.new_values,
+            confidence=0.2,
+        )
+
+
+class DetectorBankTests(unittest.TestCase):
+    def setUp(self):
+        self.keys = ["a", "b", "c"] * 30
+        self.samples = [
+            (i * 7) % 11 + 20 * (i % 3) + (15 if i % 23 == 0 else 0)
+            for i in range(len(self.keys))
+        ]
+
+    def test_given_interleaved_streams_then_results_match_single_detectors(self):
+        bank = DetectorBank(buffer_samples=8)
+        detectors = {key: OutlierDetector(buffer_samples=8) for key in "abc"}
+        expected = [
+            detectors[key].get_outlier_score(sample)
+            for key, sample in zip(self.keys, self.samples)
+        ]
+        self.assertEqual(bank.score_many(self.keys, self.samples), expected)
+        self.assertEqual(len(bank), 3)
+        for key in "abc":
+            self.assertEqual(bank.score(key, 5), detectors[key].get_outlier_score(5))
+
+    def test_given_removed_key_then_its_slot_is_reused_empty(self):
+        bank = DetectorBank()
+        bank.score_many(self.keys, self.samples)
+        bank.remove("b")
+        self.assertNotIn("b", bank)
+        bank.score("d", 1)
+        self.assertEqual(len(bank._windows), 3 * bank._width)
+        self.assertEqual(bank._lengths[bank._slots["d"]], 1)
+
+    def test_given_invalid_input_then_raise(self):
+        bank = DetectorBank()
+        self.assertRaises(ValueError, bank.score_many, ["a", "b"], [1])
+        self.assertRaises(TypeError, bank.score, "a", "spam")
+        self.assertRaises(TypeError, bank.score_many, ["a"], ["spam"])
+        self.assertRaises(KeyError, bank.remove, "a")
+        self.assertRaises(ValueError, DetectorBank, buffer_samples=101)
+
+
+class FilterRegistryTests(unittest.TestCase):
+    def test_given_max_size_then_least_recently_used_is_evicted(self):
+        registry = FilterRegistry(max_size=2)
+        first = registry.retrieve("a")
+        registry.retrieve("b")
+        self.assertIs(registry.retrieve("a"), first)
+        registry.retrieve("c")
+        self.assertEqual(list(registry), ["a", "c"])
+        self.assertEqual(
+            registry.stats(), {"size": 2, "hits": 1, "misses": 3, "evictions": 1}
+        )
+
+    @patch("outlier_detector.filters.monotonic")
+    def test_given_ttl_then_unused_detectors_expire(self, clock):
+        clock.return_value = 0
+        registry = FilterRegistry(ttl=10)
+        registry.retrieve("a")
+        registry.retrieve("b")
+        clock.return_value = 8
+        registry.retrieve("a")
+        clock.return_value = 15
+        registry.retrieve("c")
+        self.assertEqual(list(registry), ["a", "c"])
+        self.assertEqual(registry.evictions, 1)
+
+    def test_given_method_filter_when_owner_is_collected_then_detector_is_dropped(self):
+        registry = FilterRegistry()
+
+        class Gen:
+            @filter_outlier(strategy="exception", registry=registry)
+            def pop(self):
+                return 1
+
+        g = Gen()
+        g.pop()
+        self.assertIn(hash(g), registry)
+        del g
+        import gc
+
+        gc.collect()
+        self.assertEqual(len(registry), 0)
+
+    def test_given_registry_to_decorator_then_global_registry_is_untouched(self):
+        from outlier_detector.filters import __alive_filters__, destroy_filter
+
+        registry = FilterRegistry()
+
+        @filter_outlier(distribution_id="local", registry=registry)
+        def pop():
+            return 1
+
+        pop()
+        self.assertIn("local", registry)
+        self.assertNotIn("local", __alive_filters__)
+        destroy_filter("local", registry)
+        self.assertNotIn("local", registry)
+
+    def test_given_method_filter_then_signature_is_inspected_once(self):
+        import inspect
+
+        with patch(
+            "outlier_detector.filters.inspect.getfullargspec",
+            wraps=inspect.getfullargspec,
+        ) as getfullargspec:
+
+            class Gen:
+                @filter_outlier(strategy="iteration", registry=FilterRegistry())
+                def pop(self):
+                    return 1
+
+            g = Gen()
+            for _ in range(10):
+                g.pop()
+        self.assertEqual(getfullargspec.call_count, 1)
+
+    def test_given_invalid_policy_then_raise(self):
+        self.assertRaises(ValueError, FilterRegistry, max_size=0)
+        self.assertRaises(ValueError, FilterRegistry, ttl=-1)
+
+
+class CriticalValuesTests(unittest.TestCase):
+    def test_given_small_windows_then_hard_coded_values_are_kept(self):
+        from outlier_detector import Qvals
+        from outlier_detector.critical_values import critical_values
+
+        for confidence, table in Qvals.items():
+            extended = critical_values(confidence, 100)
+            for n, q in table.items():
+                self.assertEqual(extended[n], q)
+
+    @patch("outlier_detector.critical_values.np", None)
+    def test_given_simulation_then_values_approximate_tables(self):
+        from outlier_detector import Qvals
+        from outlier_detector.critical_values import simulate_critical_values
+
+        tables = simulate_critical_values([0.9, 0.95], max_samples=6, trials=5000)
+        for confidence, table in tables.items():
+            self.assertEqual(list(table), [3, 4, 5, 6])
+            for n, q in table.items():
+                self.assertAlmostEqual(q, Qvals[confidence][n], delta=0.03)
+
+    def test_given_tables_then_critical_values_do_not_grow_with_samples(self):
+        from outlier_detector.critical_values import (
+            _load,
+            _non_increasing,
+            simulate_critical_values,
+        )
+
+        for statistic, tables in _load().items():
+            for confidence, table in tables.items():
+                values = [table[n] for n in sorted(table)]
+                for n, (q, following) in enumerate(zip(values, values[1:])):
+                    self.assertLessEqual(following, q, (statistic, confidence, n))
+        # few trials make noisy estimates, smoothed all the same
+        tables = simulate_critical_values([0.999], max_samples=30, trials=300)
+        values = list(tables[0.999].values())
+        self.assertEqual(values, sorted(values, reverse=True))
+        self.assertEqual(
+            _non_increasing([3, 2, 2.5, 1, 1.3, 1.1]), [3, 2.25, 2.25, 1.15, 1.15, 1.1]
+        )
+
+    def test_given_added_table_then_confidence_is_available(self):
+        from outlier_detector.critical_values import (
+            _load,
+            add_critical_values,
+            statistic_tables,
+        )
+
+        self.addCleanup(statistic_tables.cache_clear)
+        self.addCleanup(_load()["r10"].pop, 0.92, None)
+        self.assertRaises(ValueError, OutlierDetector, confidence=0.92)
+        add_critical_values(0.92, {n: 0.5 for n in range(3, 16)})
+        od = OutlierDetector(confidence=0.92)
+        self.assertEqual(od.q[15], 0.5)
+        self.assertRaises(
+            ValueError, OutlierDetector, confidence=0.92, buffer_samples=20
+        )
+        # a replaced table is seen by the new detectors of a configuration already used
+        add_critical_values(0.92, {n: 0.25 for n in range(3, 16)})
+        self.assertEqual(OutlierDetector(confidence=0.92).q[15], 0.25)
+
+    def test_given_wide_window_then_outliers_are_detected(self):
+        samples = [(i * 7) % 11 for i in range(200)]
+        samples[150] = 40
+        od = OutlierDetector(buffer_samples=80)
+        scores = od.score_array(samples)
+        self.assertEqual(scores[150], 2)
+        self.assertEqual(list(scores).count(2), 1)
+        self.assertTrue(is_outlier(samples[:80], 40))
+
+    def test_given_statistics_then_dixon_ratios_are_correct(self):
+        from outlier_detector.critical_values import STATISTICS, dixon_ratio
+
+        window = [0, 1, 3, 6, 10, 15, 21]
+        expected = {
+            "r10": (1 / 21, 6 / 21),
+            "r11": (1 / 15, 6 / 20),
+            "r21": (3 / 15, 11 / 20),
+            "r22": (3 / 10, 11 / 18),
+        }
+        for statistic, (low, high) in expected.items():
+            gap, trim = STATISTICS[statistic]
+            self.assertAlmostEqual(dixon_ratio(window, 0, gap=gap, trim=trim), low)
+            self.assertAlmostEqual(dixon_ratio(window, 6, gap=gap, trim=trim), high)
+            self.assertEqual(dixon_ratio(window, 3, gap=gap, trim=trim), 0)
+        self.assertEqual(dixon_ratio([1, 1, 1], 0), 0)
+
+    def test_given_auto_statistic_then_tables_follow_window_length(self):
+        from outlier_detector.critical_values import critical_values, statistic_tables
+
+        table, ranks = statistic_tables(0.95, 30, "auto")
+        self.assertEqual(ranks[7], (1, 0))
+        self.assertEqual(ranks[10], (1, 1))
+        self.assertEqual(ranks[13], (2, 1))
+        self.assertEqual(ranks[30], (2, 2))
+        self.assertEqual(table[10], critical_values(0.95, 30, "r11")[10])
+        self.assertEqual(table[30], critical_values(0.95, 30, "r22")[30])
+
+    def test_given_ties_with_extremes_then_detectors_agree_with_functions(self):
+        import random
+
+        rng = random.Random(5)
+        windows = [[0, 0.1, -0.1, 0.2, -0.2, 0.05, -0.05, 0.15, -0.15, 5.0]]
+        # quantized samples, with ties at both ends
+        windows += [[rng.randint(0, 4) * 0.5 for _ in range(10)] for _ in range(50)]
+        for statistic in ("r10", "r11", "r21", "r22"):
+            for window in windows:
+                for new_value in {min(window), max(window), max(window) + 1e-4}:
+                    expected = is_outlier(window, new_value, statistic=statistic)
+                    od = OutlierDetector(buffer_samples=10, statistic=statistic)
+                    od.prime(window)
+                    bank = DetectorBank(buffer_samples=10, statistic=statistic)
+                    bank.prime("key", window)
+                    self.assertEqual(od.is_outlier(new_value), expected)
+                    self.assertEqual(bank.score("key", new_value) == 2, expected)
+        od = OutlierDetector(buffer_samples=10, statistic="r21")
+        od.prime(windows[0])
+        self.assertEqual(od.get_outlier_score(5.0), 2)
+
+    def test_given_unknown_statistic_then_raise(self):
+        self.assertRaises(ValueError, OutlierDetector, statistic="r33")
+        self.assertRaises(ValueError, is_outlier, [1, 2, 3, 4, 5], 9, statistic="r33")
+
+    def test_given_neighbouring_outliers_then_r21_is_not_masked(self):
+        window = [10, 11, 12, 11, 10, 12, 11, 10, 11, 30]
+        self.assertFalse(is_outlier(window, 31))
+        self.assertTrue(is_outlier(window, 31, statistic="r21"))
+        self.assertTrue(is_outlier(window, 31, statistic="auto"))
+
+        od = OutlierDetector(buffer_samples=10, statistic="r21")
+        for sample in window:
+            od.get_outlier_score(sample)
+        self.assertTrue(od.is_outlier(31))
+
+    def test_given_statistic_then_detector_bank_and_functions_agree(self):
+        samples = [((i * 7) % 11) + (25 if i % 37 == 0 else 0) for i in range(300)]
+        for statistic in ("r11", "r22", "auto"):
+            od = OutlierDetector(buffer_samples=20, statistic=statistic)
+            bank = DetectorBank(buffer_samples=20, statistic=statistic)
+            scores = [od.get_outlier_score(s) for s in samples]
+            self.assertEqual([bank.score("k", s) for s in samples], scores)
+            self.assertIn(2, scores)
+
+    @unittest.skipIf(numpy is None, "numpy not available")
+    def test_given_statistic_then_batch_matches_single_calls(self):
+        distributions = [[(i * j) % 13 for i in range(20)] for j in range(1, 9)]
+        new_values = [30, -20, 6, 14, -2, 25, 12, 0]
+        for statistic in ("r10", "r11", "r21", "r22", "auto"):
+            self.assertEqual(
+                list(is_outlier_batch(distributions, new_values, 0.9, statistic)),
+                [
+                    is_outlier(d, v, 0.9, statistic)
+                    for d, v in zip(distributions, new_values)
+                ],
+            )
+
+
+class EngineTests(unittest.TestCase):
+    def setUp(self):
+        import random
+
+        rng = random.Random(3)
+        self.samples = [rng.gauss(0, 1) for _ in range(3000)]
+        self.spikes = list(range(600, 3000, 301))
+        for i in self.spikes:
+            self.samples[i] = 15 if i % 2 else -15
+
+    def test_given_spikes_then_every_method_detects_them(self):
+        for method in ("dixon", "grubbs", "hampel", "ewma"):
+            od = OutlierDetector(method=method, buffer_samples=100, confidence=0.999)
+            scores = od.score_array(self.samples)
+            self.assertEqual([scores[i] for i in self.spikes], [2] * len(self.spikes))
+            self.assertLess(list(scores).count(2), len(self.spikes) + 10)
+
+    def test_given_wide_window_then_only_dixon_rejects_it(self):
+        self.assertRaises(ValueError, OutlierDetector, buffer_samples=1000)
+        for method in ("grubbs", "hampel", "ewma"):
+            od = OutlierDetector(method=method, buffer_samples=1000)
+            self.assertEqual(
+                [od.get_outlier_score(s) for s in self.samples][self.spikes[-1]], 2
+            )
+
+    def test_given_gaussian_noise_then_outliers_do_not_shrink_the_scale(self):
+        import random
+
+        rng = random.Random(9)
+        samples = [rng.gauss(0, 1) for _ in range(20000)]
+        for method in ("grubbs", "hampel", "ewma"):
+            od = OutlierDetector(method=method, buffer_samples=50)
+            scores = list(od.score_array(samples))
+            self.assertLess(scores[10000:].count(2), 1000, method)
+
+    def test_given_clean_gaussian_data_then_false_outliers_are_as_rare_as_dixon(self):
+        import random
+
+        rng = random.Random(4)
+        samples = [rng.gauss(0, 1) for _ in range(20000)]
+        for window in (14, 50):
+            dixon = list(OutlierDetector(buffer_samples=window).score_array(samples))
+            for method in ("grubbs", "hampel", "ewma"):
+                od = OutlierDetector(method=method, buffer_samples=window)
+                scores = list(od.score_array(samples))
+                self.assertLess(scores.count(2), 3 * dixon.count(2) + 20, method)
+                # outliers are beyond the warning band
+                self.assertGreater(scores.count(1), 0.03 * len(samples), method)
+
+    def test_given_quantized_samples_then_engines_do_not_lock_out(self):
+        import random
+
+        rng = random.Random(6)
+        samples = [10 if rng.random() < 0.7 else 11 for _ in range(2000)]
+        od = OutlierDetector(method="hampel", buffer_samples=20)
+        self.assertNotIn(2, list(od.score_array(samples)))
+        self.assertEqual(set(od._engine._buffer), {10, 11})
+
+        from outlier_detector.engines import ENGINES
+
+        # an idle sensor repeating a reading, then waking up
+        samples = [rng.gauss(5, 0.1) for _ in range(200)]
+        for method in ENGINES:
+            od = OutlierDetector(method=method)
+            self.assertNotIn(2, list(od.score_array([5.0] * 10)))
+            scores = list(od.score_array(samples))
+            # a few samples are rejected until the equal readings leave the window
+            self.assertLess(scores.count(2), 10)
+            self.assertLess(scores[od.buffer_samples :].count(2), 3)
+
+    def test_given_grubbs_then_statistic_matches_exact_one(self):
+        from statistics import mean, stdev
+
+        from outlier_detector.critical_values import grubbs_critical_value
+
+        od = OutlierDetector(method="grubbs", buffer_samples=20, resync_interval=7)
+        window = []
+        for sample in self.samples[:500]:
+            expected = False
+            if len(window) >= 10:
+                x = window + [sample]
+                g = abs(sample - mean(x)) / stdev(x)
+                expected = g > grubbs_critical_value(0.95, len(x))
+            self.assertEqual(od.is_outlier(sample), expected)
+            if not expected:
+                window = (window + [sample])[-20:]
+
+    def test_given_hampel_then_median_and_mad_match_exact_ones(self):
+        from statistics import median
+
+        od = OutlierDetector(method="hampel", buffer_samples=15)
+        for sample in [round(s) for s in self.samples[:300]]:
+            od.get_outlier_score(sample)
+            window = od._engine._buffer
+            mid = median(window)
+            mad = median([abs(x - mid) for x in window])
+            self.assertEqual(od._engine.__median_mad__(), (mid, mad))
+
+    def test_given_grubbs_critical_values_then_match_tables(self):
+        from outlier_detector.critical_values import (
+            grubbs_critical_value,
+            normal_critical_value,
+            t_critical_value,
+        )
+
+        tables = {3: 1.1543, 10: 2.2900, 20: 2.7082, 50: 3.1282, 100: 3.3841}
+        for n, g in tables.items():
+            self.assertAlmostEqual(grubbs_critical_value(0.95, n), g, places=4)
+        self.assertAlmostEqual(normal_critical_value(0.95), 1.96, places=2)
+        # t(0.9975, 10) = 3.5814, t(0.9975, 30) = 3.0298
+        self.assertAlmostEqual(t_critical_value(0.95, 10, 10), 3.5814, places=4)
+        self.assertAlmostEqual(t_critical_value(0.95, 10, 30), 3.0298, places=4)
+
+    def test_given_method_then_filters_use_its_engine(self):
+        from outlier_detector.engines import EWMAEngine, HampelEngine
+        from outlier_detector.filters import __alive_filters__
+
+        of = OutlierFilter(method="hampel", confidence=0.999, buffer_samples=200)
+        self.assertIsInstance(of._engine, HampelEngine)
+        filtered = list(of.filter_iter(self.samples[:1000]))
+        self.assertNotIn(15, filtered)
+        self.assertNotIn(-15, filtered)
+        self.assertGreater(len(filtered), 990)
+
+        class Gen:
+            @filter_outlier(distribution_id="ewma", method="ewma")
+            def pop(self):
+                return 1
+
+        self.addCleanup(__alive_filters__.pop, "ewma", None)
+        Gen().pop()
+        self.assertIsInstance(__alive_filters__["ewma"]._engine, EWMAEngine)
+
+    def test_given_invalid_method_then_raise(self):
+        self.assertRaises(ValueError, OutlierDetector, method="iqr")
+        self.assertRaises(ValueError, filter_outlier, method="iqr")
+        self.assertRaises(ValueError, OutlierDetector, method="grubbs", confidence=1)
+        self.assertRaises(ValueError, OutlierDetector, method="ewma", buffer_samples=4)
+
+
+class SnapshotTests(unittest.TestCase):
+    def setUp(self):
+        import random
+
+        rng = random.Random(5)
+        self.samples = [
+            rng.gauss(0, 1) + (10 if rng.random() < 0.05 else 0) for _ in range(600)
+        ]
+
+    def test_given_snapshot_then_restored_detector_scores_as_original(self):
+        configurations = [
+            {},
+            {"statistic": "auto", "buffer_samples": 30, "resync_interval": 7},
+            {"method": "grubbs", "resync_interval": 7},
+            {"method": "hampel", "confidence": 99},
+            {"method": "ewma", "buffer_samples": 50},
+        ]
+        for kwargs in configurations:
+            for cut in (0, 3, 300):
+                od = OutlierDetector(**kwargs)
+                od.score_array(self.samples[:cut])
+                restored = OutlierDetector.from_bytes(od.to_bytes())
+                self.assertEqual(
+                    list(restored.score_array(self.samples[cut:])),
+                    list(od.score_array(self.samples[cut:])),
+                )
+                self.assertEqual(restored.to_bytes(), od.to_bytes())
+
+    def test_given_invalid_snapshot_then_raise(self):
+        data = OutlierDetector().to_bytes()
+        self.assertRaises(ValueError, OutlierDetector.from_bytes, data[:-1])
+        self.assertRaises(ValueError, OutlierDetector.from_bytes, b"XX" + data[2:])
+        self.assertRaises(ValueError, OutlierDetector.from_bytes, b"")
+
+    def test_given_registry_dump_then_load_restores_detectors(self):
+        import os
+        import tempfile
+        from uuid import uuid4
+
+        class Gen:
+            pass
+
+        owner = Gen()
+        registry = FilterRegistry()
+        keys = ["stream", 42, b"raw", uuid4()]
+        for key in keys:
+            registry.retrieve(key, buffer_samples=10).score_array(self.samples[:20])
+        registry.retrieve(hash(owner), owner)
+        registry[(1, 2)] = OutlierDetector()
+
+        path = os.path.join(tempfile.mkdtemp(), "detectors.bin")
+        self.addCleanup(os.remove, path)
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(registry.dump(path), len(keys))
+
+        restored = FilterRegistry()
+        self.assertEqual(restored.load(path), len(keys))
+        self.assertEqual(list(restored), keys)
+        for key in keys:
+            self.assertEqual(restored[key].to_bytes(), registry[key].to_bytes())
+
+        with open(path, "r+b") as fh:
+            fh.truncate(os.path.getsize(path) - 1)
+        self.assertRaises(ValueError, FilterRegistry().load, path)
+
+    def test_given_registry_dump_then_load_restores_bool_keys_and_thread_safety(self):
+        import gc
+        import os
+        import tempfile
+
+        registry = FilterRegistry()
+        registry[True] = OutlierDetector(thread_safe=True)
+        registry[False] = OutlierDetector()
+        registry[7] = OutlierDetector()
+
+        path = os.path.join(tempfile.mkdtemp(), "detectors.bin")
+        self.addCleanup(os.remove, path)
+        self.assertEqual(registry.dump(path), 3)
+
+        restored = FilterRegistry()
+        self.assertEqual(restored.load(path), 3)
+        self.assertEqual([type(key) for key in restored], [bool, bool, int])
+        self.assertEqual(list(restored), [True, False, 7])
+        self.assertIsNotNone(restored[True]._lock)
+        self.assertIsNone(restored[False]._lock)
+        self.assertTrue(gc.isenabled())
+
+
+@unittest.skipIf(shared_memory is None, "shared memory not available")
+class SharedDetectorBankTests(unittest.TestCase):
+    def setUp(self):
+        import random
+
+        from outlier_detector.shared import SharedDetectorBank
+
+        rng = random.Random(7)
+        self.samples = [rng.gauss(0, 1) for _ in range(300)]
+        self.bank = SharedDetectorBank(100, buffer_samples=20, locks=4)
+        self.addCleanup(self.bank.unlink)
+        self.addCleanup(self.bank.close)
+
+    def run_processes(self, keys_per_process):
+        import multiprocessing
+
+        processes = [
+            multiprocessing.Process(
+                target=score_in_shared_process, args=(self.bank, keys, self.samples)
+            )
+            for keys in keys_per_process
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+    def test_given_processes_then_windows_match_a_local_bank(self):
+        keys_per_process = [["a", "b"], [1, 2], [b"c", "d"]]
+        self.run_processes(keys_per_process)
+
+        bank = DetectorBank(buffer_samples=20)
+        for keys in keys_per_process:
+            score_in_process(bank, keys, self.samples)
+        self.assertEqual(len(self.bank), 6)
+        for key in ("a", 2, b"c"):
+            self.assertEqual(
+                self.bank.score_many([key] * 50, self.samples[:50]),
+                bank.score_many([key] * 50, self.samples[:50]),
+            )
+
+    def test_given_processes_on_same_key_then_window_is_consistent(self):
+        from statistics import mean, stdev
+
+        from outlier_detector.shared import _digest
+
+        self.run_processes([["hot"]] * 3)
+        slot = self.bank.__find__(_digest("hot"))
+        start = slot * self.bank._width
+        window = self.bank._windows[start : start + self.bank._lengths[slot]].tolist()
+        self.assertEqual(window, sorted(window))
+        self.assertEqual(len(window), 20)
+        mu, sd = self.bank.__mean_stdev__(slot, start, start + 20)
+        self.assertAlmostEqual(mu, mean(window))
+        self.assertAlmostEqual(sd, stdev(window))
+
+    def test_given_removed_key_then_slot_is_reused(self):
+        self.bank.score("a", 1.0)
+        self.bank.remove("a")
+        self.assertNotIn("a", self.bank)
+        self.assertEqual(len(self.bank), 0)
+        self.assertRaises(KeyError, self.bank.remove, "a")
+        self.assertEqual(self.bank.score("a", 1.0), 0)
+        self.assertEqual(len(self.bank), 1)
+
+    def test_given_full_bank_or_invalid_key_then_raise(self):
+        from outlier_detector.shared import SharedDetectorBank
+
+        bank = SharedDetectorBank(2)
+        self.addCleanup(bank.unlink)
+        self.addCleanup(bank.close)
+        bank.score("a", 1.0)
+        bank.score("b", 1.0)
+        self.assertRaises(RuntimeError, bank.score, "c", 1.0)
+        self.assertRaises(TypeError, bank.score, (1, 2), 1.0)
+        self.assertRaises(ValueError, SharedDetectorBank, 0)
+        self.assertRaises(ValueError, SharedDetectorBank, 2, key_size=0)
+        bank.remove("b")
+        self.assertRaises(ValueError, bank.score, "x" * 64, 1.0)
+
+    def test_given_bank_then_views_are_laid_out_back_to_back(self):
+        offset = sum(view.nbytes for view in self.bank.__views__())
+        self.assertEqual(len(self.bank._keys), self.bank.capacity * self.bank.key_size)
+        self.assertEqual(offset, 100 * (8 * (8 + self.bank._width) + 64))
+        self.assertLessEqual(offset, self.bank._memory.size)
+
+    def test_given_processes_then_keys_are_listed(self):
+        from uuid import uuid4
+
+        uuid = uuid4()
+        self.run_processes([["a", True], [1, b"c"], [uuid]])
+        self.assertEqual(
+            sorted(map(repr, self.bank.keys())),
+            sorted(map(repr, ["a", True, 1, b"c", uuid])),
+        )
+        self.bank.remove(1)
+        self.assertNotIn("1", map(repr, self.bank.keys()))
+        self.assertEqual(len(self.bank.keys()), len(self.bank))
+
+
+class ThreadSafetyTests(unittest.TestCase):
+    def setUp(self):
+        import random
+        import sys
+
+        rng = random.Random(11)
+        self.samples = [rng.gauss(0, 1) for _ in range(2000)]
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+    def run_threads(self, work, threads=8):
+        import threading
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def test_given_shared_detector_then_window_stays_consistent(self):
+        from statistics import mean, stdev
+
+        for method in ("dixon", "hampel"):
+            od = OutlierDetector(method=method, buffer_samples=20, thread_safe=True)
+            self.run_threads(lambda: od.score_array(self.samples))
+            window = od._buffer if method == "dixon" else od._engine._buffer
+            ring = od._ring if method == "dixon" else od._engine._ring
+            self.assertEqual(list(window), sorted(ring))
+            if method == "dixon":
+                mu, sd = od.__mean_stdev__()
+                self.assertAlmostEqual(mu, mean(window))
+                self.assertAlmostEqual(sd, stdev(window))
+
+    def test_given_concurrent_retrievals_then_detector_is_created_once(self):
+        registry = FilterRegistry(thread_safe=True)
+        detectors = []
+
+        def work():
+            for key in range(50):
+                detectors.append(registry.retrieve(key, thread_safe=True))
+
+        self.run_threads(work)
+        self.assertEqual(registry.misses, 50)
+        self.assertEqual(len(set(map(id, detectors))), 50)
+
+    def test_given_thread_safe_registry_with_policy_then_it_is_enforced(self):
+        registry = FilterRegistry(max_size=10, thread_safe=True)
+        self.run_threads(lambda: [registry.retrieve(key % 30) for key in range(300)])
+        self.assertEqual(len(registry), 10)
+        registry.configure(max_size=5)
+        self.assertEqual(len(registry), 5)
+        self.assertIsNotNone(registry._lock)
+        registry.configure(max_size=5, thread_safe=False)
+        self.assertIsNone(registry._lock)
+
+
+class ReplayTests(unittest.TestCase):
+    def setUp(self):
+        import random
+
+        rng = random.Random(11)
+        keys = [rng.choice(["a", "b", 3, 4, "e"]) for _ in range(1000)]
+        samples = [
+            rng.gauss(0, 1) if rng.random() > 0.05 else rng.gauss(0, 1) + 30
+            for _ in keys
+        ]
+        self.dataset = {"key": keys, "value": samples}
+
+    def expected(self, **detector_kwargs):
+        detectors = {}
+        return [
+            detectors.setdefault(
+                key, OutlierDetector(**detector_kwargs)
+            ).get_outlier_score(sample)
+            for key, sample in zip(self.dataset["key"], self.dataset["value"])
+        ]
+
+    def test_given_in_process_replay_then_scores_match_detectors_per_key(self):
+        from outlier_detector.replay import replay
+
+        scores = replay(self.dataset, "key", "value", workers=1, buffer_samples=20)
+        self.assertEqual(list(scores), self.expected(buffer_samples=20))
+        self.assertIn(2, list(scores))
+
+    @unittest.skipIf(shared_memory is None, "shared memory not available")
+    def test_given_worker_processes_then_scores_are_in_dataset_order(self):
+        from outlier_detector.replay import replay
+
+        scores = replay(
+            self.dataset,
+            "key",
+            "value",
+            workers=2,
+            chunk_samples=150,
+            method="hampel",
+            buffer_samples=30,
+        )
+        self.assertEqual(
+            list(scores), self.expected(method="hampel", buffer_samples=30)
+        )
+
+    def test_given_invalid_arguments_then_raises(self):
+        from outlier_detector.replay import replay
+
+        self.assertRaises(ValueError, replay, self.dataset, "key", "value", workers=0)
+        self.assertRaises(
+            ValueError, replay, self.dataset, "key", "value", chunk_samples=0
+        )
+        self.assertRaises(ValueError, replay, self.dataset, "key", "value", method="x")
+        self.dataset["value"].pop()
+        self.assertRaises(ValueError, replay, self.dataset, "key", "value", workers=1)
+        self.dataset["value"][0] = "a"
+        self.dataset["key"].pop()
+        self.assertRaises(TypeError, replay, self.dataset, "key", "value", workers=1)
+        self.assertEqual(len(replay({"k": [], "v": []}, "k", "v")), 0)
+
+
+class OfflineTests(unittest.TestCase):
+    def setUp(self):
+        import random
+        import shutil
+        import tempfile
+
+        rng = random.Random(5)
+        self.samples = [
+            rng.gauss(0, 1) if i % 37 else rng.gauss(0, 1) + 25 for i in range(3000)
+        ]
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def path(self, name):
+        import os
+
+        return os.path.join(self.folder, name)
+
+    def test_given_raw_file_then_scores_match_detector(self):
+        from array import array
+
+        from outlier_detector.offline import score_file
+
+        with open(self.path("samples.raw"), "wb") as fh:
+            array("d", self.samples).tofile(fh)
+        scored = score_file(
+            self.path("samples.raw"),
+            self.path("scores.raw"),
+            buffer_samples=20,
+            chunk_samples=512,
+            confidence=0.99,
+        )
+        self.assertEqual(scored, len(self.samples))
+        scores = array("b")
+        with open(self.path("scores.raw"), "rb") as fh:
+            scores.fromfile(fh, len(self.samples))
+        expected = OutlierDetector(buffer_samples=20, confidence=0.99).score_array(
+            self.samples
+        )
+        self.assertEqual(list(scores), list(expected))
+        self.assertIn(2, list(scores))
+
+    @unittest.skipIf(numpy is None, "numpy not available")
+    def test_given_npy_file_then_npy_scores_are_written(self):
+        from outlier_detector.offline import score_file
+
+        for dtype in (numpy.float64, numpy.float32):
+            samples = numpy.array(self.samples, dtype=dtype)
+            numpy.save(self.path("samples.npy"), samples)
+            score_file(
+                self.path("samples.npy"), self.path("scores.npy"), buffer_samples=30
+            )
+            scores = numpy.load(self.path("scores.npy"))
+            self.assertEqual(scores.dtype, numpy.int8)
+            numpy.testing.assert_array_equal(
+                scores, OutlierDetector(buffer_samples=30).score_array(samples)
+            )
+
+        numpy.save(self.path("empty.npy"), numpy.zeros(0))
+        self.assertEqual(score_file(self.path("empty.npy"), self.path("scores.npy")), 0)
+        self.assertEqual(numpy.load(self.path("scores.npy")).shape, (0,))
+
+    def test_given_invalid_file_then_raises(self):
+        import struct
+
+        from outlier_detector.offline import score_file
+
+        with open(self.path("samples.raw"), "wb") as fh:
+            fh.write(b"\0" * 12)
+        with open(self.path("samples.npy"), "wb") as fh:
+            fh.write(b"\x93NUMPY\x01\x00\x10\x00{'descr': '<i8'}")
+        header = "{'descr': '<f8', 'shape': (1,)}"
+        with open(self.path("unordered.npy"), "wb") as fh:
+            fh.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)))
+            fh.write(header.encode("latin1") + b"\0" * 8)
+        for name in ("samples.raw", "samples.npy", "unordered.npy"):
+            self.assertRaises(
+                ValueError, score_file, self.path(name), self.path("scores.raw")
+            )
+        self.assertRaises(
+            ValueError,
+            score_file,
+            self.path("samples.raw"),
+            self.path("scores.raw"),
+            chunk_samples=0,
+        )
+
+
+class CommandLineTests(unittest.TestCase):
+    def run_command(self, argv, stdin=b""):
+        import io
+
+        stdout = io.TextIOWrapper(io.BytesIO())
+        stderr = io.StringIO()
+        with patch("sys.stdin", io.TextIOWrapper(io.BytesIO(stdin))), patch(
+            "sys.stdout", stdout
+        ), patch("sys.stderr", stderr):
+            from outlier_detector.cli import main
+
+            status = main(argv)
+        return status, stdout.buffer.getvalue(), stderr.getvalue()
+
+    def test_given_numbers_then_lines_are_annotated(self):
+        samples = [1.0, 1.2, 0.9, 1.1, 1.05, 0.95, 1.15, 30.0, 1.0]
+        stdin = "".join("{}\n".format(s) for s in samples).encode() + b"\n"
+        status, out, _ = self.run_command(["-b", "8", "-c", "0.99"], stdin)
+        od = OutlierDetector(buffer_samples=8, confidence=0.99)
+        expected = "".join(
+            "{},{}\n".format(s, od.get_outlier_score(s)) for s in samples
+        )
+        self.assertEqual(status, 0)
+        self.assertEqual(out.decode(), expected)
+        self.assertIn(b"30.0,2\n", out)
+
+    def test_given_pipe_then_lines_are_written_as_they_arrive(self):
+        import io
+        import os
+        import queue
+        import threading
+
+        from outlier_detector.cli import _parser, _Scorer
+
+        class Output(io.BytesIO):
+            def __init__(self):
+                super().__init__()
+                self.flushed = queue.Queue()
+
+            def flush(self):
+                self.flushed.put(self.getvalue())
+
+        read, write = os.pipe()
+        out = Output()
+        scorer = _Scorer(_parser().parse_args(["--header"]), {}, out)
+        with open(read, "rb") as source:
+            consumer = threading.Thread(target=scorer.consume, args=(source, "pipe"))
+            consumer.start()
+            try:
+                os.write(write, b"value\n1.0\n1.")
+                self.assertEqual(out.flushed.get(timeout=5), b"value,score\n1.0,0\n")
+                os.write(write, b"5\n")
+                self.assertEqual(
+                    out.flushed.get(timeout=5), b"value,score\n1.0,0\n1.5,0\n"
+                )
+            finally:
+                os.close(write)
+                consumer.join()
+
+    def test_given_keyed_csv_then_each_key_has_its_window(self):
+        import os
+        import tempfile
+
+        rows = [("a", 1.0), ("b", 100.0), ("a", 1.1), ("b", 101.0)] * 4
+        rows += [("a", 100.0), ("b", 1.0), ("a", 0.9)]
+        content = "value;host\n" + "".join("{};{}\n".format(v, k) for k, v in rows)
+        path = os.path.join(tempfile.mkdtemp(), "samples.csv")
+        self.addCleanup(os.remove, path)
+        with open(path, "w") as fh:
+            fh.write(content)
+
+        status, out, _ = self.run_command(
+            [path, "-d", ";", "--header", "-k", "host", "-v", "value", "-b", "6"]
+        )
+        detectors = {
+            "a": OutlierDetector(buffer_samples=6),
+            "b": OutlierDetector(buffer_samples=6),
+        }
+        expected = ["value;host;score"] + [
+            "{};{};{}".format(v, k, detectors[k].get_outlier_score(v)) for k, v in rows
+        ]
+        self.assertEqual(status, 0)
+        self.assertEqual(out.decode().splitlines(), expected)
+        self.assertEqual(out.decode().splitlines()[-3:-1], ["100.0;a;2", "1.0;b;2"])
+
+        status, out, _ = self.run_command(
+            [path, "-d", ";", "--header", "-k", "1", "-v", "0", "-b", "6", "-f"]
+        )
+        self.assertEqual(status, 0)
+        self.assertEqual(
+            out.decode().splitlines(),
+            ["value;host"] + ["{};{}".format(v, k) for k, v in rows[:-3] + rows[-1:]],
+        )
+
+    def test_given_invalid_input_then_exits_with_error(self):
+        status, out, err = self.run_command(["-k", "0"], b"a,1\nb,x\n")
+        self.assertEqual(status, 1)
+        self.assertIn("not a number 'x'", err)
+        status, _, err = self.run_command(["-k", "0", "-v", "2"], b"a,1\n")
+        self.assertEqual(status, 1)
+        self.assertIn("missing columns", err)
+        status, _, err = self.run_command(["-k", "host"], b"a,1\n")
+        self.assertEqual(status, 1)
+        self.assertIn("no header", err)
+        with patch("sys.stderr"):
+            self.assertRaises(SystemExit, self.run_command, ["-c", "0.42"])
+
+
+class MetricsTests(unittest.TestCase):
+    def setUp(self):
+        import random
+
+        rng = random.Random(13)
+        self.samples = [rng.gauss(0, 1) if i % 25 else 40.0 for i in range(500)]
+
+    def test_given_metrics_then_detector_counts_outcomes_and_calls_back(self):
+        from outlier_detector.metrics import DetectorMetrics
+
+        outliers, warnings = [], []
+        metrics = DetectorMetrics(
+            on_outlier=outliers.append, on_warning=warnings.append
+        )
+        od = OutlierDetector(metrics=metrics, thread_safe=True)
+        scores = list(od.score_array(self.samples))
+        self.assertIs(od.metrics, metrics)
+        self.assertEqual(
+            metrics.snapshot()["latency"]["buckets"][float("inf")], len(scores)
+        )
+        self.assertEqual(metrics.samples, len(scores))
+        self.assertEqual(metrics.valid, scores.count(0))
+        self.assertEqual(len(warnings), scores.count(1))
+        self.assertEqual(
+            outliers, [s for s, score in zip(self.samples, scores) if score == 2]
+        )
+        self.assertGreater(metrics.outliers, 0)
+
+        od.is_outlier(40.0)
+        self.assertEqual(metrics.outliers, scores.count(2) + 1)
+        self.assertIsNone(OutlierDetector().metrics)
+
+    def test_given_metrics_then_copies_count_their_own_samples(self):
+        import copy
+        import pickle
+
+        od = OutlierDetector(metrics=True)
+        od.score_array(self.samples[:50])
+        for restored in (copy.deepcopy(od), pickle.loads(pickle.dumps(od))):
+            self.assertIsNot(restored.metrics, od.metrics)
+            self.assertEqual(restored.metrics.snapshot(), od.metrics.snapshot())
+            restored.score_array(self.samples[50:])
+            self.assertEqual(restored.metrics.samples, len(self.samples))
+            self.assertEqual(od.metrics.samples, 50)
+
+    def test_given_metrics_then_filters_record_retries(self):
+        from outlier_detector.exceptions import OutlierException
+
+        registry = FilterRegistry()
+        for strategy in ("recursion", "iteration", "generation"):
+            source = iter(self.samples)
+
+            @filter_outlier(strategy=strategy, registry=registry, metrics=True)
+            def pop():
+                return next(source)
+
+            if strategy == "generation":
+                samples = pop()
+                pop_sample = samples.__next__
+            else:
+                pop_sample = pop
+            for _ in range(400):
+                pop_sample()
+            snapshot = pop.metrics.snapshot()
+            self.assertEqual(snapshot["calls"], 400, strategy)
+            self.assertEqual(snapshot["rejected"], pop.rejected_samples)
+            self.assertGreater(pop.rejected_samples, 10)
+            self.assertEqual(snapshot["retries"]["sum"], pop.rejected_samples)
+            self.assertGreaterEqual(
+                snapshot["retries"]["buckets"][0], 400 - pop.rejected_samples
+            )
+            self.assertLess(snapshot["retries"]["buckets"][0], 400)
+
+        @filter_outlier(strategy="exception", registry=registry, metrics=True)
+        def pop():
+            return 40.0 if pop.metrics.calls == 20 else 1.0 + pop.metrics.calls % 3 / 10
+
+        for _ in range(20):
+            pop()
+        self.assertRaises(OutlierException, pop)
+        self.assertEqual((pop.metrics.calls, pop.metrics.rejected), (21, 1))
+
+    def test_given_instrumented_objects_then_prometheus_text_is_written(self):
+        import os
+        import tempfile
+
+        from outlier_detector.metrics import prometheus_text, snapshot, write_prometheus
+
+        od = OutlierDetector(metrics=True)
+        od.score_array(self.samples)
+        registry = FilterRegistry()
+        registry.retrieve("a")
+        registry.retrieve("a")
+        sources = {"stream": od, 'quoted "name"': registry}
+
+        text = prometheus_text(sources)
+        self.assertIn(
+            'outlier_detector_samples_total{{detector="stream",outcome="outlier"}} {}\n'.format(
+                od.metrics.outliers
+            ),
+            text,
+        )
+        self.assertIn(
+            'outlier_detector_latency_seconds_bucket{detector="stream",le="+Inf"} 500\n',
+            text,
+        )
+        self.assertIn(
+            'outlier_registry_hits_total{registry="quoted \\"name\\""} 1\n', text
+        )
+        self.assertEqual(
+            text.count("# TYPE outlier_detector_latency_seconds histogram"), 1
+        )
+        self.assertEqual(snapshot(sources)['quoted "name"'], registry.stats())
+
+        path = os.path.join(tempfile.mkdtemp(), "outliers.prom")
+        self.addCleanup(os.remove, path)
+        write_prometheus(path, sources)
+        with open(path) as fh:
+            self.assertEqual(fh.read(), prometheus_text(sources))
+        self.assertEqual(os.listdir(os.path.dirname(path)), ["outliers.prom"])
+
+        self.assertRaises(ValueError, prometheus_text, {"plain": OutlierDetector()})
+
+
+class MemoryFootprintTests(unittest.TestCase):
+    def test_given_any_detector_then_it_has_no_instance_dict(self):
+        detectors = [OutlierDetector(method=method) for method in ("dixon", "hampel")]
+        detectors.append(OutlierFilter())
+        for od in detectors:
+            self.assertFalse(hasattr(od, "__dict__"))
+        self.assertFalse(hasattr(detectors[1]._engine, "__dict__"))
+        self.assertIsInstance(detectors[0]._buffer, array)
+
+    def test_given_full_windows_then_footprint_grows_by_unboxed_samples(self):
+        for method in ("dixon", "grubbs", "hampel", "ewma"):
+            footprints = []
+            for buffer_samples in (50, 100):
+                od = OutlierDetector(buffer_samples=buffer_samples, method=method)
+                od.score_array([(i * 7) % 11 for i in range(2 * buffer_samples)])
+                footprints.append(od.memory_footprint())
+            growth = (footprints[1] - footprints[0]) / 50
+            windows = {"dixon": 2, "hampel": 2, "grubbs": 1, "ewma": 0}[method]
+            # 8 bytes per sample in each window, give or take the arrays over-allocation
+            self.assertGreaterEqual(growth, 6 * windows)
+            self.assertLessEqual(growth, 10 * windows)
+
+
+class PrimeTests(unittest.TestCase):
+    def setUp(self):
+        # ties leave no gap at the extremes, so feeding them sample by sample rejects none
+        self.history = [i % 5 for i in range(40)]
+        self.stream = [(i * 7) % 5 + (30 if i % 9 == 0 else 0) for i in range(60)]
+
+    def test_given_history_then_primed_detector_scores_as_fed_one(self):
+        for method in ("dixon", "grubbs", "hampel", "ewma"):
+            for cut in (3, 40):
+                fed = OutlierDetector(buffer_samples=10, method=method)
+                self.assertFalse(any(fed.is_outlier_array(self.history[:cut])))
+                od = OutlierDetector(buffer_samples=10, method=method)
+                self.assertEqual(od.prime(self.history[:cut]), cut)
+                self.assertEqual(
+                    list(od.score_array(self.stream)),
+                    list(fed.score_array(self.stream)),
+                )
+
+    def test_given_primed_detector_then_first_outlier_is_detected(self):
+        od = OutlierDetector(metrics=True, thread_safe=True)
+        self.assertEqual(od.prime([1, 2, 3, 1, 2, 2, 3, 1, 2, 2] * 3), 30)
+        self.assertEqual(od.get_outlier_score(100), 2)
+        self.assertEqual(od.metrics.samples, 1)
+        self.assertEqual(OutlierDetector().get_outlier_score(100), 0)
+
+    def test_given_validation_then_outliers_are_not_stored(self):
+        od = OutlierDetector(buffer_samples=12)
+        history = [1, 2, 3, 1, 2, 2, 3, 1, 2, 2, 100, 2]
+        self.assertEqual(od.prime(history, validate=True), 11)
+        self.assertNotIn(100, od._buffer)
+        self.assertRaises(TypeError, od.prime, [1, "spam"])
+
+    def test_given_bank_then_primed_keys_score_as_primed_detectors(self):
+        bank = DetectorBank(buffer_samples=10)
+        od = OutlierDetector(buffer_samples=10)
+        bank.score("a", 4)
+        od.get_outlier_score(4)
+        for chunk in (self.history[:3], self.history):
+            self.assertEqual(bank.prime("a", chunk), len(chunk))
+            od.prime(chunk)
+            self.assertEqual(
+                bank.score_many(["a"] * 30, self.stream[:30]),
+                list(od.score_array(self.stream[:30])),
+            )
+        self.assertEqual(bank.prime("b", [1, 2, 3, 100, 2], validate=True), 5)
+
+    def test_given_sibling_keys_then_pooled_window_seeds_new_keys(self):
+        from statistics import mean, stdev
+
+        bank = DetectorBank(buffer_samples=15)
+        self.assertEqual(bank.pooled_window(), [])
+        for key, level in (("a", 0), ("b", 1)):
+            bank.prime(key, [level + (i * 7) % 11 / 10 for i in range(15)])
+
+        window = bank.pooled_window()
+        siblings = [
+            bank._windows[bank._slots[key] * bank._width + i]
+            for key in "ab"
+            for i in range(15)
+        ]
+        self.assertEqual(window, sorted(window))
+        self.assertEqual(len(window), 15)
+        self.assertAlmostEqual(mean(window), mean(siblings))
+        self.assertLess(abs(stdev(window) / stdev(siblings) - 1), 0.1)
+        self.assertEqual(len(bank.pooled_window(["a"])), 15)
+        self.assertRaises(KeyError, bank.pooled_window, ["z"])
+
+        bank.prime("c", window)
+        self.assertEqual(bank.score("c", 1.2), 0)
+        self.assertEqual(bank.score("c", 30), 2)
+
+    @unittest.skipIf(shared_memory is None, "shared memory not available")
+    def test_given_shared_bank_then_primed_keys_score_as_local_bank(self):
+        from outlier_detector.shared import SharedDetectorBank
+
+        with SharedDetectorBank(10, buffer_samples=10) as shared:
+            bank = DetectorBank(buffer_samples=10)
+            for target in (shared, bank):
+                target.prime("a", self.history)
+                target.prime("b", target.pooled_window())
+            self.assertEqual(shared.pooled_window(["a", "b"]), bank.pooled_window())
+            self.assertEqual(
+                shared.score_many(["b"] * 30, self.stream[:30]),
+                bank.score_many(["b"] * 30, self.stream[:30]),
+            )
+
+
+class TimeWindowTests(unittest.TestCase):
+    def setUp(self):
+        import random
+
+        rng = random.Random(11)
+        self.samples = [
+            rng.gauss(0, 1) + (10 if rng.random() < 0.05 else 0) for _ in range(600)
+        ]
+
+    def test_given_long_time_window_then_samples_cap_evicts_as_count_window(self):
+        od = OutlierDetector(window=1e9, buffer_samples=10)
+        expected = OutlierDetector(buffer_samples=10).score_array(self.samples)
+        scores = od.score_array(self.samples, timestamps=range(len(self.samples)))
+        self.assertEqual(list(scores), list(expected))
+
+    def test_given_irregular_rate_then_window_holds_recent_samples(self):
+        import random
+        from statistics import mean, stdev
+
+        rng = random.Random(3)
+        od = OutlierDetector(window=20, buffer_samples=30, resync_interval=0)
+        accepted = []
+        now = 0.0
+        for sample in self.samples:
+            # bursts of close samples and gaps evicting part or all of the window
+            now += rng.choice((0.1, 0.5, 1, 4, 15, 30))
+            if od.get_outlier_score(sample, now) != 2:
+                accepted.append((now, sample))
+            expected = [x for t, x in accepted[-30:] if t > now - 20]
+            self.assertEqual(list(od._buffer), sorted(expected))
+            if len(expected) > 2 and od._buffer[0] != od._buffer[-1]:
+                mu, sd = od.__mean_stdev__()
+                self.assertAlmostEqual(mu, mean(expected), places=9)
+                self.assertAlmostEqual(sd, stdev(expected), places=9)
+
+    def test_given_datetimes_then_window_evicts_by_age(self):
+        from datetime import datetime, timedelta
+
+        start = datetime(2020, 1, 1)
+        od = OutlierDetector(
+            window=timedelta(minutes=1), thread_safe=True, metrics=True
+        )
+        self.assertEqual(od.window, 60)
+        for i in range(10):
+            od.is_outlier(i % 3, start + timedelta(seconds=i))
+        self.assertTrue(od.is_outlier(100, start + timedelta(seconds=30)))
+        self.assertFalse(od.is_outlier(100, start + timedelta(minutes=2)))
+        self.assertEqual(list(od._buffer), [100])
+        self.assertEqual(od.metrics.samples, 12)
+
+    def test_given_timed_detector_then_snapshot_and_prime_restore_window(self):
+        od = OutlierDetector(window=30, buffer_samples=20)
+        od.score_array(self.samples[:100], timestamps=range(100))
+        restored = OutlierDetector.from_bytes(od.to_bytes())
+        self.assertEqual(restored.window, 30)
+        stream = self.samples[100:]
+        timestamps = [100 + i / 2 for i in range(len(stream))]
+        expected = list(od.score_array(stream, timestamps))
+        self.assertEqual(list(restored.score_array(stream, timestamps)), expected)
+
+        primed = OutlierDetector(window=30, buffer_samples=20)
+        self.assertEqual(primed.prime(self.samples[:100], timestamps=range(100)), 100)
+        self.assertEqual(list(primed._buffer), sorted(self.samples[80:100]))
+        self.assertRaises(ValueError, primed.prime, [1])
+        primed = OutlierDetector(window=5, buffer_samples=20)
+        primed.prime(range(30), timestamps=range(30))
+        self.assertEqual(list(primed._buffer), [25, 26, 27, 28, 29])
+        self.assertRaises(ValueError, primed.prime, [1, 2], timestamps=[101, 100])
+
+    @unittest.skipIf(numpy is None, "numpy not available")
+    def test_given_numpy_datetimes_then_scores_match_seconds(self):
+        timestamps = numpy.arange(100).astype("datetime64[s]")
+        od = OutlierDetector(window=10)
+        expected = OutlierDetector(window=10).score_array(
+            self.samples[:100], range(100)
+        )
+        scores = od.score_array(numpy.array(self.samples[:100]), timestamps)
+        self.assertEqual(list(scores), list(expected))
+
+    def test_given_invalid_time_window_then_raise(self):
+        self.assertRaises(ValueError, OutlierDetector, window=0)
+        self.assertRaises(ValueError, OutlierDetector, window=10, method="grubbs")
+        self.assertRaises(TypeError, OutlierDetector, window="spam")
+        self.assertRaises(ValueError, OutlierDetector().is_outlier, 1, 10)
+        self.assertRaises(ValueError, OutlierDetector().score_array, [1], [10])
+        od = OutlierDetector(window=10)
+        od.is_outlier(1, 10)
+        self.assertRaises(ValueError, od.get_outlier_score, 1, 9)
+        self.assertRaises(ValueError, od.score_array, [1, 2], [11])
+
+
+class DetrendTests(unittest.TestCase):
+    def setUp(self):
+        import random
+
+        rng = random.Random(3)
+        self.samples = [2 * i + rng.gauss(0, 1) for i in range(400)]
+        self.dips = (100, 200, 300)
+        for i in self.dips:
+            # within the range of a raw window of the rising series
+            self.samples[i] -= 10
+
+    def test_given_linear_trend_then_residual_outliers_are_found(self):
+        for method in ("dixon", "grubbs"):
+            raw = OutlierDetector(buffer_samples=20, method=method)
+            self.assertNotIn(2, list(raw.score_array(self.samples)))
+            od = OutlierDetector(buffer_samples=20, method=method, detrend=True)
+            scores = list(od.score_array(self.samples))
+            self.assertEqual(
+                [i for i, s in enumerate(scores) if s == 2], list(self.dips)
+            )
+
+    def test_given_rejected_samples_then_line_does_not_lock_out(self):
+        import random
+
+        rng = random.Random(18)
+        samples = [rng.gauss(0, 1) for _ in range(5000)]
+        od = OutlierDetector(buffer_samples=14, method="grubbs", detrend=True)
+        self.assertLess(list(od.score_array(samples)).count(2), 100)
+
+    def test_given_trend_then_running_line_matches_least_squares_fit(self):
+        from statistics import mean
+
+        from outlier_detector.trend import RollingTrend
+
+        trend = RollingTrend(10, resync_interval=7)
+        pushed = []
+        for i, sample in enumerate(self.samples):
+            line = sd = 0
+            if pushed:
+                window = pushed[-10:]
+                mt = mean(t for t, _ in window)
+                mx = mean(x for _, x in window)
+                squares = sum((t - mt) ** 2 for t, _ in window)
+                line = mx
+                slope = 0
+                if squares:
+                    slope = sum((t - mt) * (x - mx) for t, x in window) / squares
+                    line += slope * (i - mt)
+                degrees = len(window) - (2 if squares else 1)
+                if degrees > 0:
+                    deviations = sum(
+                        (x - mx - slope * (t - mt)) ** 2 for t, x in window
+                    )
+                    sd = (deviations / degrees) ** 0.5
+            expected = sample - line if pushed else 0
+            self.assertAlmostEqual(trend.residual(sample), expected, places=7)
+            rejected = i in self.dips
+            trend.push(sample, rejected=rejected)
+            if rejected:
+                # clipped to 2 residual standard deviations below the line
+                self.assertLess(sample, line - 2 * sd)
+                sample = line - 2 * sd
+            pushed.append((i, sample))
+
+    def test_given_rejected_samples_then_trending_series_is_followed(self):
+        import random
+
+        for buffer_samples in (14, 20, 50):
+            for seed in range(10):
+                rng = random.Random(seed)
+                trending = [2 * i + rng.gauss(0, 1) for i in range(400)]
+                stationary = [rng.gauss(0, 1) for _ in range(2000)]
+                for samples in (trending, stationary):
+                    od = OutlierDetector(buffer_samples=buffer_samples, detrend=True)
+                    scores = list(od.score_array(samples))
+                    self.assertLess(scores[len(scores) // 2 :].count(2), 15)
+
+    def test_given_detrended_detector_then_snapshot_prime_and_filter_agree(self):
+        od = OutlierDetector(buffer_samples=20, detrend=True)
+        od.score_array(self.samples[:150])
+        restored = OutlierDetector.from_bytes(od.to_bytes())
+        self.assertTrue(restored.detrend)
+        expected = list(od.score_array(self.samples[150:]))
+        self.assertEqual(list(restored.score_array(self.samples[150:])), expected)
+
+        primed = OutlierDetector(buffer_samples=20, detrend=True)
+        self.assertEqual(primed.prime(self.samples[:150]), 150)
+        self.assertEqual(list(primed.score_array(self.samples[150:])), expected)
+        validated = OutlierDetector(buffer_samples=20, detrend=True)
+        self.assertEqual(validated.prime(self.samples[:150], validate=True), 149)
+
+        f = OutlierFilter(buffer_samples=20, detrend=True)
+        self.assertEqual(len(list(f.filter_iter(self.samples))), 397)
+        samples = iter(self.samples)
+
+        @filter_outlier(buffer_samples=20, detrend=True)
+        def pop():
+            return next(samples)
+
+        self.assertEqual(len([pop() for _ in range(300)]), 300)
+        self.assertEqual(pop.rejected_samples, 3)
+
+    def test_given_detrended_detector_then_copies_are_independent(self):
+        import copy
+        import pickle
+
+        for kwargs in ({}, {"method": "grubbs"}, {"thread_safe": True}):
+            od = OutlierDetector(buffer_samples=20, detrend=True, **kwargs)
+            od.score_array(self.samples[:150])
+            state = od.to_bytes()
+            expected = list(
+                OutlierDetector.from_bytes(state).score_array(self.samples[150:])
+            )
+            for restored in (copy.deepcopy(od), pickle.loads(pickle.dumps(od))):
+                self.assertEqual(
+                    list(restored.score_array(self.samples[150:])), expected
+                )
+                self.assertEqual(restored._lock is None, od._lock is None)
+                # the copy does not push its samples to the original line
+                self.assertEqual(od.to_bytes(), state)
+
+    def test_given_filter_then_copies_keep_its_configuration(self):
+        import copy
+        import pickle
+
+        for strategy, limit in (("exception", None), ("iteration", 3)):
+            f = OutlierFilter(
+                strategy=strategy, limit=limit, buffer_samples=20, detrend=True
+            )
+            f.score_array(self.samples[:150])
+            f.__outlier_counter__ = 2
+            for restored in (
+                copy.copy(f),
+                copy.deepcopy(f),
+                pickle.loads(pickle.dumps(f)),
+            ):
+                self.assertIsInstance(restored, OutlierFilter)
+                self.assertEqual(restored.strategy, strategy)
+                self.assertEqual(restored.limit, limit)
+                self.assertEqual(restored.__outlier_counter__, 2)
+                self.assertEqual(restored.to_bytes(), f.to_bytes())
+
+    def test_given_detrend_with_time_window_then_raise(self):
+        self.assertRaises(ValueError, OutlierDetector, window=10, detrend=True)
+        self.assertRaises(ValueError, OutlierDetector.from_bytes, b"OD\x02")